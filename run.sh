@@ -9,6 +9,7 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 VENV_DIR="${SCRIPT_DIR}/.venv"
 SCRIPTS_DIR="${SCRIPT_DIR}/scripts"
 LOG_DIR="${SCRIPT_DIR}/output_logs/logs"
+METRICS_BASE="${SCRIPT_DIR}/output_logs/metrics"
 REQUIREMENTS="${SCRIPT_DIR}/requirements.txt"
 SHEETS_LIST="${SCRIPT_DIR}/sheets_to_fetch.csv"
 TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
@@ -23,12 +24,15 @@ WEEK_DATA_DIR="${WEEK_DIR}/data/WPP Input Tables"
 TOP_OUTPUT_DIRS=(
   "analysis"
   "temporal_spatial_output"
+  "function_rollup"
   "2d_plots"
   "3d_scatter_plots"
   "unique_processes"
   "unique_effectors"
   "common_effectors_across_systems"
   "unique_ftus"
+  "interaction_graph"
+  "duplicate_rows"
 )
 
 # Prep
@@ -81,8 +85,34 @@ if [ -f "${REQUIREMENTS}" ]; then
   "$PYTHON" -m pip install -r "${REQUIREMENTS}"
 fi
 
-# Download sheets into week data dir (if sheets file exists)
-if [ -f "${SHEETS_LIST}" ]; then
+# Create top-level output dirs under WEEK_DIR
+for d in "${TOP_OUTPUT_DIRS[@]}"; do
+  mkdir -p "${WEEK_DIR}/${d}"
+done
+echo "Created top-level output dirs under ${WEEK_DIR}"
+
+# Per-stage metrics (wpp/instrument.py): one JSON per script, merged after the run
+export WPP_RUN_ID="${TIMESTAMP}"
+export WPP_METRICS_DIR="${METRICS_BASE}/${TIMESTAMP}"
+mkdir -p "${WPP_METRICS_DIR}"
+# Tables parsed by one script are memory-mapped by the next (wpp/shared.py, needs pyarrow)
+export WPP_SHARED_TABLES="$(mktemp -d "${TMPDIR:-/tmp}/wpp-shared-XXXXXX")"
+trap 'rm -rf "${WPP_SHARED_TABLES}"' EXIT
+
+if [ "${WPP_PIPELINE:-0}" = "1" ]; then
+# Pipelined mode (wpp/pipeline.py): sheets are processed per system as they
+# land, global stages run after the last one
+echo "Pipelined run: downloading and processing ${WEEK_DIR} ..."
+PYTHONPATH="${SCRIPTS_DIR}" "${PYTHON}" -m wpp.pipeline "${WEEK_DIR}" --sheets "${SHEETS_LIST}" --logs "${LOG_DIR}" \
+  ${WPP_KG_DIR:+--kg "${WPP_KG_DIR}"} \
+  || echo "Pipeline reported failures — see ${LOG_DIR}"
+else
+# Copy the tables from a local wpp-kg checkout (wpp/checkout.py) when WPP_KG_DIR is set,
+# else download sheets into week data dir (if sheets file exists)
+if [ -n "${WPP_KG_DIR:-}" ]; then
+  echo "Ingesting tables from ${WPP_KG_DIR} -> ${WEEK_DATA_DIR}"
+  PYTHONPATH="${SCRIPTS_DIR}" "${PYTHON}" -m wpp.checkout ingest "${WPP_KG_DIR}" "${WEEK_DIR}" || exit 1
+elif [ -f "${SHEETS_LIST}" ]; then
   echo "Downloading sheets -> ${WEEK_DATA_DIR}"
   while IFS=, read -r doname fname url || [ -n "${fname:-}" ]; do
     fname="$(echo "${fname:-}" | xargs)"
@@ -92,25 +122,26 @@ if [ -f "${SHEETS_LIST}" ]; then
     echo "  -> ${fname}"
     tmp="$(mktemp -u)/${fname}.${TIMESTAMP}.tmp"
     mkdir -p "$(dirname "${tmp}")"
-    if curl -fsSL "${url}" -o "${tmp}"; then
+    if curl -fsSL --max-time 120 "${url}" -o "${tmp}" \
+        && PYTHONPATH="${SCRIPTS_DIR}" "${PYTHON}" -m wpp.inputcache check "${tmp}"; then
       mv "${tmp}" "${out}"
+      # keep the last good copy (wpp/inputcache.py)
+      PYTHONPATH="${SCRIPTS_DIR}" "${PYTHON}" -m wpp.inputcache store "${out}" --url "${url}" --week "${WEEK_DIR}" || true
     else
-      echo "ERROR: failed to download ${url}" >&2
       rm -f "${tmp}" || true
-      exit 1
+      echo "WARNING: failed to download ${url}, falling back to the input cache or the previous week" >&2
+      if ! PYTHONPATH="${SCRIPTS_DIR}" "${PYTHON}" -m wpp.inputcache restore "${out}" --week "${WEEK_DIR}" --url "${url}" --error "download of ${url} failed"; then
+        echo "ERROR: failed to download ${url} and no cached or earlier copy" >&2
+        exit 1
+      fi
     fi
   done < "${SHEETS_LIST}"
 else
   echo "No ${SHEETS_LIST} — skipping downloads."
 fi
 
-# Create top-level output dirs under WEEK_DIR
-for d in "${TOP_OUTPUT_DIRS[@]}"; do
-  mkdir -p "${WEEK_DIR}/${d}"
-done
-echo "Created top-level output dirs under ${WEEK_DIR}"
-
 # Run scripts — ALWAYS use the venv python to run the script file by absolute path
+
 echo "Running scripts from ${SCRIPTS_DIR} with CWD=${WEEK_DIR} ..."
 shopt -s nullglob
 script_list=("${SCRIPTS_DIR}"/*.py)
@@ -132,15 +163,28 @@ else
   done
 fi
 
+fi
+
+# Record the metadata block (authors, date, version) of this week's tables
+PYTHONPATH="${SCRIPTS_DIR}" "${PYTHON}" -m wpp.metadata scan "${WEEK_DIR}" || echo "Metadata scan failed"
+
+# Merge per-script metrics into run.json (+ trace.json when WPP_CHROME_TRACE=1)
+if [ "${WPP_CHROME_TRACE:-0}" = "1" ]; then
+  PYTHONPATH="${SCRIPTS_DIR}" "${PYTHON}" -m wpp.instrument merge "${WPP_METRICS_DIR}" --chrome-trace || echo "Metrics merge failed"
+else
+  PYTHONPATH="${SCRIPTS_DIR}" "${PYTHON}" -m wpp.instrument merge "${WPP_METRICS_DIR}" || echo "Metrics merge failed"
+fi
+
 # Post-run diagnostics
 echo "=== RUN COMPLETE ==="
 echo "Inputs  : ${WEEK_DATA_DIR}"
 echo "Outputs : ${WEEK_DIR}/"
 echo "Logs    : ${LOG_DIR}"
+echo "Metrics : ${WPP_METRICS_DIR}"
 
 echo
-echo "Files created (top 200):"
-find "${WEEK_DIR}" -type f -mtime -1 -print | head -n 200 || true
+echo "Files written by this run (from ${WEEK_DIR}/manifest.json):"
+PYTHONPATH="${SCRIPTS_DIR}" "${PYTHON}" -m wpp.outputs list "${WEEK_DIR}" --run "${TIMESTAMP}" || true
 
 echo
 echo "Tail of script logs (last 200 lines of each):"
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Validate every WPP input table before the other stages run.
+
+Checks (see wpp/schema.py):
+ - header row found and required columns present and non-empty (errors)
+ - EffectorScale / TimeScale values in the known vocabularies, well-formed
+   Effector/ID values (warnings)
+
+Output:
+ - ./data/validation_report.json (one entry per table with status ok/warning/error)
+
+Tables with errors are skipped by the later stages while they stay unchanged.
+Exits with status 1 if any table has errors.
+"""
+
+import sys
+
+from wpp import instrument, schema, tables
+
+input_folder = "./data/WPP Input Tables/"
+output_report = schema.REPORT_PATH
+
+
+@instrument.timed()
+def main():
+    files = tables.list_input_files(input_folder, recursive=True, skip_invalid=False)
+    if not files:
+        print(f"No input tables found in: {input_folder}")
+        return 1
+
+    report = schema.validate(files)
+    schema.write_report(report, output_report)
+
+    for entry in report["tables"]:
+        print(f"[{entry['status'].upper():7}] {entry['table']} ({entry['rows']} rows)")
+        for issue in entry["issues"]:
+            examples = ", ".join(f"row {e['row']}: {e['value']!r}" for e in issue["examples"][:3])
+            count = f" x{issue['count']}" if issue["count"] else ""
+            print(f"    {issue['level']}: {issue['check']} {issue['column'] or ''}{count}"
+                  + (f" ({examples})" if examples else ""))
+
+    s = report["summary"]
+    print(f"\n=== Summary ===\nok: {s['ok']}  warning: {s['warning']}  error: {s['error']} -> {output_report}")
+    if s["error"]:
+        print("Tables with errors are skipped by the other stages until they change.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
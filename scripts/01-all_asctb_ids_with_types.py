@@ -2,6 +2,8 @@
 import pandas as pd
 import requests
 
+from wpp import instrument, outputs
+
 
 def fetch_json(purl):
     response = requests.get(purl, headers={"Accept": "application/json"})
@@ -15,6 +17,7 @@ def is_asctb_table(purl):
         and "crosswalk" not in purl
     )
 
+@instrument.timed()
 def get_latest_asctb_data():
     hra_collection = fetch_json("https://purl.humanatlas.io/collection/hra")
     digital_objects = hra_collection["metadata"]["had_member"]
@@ -24,6 +27,7 @@ def get_latest_asctb_data():
         table_data = fetch_json(purl)
         table_rows = table_data["data"]["asctb_record"]
         tables[table_name] = table_rows
+        instrument.count("rows_read", len(table_rows))
     return tables
 
 def format_term(s):
@@ -78,4 +82,4 @@ print("Extracted", len(df_all_ids), "unique entries across all organs.")
 print(df_all_ids.head())
 
 # Optional: Save to CSV
-df_all_ids.to_csv("./data/all_asctb_ids_and_types.csv", index=False)
+outputs.write_csv(df_all_ids, "./data/all_asctb_ids_and_types.csv")
@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 import pandas as pd
-import glob
 import os
 import re
 import sys
 
+from wpp import entities, instrument, outputs, provenance, tables, timescale, vocab
+
 INPUT_FOLDER = "./data/WPP Input Tables/"   # root folder containing CSV files (will search recursively)
 OUTPUT_FOLDER = "./temporal_spatial_output/"
+# column groups this stage reads (see wpp/tables.py)
+COLUMN_GROUPS = ("function", "process", "effector", "scales")
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
 TIME_COLUMNS = [
@@ -14,67 +17,8 @@ TIME_COLUMNS = [
     "1 week - < 1 year", "1 year or longer",
 ]
 
-TIME_MAPPING = {
-    "milliseconds": ["<1 second"], "seconds": ["1s - < 1min"], "secondsminutes": ["1s - < 1min", "1min - < 1hr"],
-    "minuteshours": ["1min - < 1hr", "1hr - < 1day"], "hoursdays": ["1hr - < 1day", "1day - < 1week"],
-    "daysweeks": ["1day - < 1week", "1 week - < 1 year"], "hours": ["1hr - < 1day"], "minutes": ["1min - < 1hr"],
-    "days": ["1day - < 1week"], "nan": ["Unknown"],
-    "weeks": ["1 week - < 1 year"], "months": ["1 week - < 1 year"], "years": ["1 year or longer"],
-    "weeksmonths": ["1 week - < 1 year"], "minuteshoursdays": ["1min - < 1hr", "1hr - < 1day", "1day - < 1week"],
-    "hoursdaysweeksmonths": ["1hr - < 1day", "1day - < 1week", "1 week - < 1 year"],
-    "secondsminuteshours": ["1s - < 1min", "1min - < 1hr", "1hr - < 1day"],
-    "milisecondsseconds": ["<1 second", "1s - < 1min"], "secondshours": ["1s - < 1min", "1min - < 1hr", "1hr - < 1day"],
-    "continuous": ["continuous"], "variable": ["variable"],
-}
-
-SPATIAL_MAPPING = {
-    "tissue": "AS",
-    "tissueftu": "FTU",
-    "cell": "CT",
-    "organ": "Organ",
-    "organsystem": "Organ",
-    "biomolecule": "B",
-    "molecule": "B",
-    "subcellular": "Unknown",
-    "organism": "Unknown",
-    "nan": "Unknown",
-    "": "Unknown"
-}
-
-time_category_order = [
-    "<1 second", "1s - < 1min", "1min - < 1hr", "1hr - < 1day",
-    "1day - < 1week", "1 week - < 1 year", "1 year or longer",
-    "continuous", "variable"
-]
-
-ftu_ids = {
-    "UBERON:0004203",
-    "UBERON:0001289",
-    "UBERON:0004205",
-    "UBERON:0004193",
-    "UBERON:0001285",
-    "UBERON:0004204",
-    "UBERON:0001229",
-    "UBERON:0001291",
-    "UBERON:0004647",
-    "UBERON:0002299",
-    "UBERON:8410043",
-    "UBERON:0000006",
-    "UBERON:0001263",
-    "UBERON:0014725",
-    "UBERON:0004179",
-    "UBERON:0001983",
-    "UBERON:0000412",
-    "UBERON:0002073",
-    "UBERON:0013487",
-    "UBERON:0001213",
-    "UBERON:0001250",
-    "UBERON:0001959",
-    "UBERON:0002125",
-    "UBERON:0001831",
-    "UBERON:0001832",
-    "UBERON:0001736",
-}
+# time range rows: the TimeScale bins (WPP_TIME_BINS, see wpp/timescale.py), then continuous / variable
+time_category_order = timescale.labels()
 
 def find_col_case_insensitive(columns, candidates):
     """
@@ -88,52 +32,6 @@ def find_col_case_insensitive(columns, candidates):
             return lowered[cand.lower()]
     return None
 
-def clean_effector_id(eff_id):
-    """
-    Normalize an Effector/ID value so it can be matched to ftu_ids.
-    - extracts a 'UBERON:NNNN' token if present (case-insensitive),
-    - strips common wrappers, removes URLs, then uppercases fallback string.
-    - returns None if nothing meaningful.
-    """
-    if pd.isna(eff_id):
-        return None
-    s = str(eff_id).strip()
-    if not s:
-        return None
-    # extract UBERON token if present
-    m = re.search(r"(UBERON:\d+)", s, flags=re.IGNORECASE)
-    if m:
-        return m.group(1).upper()
-    # remove urls and surrounding punctuation then uppercase
-    s2 = re.sub(r"https?://\S+", "", s)
-    s2 = re.sub(r"[<>()\[\]{}\"']", "", s2)
-    s2 = s2.strip()
-    return s2.upper() if s2 else None
-
-def normalize_time(val):
-    if pd.isna(val):
-        return "nan"
-    s = str(val).lower()
-    s = re.sub(r"[–—\-\s,]+", "", s)
-    return s
-
-def normalize_spatial(val, effector_id=None):
-    val_str = str(val).strip() if pd.notna(val) else ""
-    if val_str == "":
-        return SPATIAL_MAPPING.get("nan", "Unknown")
-
-    v = re.sub(r"[^a-z0-9]", "", val_str.lower())
-
-    if v == "tissueftu":
-        return "FTU"
-    if v.startswith("tissue"):
-        eff_id_str = str(effector_id).strip() if pd.notna(effector_id) else ""
-        if eff_id_str.upper() in ftu_ids or clean_effector_id(eff_id_str) in ftu_ids:
-            return "FTU"
-        return "AS"
-
-    return SPATIAL_MAPPING.get(v, "Unknown")
-
 def get_lowest_function(row):
     lowest_func = ""
     function_cols = [col for col in row.index if re.match(r"Function/\d+$", col.strip())]
@@ -189,11 +87,12 @@ def make_function_at_process(lowest_function, process_fragment):
     else:
         return pf
 
-def process_and_save_single(MAIN_CSV_PATH, OUTPUT_PATH, header_row=11):
-    # read with given header row (0-indexed)
-    main = pd.read_csv(MAIN_CSV_PATH, header=header_row, encoding="utf-8-sig")
-    # strip whitespace from column names
-    main.columns = main.columns.str.strip()
+def spatial_temporal_cells(main):
+    """
+    (Time Range, Spatial_Type, Function@Process) rows of one table or one
+    piece of it, as loaded by tables.iter_tables (header detected, only
+    COLUMN_GROUPS parsed).
+    """
 
     # compute Lowest_Function
     main["Lowest_Function"] = main.apply(get_lowest_function, axis=1)
@@ -202,7 +101,9 @@ def process_and_save_single(MAIN_CSV_PATH, OUTPUT_PATH, header_row=11):
     main["Process_List"] = main.get("Process", pd.Series([""] * len(main))).apply(split_processes_cell)
 
     # explode so each process fragment gets its own row
+    instrument.count("items_split", int(main["Process_List"].str.len().sum()))
     exploded = main.explode("Process_List").copy()
+    instrument.count("rows_exploded", len(exploded))
 
     # build Function@Process
     exploded["Function@Process"] = exploded.apply(
@@ -219,33 +120,34 @@ def process_and_save_single(MAIN_CSV_PATH, OUTPUT_PATH, header_row=11):
     # normalize TimeScale and Spatial_Type on exploded rows
     # find effector id column case-insensitively once per file
     effector_id_col = find_col_case_insensitive(exploded.columns, ["Effector/ID","Effector ID","Effector_ID","Effector/Id","Effector/identifier","EffectorID"])
-    # apply TimeScale normalization
-    if "TimeScale" in exploded.columns:
-        exploded["TimeScale_norm"] = exploded["TimeScale"].apply(normalize_time)
-    else:
-        exploded["TimeScale_norm"] = "nan"
-
     # compute Spatial_Type - try common columns
     # prefer explicit 'EffectorScale' column, otherwise check candidate names
     effector_scale_col = find_col_case_insensitive(exploded.columns, ["EffectorScale","Effector Scale","Effector_Scale","Scale"])
-    # If no explicit effector scale column, set as nan to map to Unknown
-    if effector_scale_col is None:
-        exploded["Spatial_Type"] = SPATIAL_MAPPING.get("nan", "Unknown")
-    else:
-        if effector_id_col:
-            exploded["Spatial_Type"] = exploded.apply(lambda r: normalize_spatial(r.get(effector_scale_col, ""), r.get(effector_id_col, "")), axis=1)
-        else:
-            exploded["Spatial_Type"] = exploded[effector_scale_col].apply(lambda v: normalize_spatial(v, None))
+    # tissue rows are refined to FTU (and blank scales filled) from the entity index
+    exploded["Spatial_Type"] = entities.classify_frame(exploded, effector_scale_col, effector_id_col)
 
-    # Map time scales that expand to multiple TIME_MAPPING entries
-    exploded["Time Range"] = exploded["TimeScale_norm"].apply(lambda x: TIME_MAPPING.get(x, ["Unknown"]))
+    # TimeScale -> the time ranges its interval overlaps (wpp/timescale.py), parsed once per distinct value
+    timescales = exploded["TimeScale"] if "TimeScale" in exploded.columns else pd.Series(None, index=exploded.index, dtype=object)
+    exploded["Time Range"] = timescale.time_ranges(timescales)
     exploded = exploded.explode("Time Range")
+    instrument.count("rows_time_exploded", len(exploded))
+    return exploded[["Time Range", "Spatial_Type", "Function@Process"]]
 
-    # Now group by Time Range + Spatial_Type and collect unique Function@Process entries
-    grouped = (
-        exploded.groupby(["Time Range", "Spatial_Type"])["Function@Process"]
-        .apply(lambda s: "? ".join(sorted(set(ss.strip() for ss in s.dropna() if str(ss).strip()))))
-        .reset_index(name="Function@Process")
+def merge_cells(cells, acc):
+    """
+    Add the unique Function@Process entries per (Time Range, Spatial_Type) to
+    ``acc``, as vocabulary codes (wpp/vocab.py); save_pivot decodes them.
+    """
+    codes = pd.Series(vocab.encode(cells["Function@Process"].astype("string").str.strip()))
+    for key, s in codes.groupby([cells["Time Range"].to_numpy(), cells["Spatial_Type"].to_numpy()]):
+        acc.setdefault(key, set()).update(s[s >= 0].tolist())
+    return acc
+
+def save_pivot(acc, OUTPUT_PATH):
+    # one row per (Time Range, Spatial_Type) with the merged Function@Process entries
+    grouped = pd.DataFrame(
+        [(t, sp, "? ".join(vocab.sorted_strings(list(entries)))) for (t, sp), entries in acc.items()],
+        columns=["Time Range", "Spatial_Type", "Function@Process"],
     )
 
     # drop empty/Unknown groups (same as before)
@@ -276,41 +178,55 @@ def process_and_save_single(MAIN_CSV_PATH, OUTPUT_PATH, header_row=11):
     final_pivot = pivot[["Time Range"] + desired_spatial_types]
 
     # Save to CSV
-    final_pivot.to_csv(OUTPUT_PATH, index=False, encoding="utf-8-sig")
+    outputs.write_csv(final_pivot, OUTPUT_PATH, encoding="utf-8-sig")
 
+@instrument.timed()
 def main_run():
-    csv_files = sorted(glob.glob(os.path.join(INPUT_FOLDER, "**", "*.csv"), recursive=True))
-    if not csv_files:
-        print("No CSV files found in", INPUT_FOLDER)
+    input_files = tables.list_input_files(INPUT_FOLDER, recursive=True)
+    if not input_files:
+        print("No input tables found in", INPUT_FOLDER)
         sys.exit(1)
 
-    for file_path in csv_files:
-        file_name = os.path.basename(file_path)
-        # header row heuristic (your previous rule)
-        if "endocrine" in file_name.lower():
-            header_row = 12
-        else:
-            header_row = 11
-
-        base_noext = os.path.splitext(file_name)[0]
-        words = re.findall(r"\w+", base_noext)
-        if len(words) >= 2:
-            prefix = f"{words[0]}_{words[1]}"
-        elif len(words) == 1:
-            prefix = words[0]
-        else:
-            prefix = base_noext
-
-        out_name = f"{prefix}_spatial_temporal_table.csv"
-        out_path = os.path.join(OUTPUT_FOLDER, out_name)
-
+    for file_path in input_files:
+        # partial aggregates per table; a table comes in one piece, or in
+        # WPP_CHUNK_ROWS-sized pieces in streaming mode
+        merged = {}
+        sources = {}
         try:
-            process_and_save_single(file_path, out_path, header_row=header_row)
-            print(f"Saved: {out_path}")
+            for file_name, piece in tables.iter_tables(file_path, groups=COLUMN_GROUPS):
+                with instrument.stage("spatial_temporal_cells", table=file_name):
+                    cells = spatial_temporal_cells(piece)
+                    merge_cells(cells, merged.setdefault(file_name, {}))
+                    # (time range, spatial type, entry) -> the rows it came from (wpp/provenance.py)
+                    prov = sources.setdefault(file_name, provenance.Collector())
+                    prov.add(prov.table(file_name, file_path),
+                             cells.assign(**{"Function@Process": cells["Function@Process"].str.strip()}), cells.index)
         except Exception as e:
-            print(f"Failed processing {file_name}: {e}")
+            print(f"Failed processing {os.path.basename(file_path)}: {e}")
             continue
 
+        for file_name, acc in merged.items():
+            base_noext = os.path.splitext(file_name)[0]
+            words = re.findall(r"\w+", base_noext)
+            if len(words) >= 2:
+                prefix = f"{words[0]}_{words[1]}"
+            elif len(words) == 1:
+                prefix = words[0]
+            else:
+                prefix = base_noext
+
+            out_name = f"{prefix}_spatial_temporal_table.csv"
+            out_path = os.path.join(OUTPUT_FOLDER, out_name)
+
+            try:
+                with instrument.stage("spatial_temporal_table", table=file_name):
+                    save_pivot(acc, out_path)
+                    sources[file_name].save(out_path)
+                print(f"Saved: {out_path}")
+            except Exception as e:
+                print(f"Failed processing {file_name}: {e}")
+                continue
+
     print("Done processing all folders.")
 
 if __name__ == "__main__":
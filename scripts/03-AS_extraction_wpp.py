@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Extract unique tissue effectors from CSV files.
+Extract unique tissue effectors from the input tables (CSV or Excel).
 
 Output columns:
 - AS: joined labels
@@ -10,9 +10,10 @@ Output columns:
 """
 
 import os
-import glob
 import pandas as pd
 
+from wpp import instrument, outputs, provenance, tables
+
 input_folder = "./data/WPP Input Tables/"
 output_tissue_file = "./analysis/all_Uberon_statistics/AS_UBERON_in_WPP.csv"
 
@@ -26,6 +27,9 @@ TISSUE_ID_COLS = [
     "Effector/ID", "Effector ID", "EffectorID", "effector_id", "ID", "id", "AS_ID",
     "EffectorLocation/ID", "EffectorLocation ID", "EffectorLocationID", "effectorlocation_id", "effectorlocationid"
 ]
+# column groups this stage reads (see wpp/tables.py); the generic
+# label/ID names above are projected explicitly
+COLUMN_GROUPS = ("effector",)
 
 def find_all_columns(df, candidates):
     lowered = {c.lower(): c for c in df.columns}
@@ -86,10 +90,11 @@ def normalize_source_name(fname):
 
     return s
 
+@instrument.timed()
 def collect_tissue_only_dedupe_by_id(input_folder, output_tissue_file):
-    files = sorted(glob.glob(os.path.join(input_folder, "*.csv")))
+    files = tables.list_input_files(input_folder)
     if not files:
-        print(f"No CSV files found in: {input_folder}")
+        print(f"No input tables found in: {input_folder}")
         return
 
     # Map from id -> set(labels)
@@ -100,89 +105,123 @@ def collect_tissue_only_dedupe_by_id(input_folder, output_tissue_file):
     # Set of labels that were seen but had no non-CL ID anywhere
     labels_with_no_id = set()
     per_file_counts = {}
+    # AS_ID (or label of a label-only row) -> the rows it was found in
+    prov = provenance.Collector()
 
     for fp in files:
         fname = os.path.basename(fp)
-        fname_l = fname.lower()
-        header_row = 12 if "endocrine" in fname_l else 11
+        # what this file adds to the maps above; merged only once all of it was read
+        file_labels, file_sources, file_no_id, file_counts, file_prov = {}, {}, set(), {}, []
+        failed = False
 
-        try:
-            df = pd.read_csv(fp, dtype=str, header=header_row)
-        except Exception as e:
+        # reading and scanning the pieces, timed together since the reads are lazy
+        with instrument.stage("scan_table", table=fname):
             try:
-                df = pd.read_csv(fp, dtype=str, header=header_row, encoding="utf-8-sig")
-            except Exception:
+                # one table per CSV, one per WPP sheet of a workbook; in pieces
+                # when WPP_CHUNK_ROWS is set, read lazily by next() below
+                loaded = tables.iter_tables(fp, groups=COLUMN_GROUPS,
+                                            extra=EFFECTOR_SCALE_COLS + TISSUE_LABEL_COLS + TISSUE_ID_COLS)
+            except Exception as e:
                 print(f"[ERROR] Could not read {fname}: {e} -- skipping.")
-                per_file_counts[fname] = 0
-                continue
-
-        esc_cols = find_all_columns(df, EFFECTOR_SCALE_COLS)
-        esc_col = esc_cols[0] if esc_cols else None
-        label_cols = find_all_columns(df, TISSUE_LABEL_COLS)
-        id_cols = find_all_columns(df, TISSUE_ID_COLS)
-
-        if esc_col is None:
-            print(f"[WARN] File {fname} has no 'effector scale' column. Skipping file.")
-            per_file_counts[fname] = 0
-            continue
-
-        esc_series = df[esc_col].astype(str).str.strip().str.lower()
-        tissue_mask = esc_series == "tissue"
-        tissue_count = 0
-
-        if tissue_mask.any():
-            if not label_cols:
-                print(f"[WARN] {fname} has tissue rows but no tissue label column found; tissue rows ignored.")
-            else:
-                for _, row in df.loc[tissue_mask].iterrows():
-                    tissue_count += 1
-
-                    # collect labels in this row
-                    labels_found = []
-                    for col in label_cols:
-                        lbl = clean_text(row.get(col))
-                        if lbl:
-                            labels_found.append(lbl)
-
-                    if not labels_found:
-                        continue  # no label -> skip row
-
-                    # collect non-CL ids in this row, splitting multi-ids
-                    ids_found = []
-                    for idcol in id_cols:
-                        raw_field = row.get(idcol)
-                        parts = split_ids_field(raw_field, sep=";")
-                        for p in parts:
-                            pclean = clean_text(p)
-                            if not pclean:
-                                continue
-                            if is_cl_id(pclean):
-                                continue
-                            ids_found.append(pclean)
-
-                    if ids_found:
-                        # for every non-CL id, add association to labels + record source table
-                        for idv in ids_found:
-                            if idv not in id_to_labels:
-                                id_to_labels[idv] = set()
-                            for lbl in labels_found:
-                                id_to_labels[idv].add(lbl)
-
-                            # track the filename(s) where this id appeared
-                            # using set prevents duplicate filename entries even if the same file contributes many rows
-                            if idv not in id_to_sources:
-                                id_to_sources[idv] = set()
-                            # id_to_sources[idv].add(fname)
-                            canonical_name = normalize_source_name(fname)
-                            id_to_sources[idv].add(canonical_name)
-
-
+                loaded, failed = iter(()), True
+            while True:
+                try:
+                    fname, df = next(loaded)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    print(f"[ERROR] Could not read {os.path.basename(fp)}: {e} -- skipping.")
+                    failed = True
+                    break
+                file_counts.setdefault(fname, 0)
+                esc_cols = find_all_columns(df, EFFECTOR_SCALE_COLS)
+                esc_col = esc_cols[0] if esc_cols else None
+                label_cols = find_all_columns(df, TISSUE_LABEL_COLS)
+                id_cols = find_all_columns(df, TISSUE_ID_COLS)
+
+                if esc_col is None:
+                    print(f"[WARN] File {fname} has no 'effector scale' column. Skipping file.")
+                    continue
+
+                esc_series = df[esc_col].astype(str).str.strip().str.lower()
+                tissue_mask = esc_series == "tissue"
+                tissue_count = 0
+                found_keys, found_rows = [], []
+
+                if tissue_mask.any():
+                    if not label_cols:
+                        print(f"[WARN] {fname} has tissue rows but no tissue label column found; tissue rows ignored.")
                     else:
-                        # record labels that currently have no non-CL id
-                        for lbl in labels_found:
-                            labels_with_no_id.add(lbl)
-
-        per_file_counts[fname] = tissue_count
+                        for row_offset, row in df.loc[tissue_mask].iterrows():
+                            tissue_count += 1
+
+                            # collect labels in this row
+                            labels_found = []
+                            for col in label_cols:
+                                lbl = clean_text(row.get(col))
+                                if lbl:
+                                    labels_found.append(lbl)
+
+                            if not labels_found:
+                                continue  # no label -> skip row
+
+                            # collect non-CL ids in this row, splitting multi-ids
+                            ids_found = []
+                            for idcol in id_cols:
+                                raw_field = row.get(idcol)
+                                parts = split_ids_field(raw_field, sep=";")
+                                instrument.count("items_split", len(parts))
+                                for p in parts:
+                                    pclean = clean_text(p)
+                                    if not pclean:
+                                        continue
+                                    if is_cl_id(pclean):
+                                        continue
+                                    ids_found.append(pclean)
+
+                            if ids_found:
+                                # for every non-CL id, add association to labels + record source table
+                                for idv in ids_found:
+                                    if idv not in file_labels:
+                                        file_labels[idv] = set()
+                                    for lbl in labels_found:
+                                        file_labels[idv].add(lbl)
+
+                                    # track the filename(s) where this id appeared
+                                    # using set prevents duplicate filename entries even if the same file contributes many rows
+                                    if idv not in file_sources:
+                                        file_sources[idv] = set()
+                                    # file_sources[idv].add(fname)
+                                    canonical_name = normalize_source_name(fname)
+                                    file_sources[idv].add(canonical_name)
+                                    found_keys.append(idv)
+                                    found_rows.append(row_offset)
+
+
+                            else:
+                                # record labels that currently have no non-CL id
+                                for lbl in labels_found:
+                                    file_no_id.add(lbl)
+                                    found_keys.append(lbl)
+                                    found_rows.append(row_offset)
+
+                file_prov.append((fname, found_keys, found_rows))
+                file_counts[fname] = file_counts.get(fname, 0) + tissue_count
+                instrument.count("tissue_rows", tissue_count)
+
+        if failed:
+            # drop what the pieces read before the error added
+            per_file_counts[os.path.basename(fp)] = 0
+            continue
+        for idv, lbls in file_labels.items():
+            id_to_labels.setdefault(idv, set()).update(lbls)
+        for idv, srcs in file_sources.items():
+            id_to_sources.setdefault(idv, set()).update(srcs)
+        labels_with_no_id |= file_no_id
+        for name, ct in file_counts.items():
+            per_file_counts[name] = per_file_counts.get(name, 0) + ct
+        for name, found_keys, found_rows in file_prov:
+            prov.add(prov.table(name, fp), found_keys, found_rows)
 
     # Build output rows
     rows = []
@@ -206,7 +245,8 @@ def collect_tissue_only_dedupe_by_id(input_folder, output_tissue_file):
 
     out_df = pd.DataFrame(rows, columns=["AS", "AS_ID", "SOURCE_TABLES"])
     os.makedirs(os.path.dirname(output_tissue_file) or ".", exist_ok=True)
-    out_df.to_csv(output_tissue_file, index=False)
+    outputs.write_csv(out_df, output_tissue_file)
+    prov.save(output_tissue_file)
 
     # Summary
     total_tissue_rows = sum(per_file_counts.values())
@@ -19,6 +19,8 @@ import os
 import re
 import pandas as pd
 
+from wpp import instrument, outputs, provenance, shared
+
 tissue_input_file = "./analysis/all_Uberon_statistics/AS_UBERON_in_WPP.csv"
 astcb_master_file  = "./data/all_asctb_ids_and_types.csv"
 output_present_file = "./analysis/all_Uberon_statistics/uberon_ids_present_in_astcb.csv"
@@ -111,6 +113,7 @@ def find_id_column(df, candidates):
             return lowered[lc]
     return None
 
+@instrument.timed()
 def main():
     # check inputs
     if not os.path.exists(tissue_input_file):
@@ -133,6 +136,8 @@ def main():
     wpp_uberon_set = set()
     wpp_non_uberon = set()
     wpp_cl_ids = set()
+    # raw AS_ID -> canonical Uberon ID, to carry 03's provenance over
+    raw_to_uberon = {}
     # iterate rows and split AS_ID field (may contain multiple separated by ';')
     for _, row in wpp_df.iterrows():
         raw_field = row.get(wpp_id_col)
@@ -147,6 +152,7 @@ def main():
             norm = normalize_to_uberon(raw_clean)
             if norm:
                 wpp_uberon_set.add(norm)
+                raw_to_uberon[raw_clean] = norm
             else:
                 wpp_non_uberon.add(raw_clean)
 
@@ -155,7 +161,7 @@ def main():
         print(f"[ERROR] ASTCB master file not found: {astcb_master_file}")
         return
 
-    astcb_df = pd.read_csv(astcb_master_file, dtype=str)
+    astcb_df = shared.read_csv(astcb_master_file, dtype=str)
 
     # detect cf_asctb_type column (case-insensitive)
     lowered_cols = {c.lower(): c for c in astcb_df.columns}
@@ -219,8 +225,12 @@ def main():
     os.makedirs(os.path.dirname(output_present_file) or ".", exist_ok=True)
     os.makedirs(os.path.dirname(output_missing_file) or ".", exist_ok=True)
 
-    pd.DataFrame({"Present_AS_ID": present_ids}).to_csv(output_present_file, index=False)
-    pd.DataFrame({"Missing_AS_ID": missing_ids}).to_csv(output_missing_file, index=False)
+    outputs.write_csv(pd.DataFrame({"Present_AS_ID": present_ids}), output_present_file)
+    outputs.write_csv(pd.DataFrame({"Missing_AS_ID": missing_ids}), output_missing_file)
+    # input rows of each canonical ID: those of its raw spellings in 03's index (wpp/provenance.py)
+    for out_file, ids in ((output_present_file, set(present_ids)), (output_missing_file, set(missing_ids))):
+        raw = [r for r, norm in raw_to_uberon.items() if norm in ids]
+        provenance.carry(tissue_input_file, out_file, raw, [raw_to_uberon[r] for r in raw])
 
     # Final requested counts (Uberon-only comparisons + Option1 total)
     total_uberon_in_wpp = len(wpp_uberon_set)
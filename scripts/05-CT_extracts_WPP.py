@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Extract unique CL IDs from WPP CSVs and deduplicate by CL ID.
+Extract unique CL IDs from the WPP tables (CSV or Excel) and deduplicate by CL ID.
 
 Output:
  - ./output/analysis/all_CT_statistics/all_CL_ids_in_WPP_by_id1.csv
@@ -11,12 +11,13 @@ Columns:
 """
 
 import os
-import glob
 import pandas as pd
 import sys 
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")
 
+from wpp import instrument, outputs, provenance, tables
+
 input_folder = "./data/WPP Input Tables/"
 output_file = "./analysis/all_CT_statistics/all_CL_ids_in_WPP_by_id.csv"
 os.makedirs(os.path.dirname(output_file), exist_ok=True)
@@ -30,6 +31,11 @@ ID_LABEL_PAIRS_CANDIDATES = [
      ["EffectorLocation/LABEL", "EffectorLocation LABEL", "EffectorLocationLabel", "Effector Location Label"])
 ]
 
+# column groups this stage reads (see wpp/tables.py); the generic
+# label/ID names in ID_LABEL_PAIRS_CANDIDATES are projected explicitly
+COLUMN_GROUPS = ("effector",)
+EXTRA_COLUMNS = [c for ids, labels in ID_LABEL_PAIRS_CANDIDATES for c in ids + labels]
+
 def find_column(df, candidates):
     """Return first matching column name from df (case-insensitive), or None."""
     lowered = {c.lower(): c for c in df.columns}
@@ -74,92 +80,121 @@ def normalize_source_name(fname):
     s = s.strip()
     return s
 
+@instrument.timed()
 def collect_cl_ids_dedupe_by_id(input_folder, output_file):
-    files = sorted(glob.glob(os.path.join(input_folder, "*.csv")))
+    files = tables.list_input_files(input_folder)
     if not files:
-        print(f"[ERROR] No CSV files found in: {input_folder}")
+        print(f"[ERROR] No input tables found in: {input_folder}")
         return
 
     cl_to_labels = {}   # map CL_ID -> set(labels)
     cl_to_sources = {}  # map CL_ID -> set(normalized source names)
     per_file_counts = {}
+    prov = provenance.Collector()  # CL_ID -> the rows it was found in
 
     for fp in files:
         fname = os.path.basename(fp)
-        fname_l = fname.lower()
-        # heuristic used in your other scripts
-        header_row = 12 if "endocrine" in fname_l else 11
-
-        # robust read with utf-8-sig fallback
-        try:
-            df = pd.read_csv(fp, dtype=str, header=header_row)
-        except Exception:
+        # what this file adds to the maps above; merged only once all of it was read
+        file_labels, file_sources, file_counts, file_prov = {}, {}, {}, []
+        failed = False
+
+        # reading and scanning the pieces, timed together since the reads are lazy
+        with instrument.stage("scan_table", table=fname):
             try:
-                df = pd.read_csv(fp, dtype=str, header=header_row, encoding="utf-8-sig")
+                # header row is detected by the loader; one table per CSV, one per
+                # WPP sheet of a workbook; in pieces when WPP_CHUNK_ROWS is set,
+                # read lazily by next() below
+                loaded = tables.iter_tables(fp, groups=COLUMN_GROUPS, extra=EXTRA_COLUMNS)
             except Exception as e:
-                print(f"[WARN] Could not read {fname} (header={header_row}): {e} -- skipping.")
-                per_file_counts[fname] = 0
-                continue
-
-        # For each candidate pair, detect actual column names present in this file
-        found_pairs = []
-        for id_cands, label_cands in ID_LABEL_PAIRS_CANDIDATES:
-            id_col = find_column(df, id_cands)
-            label_col = find_column(df, label_cands)
-            # we will process the pair even if label_col is None (we'll use empty label)
-            if id_col:
-                found_pairs.append((id_col, label_col))
-
-        if not found_pairs:
-            # nothing to extract in this file
-            per_file_counts[fname] = 0
-            continue
-
-        row_count_with_ids = 0
-        canonical_fname = normalize_source_name(fname)
-
-        # iterate rows
-        for _, row in df.iterrows():
-            row_had_id = False
-            for id_col, label_col in found_pairs:
-                raw_ids = split_cells(row.get(id_col))
-                if not raw_ids:
+                print(f"[WARN] Could not read {fname}: {e} -- skipping.")
+                loaded, failed = iter(()), True
+            while True:
+                try:
+                    fname, df = next(loaded)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    print(f"[WARN] Could not read {os.path.basename(fp)}: {e} -- skipping.")
+                    failed = True
+                    break
+                file_counts.setdefault(fname, 0)
+                # For each candidate pair, detect actual column names present in this file
+                found_pairs = []
+                for id_cands, label_cands in ID_LABEL_PAIRS_CANDIDATES:
+                    id_col = find_column(df, id_cands)
+                    label_col = find_column(df, label_cands)
+                    # we will process the pair even if label_col is None (we'll use empty label)
+                    if id_col:
+                        found_pairs.append((id_col, label_col))
+
+                if not found_pairs:
+                    # nothing to extract in this file
                     continue
 
-                # labels from matching label column if present
-                raw_labels = split_cells(row.get(label_col)) if label_col else []
-
-                # process each id with positional mapping if possible
-                for idx, raw_id in enumerate(raw_ids):
-                    if not is_cl_id(raw_id):
-                        continue
-                    row_had_id = True
-                    # determine label for this id
-                    label_for_id = ""
-                    if raw_labels:
-                        if len(raw_labels) == len(raw_ids):
-                            # positional mapping
-                            label_for_id = raw_labels[idx]
-                        else:
-                            # fallback: use first label if available
-                            label_for_id = raw_labels[0]
-
-                    # store label (if non-empty) for this CL id
-                    cl_key = raw_id.strip()
-                    if cl_key not in cl_to_labels:
-                        cl_to_labels[cl_key] = set()
-                    if label_for_id:
-                        cl_to_labels[cl_key].add(label_for_id)
-
-                    # store canonical source filename for this CL id (set prevents duplicates)
-                    if cl_key not in cl_to_sources:
-                        cl_to_sources[cl_key] = set()
-                    cl_to_sources[cl_key].add(canonical_fname)
-
-            if row_had_id:
-                row_count_with_ids += 1
-
-        per_file_counts[fname] = row_count_with_ids
+                row_count_with_ids = 0
+                canonical_fname = normalize_source_name(fname)
+                found_ids, found_rows = [], []
+
+                # iterate rows
+                for row_offset, row in df.iterrows():
+                    row_had_id = False
+                    for id_col, label_col in found_pairs:
+                        raw_ids = split_cells(row.get(id_col))
+                        if not raw_ids:
+                            continue
+                        instrument.count("items_split", len(raw_ids))
+
+                        # labels from matching label column if present
+                        raw_labels = split_cells(row.get(label_col)) if label_col else []
+
+                        # process each id with positional mapping if possible
+                        for idx, raw_id in enumerate(raw_ids):
+                            if not is_cl_id(raw_id):
+                                continue
+                            row_had_id = True
+                            # determine label for this id
+                            label_for_id = ""
+                            if raw_labels:
+                                if len(raw_labels) == len(raw_ids):
+                                    # positional mapping
+                                    label_for_id = raw_labels[idx]
+                                else:
+                                    # fallback: use first label if available
+                                    label_for_id = raw_labels[0]
+
+                            # store label (if non-empty) for this CL id
+                            cl_key = raw_id.strip()
+                            if cl_key not in file_labels:
+                                file_labels[cl_key] = set()
+                            if label_for_id:
+                                file_labels[cl_key].add(label_for_id)
+
+                            # store canonical source filename for this CL id (set prevents duplicates)
+                            if cl_key not in file_sources:
+                                file_sources[cl_key] = set()
+                            file_sources[cl_key].add(canonical_fname)
+                            found_ids.append(cl_key)
+                            found_rows.append(row_offset)
+
+                    if row_had_id:
+                        row_count_with_ids += 1
+
+                file_prov.append((fname, found_ids, found_rows))
+                file_counts[fname] += row_count_with_ids
+                instrument.count("rows_with_cl_ids", row_count_with_ids)
+
+        if failed:
+            # drop what the pieces read before the error added
+            per_file_counts[os.path.basename(fp)] = 0
+            continue
+        for cl_key, labels in file_labels.items():
+            cl_to_labels.setdefault(cl_key, set()).update(labels)
+        for cl_key, sources in file_sources.items():
+            cl_to_sources.setdefault(cl_key, set()).update(sources)
+        for name, ct in file_counts.items():
+            per_file_counts[name] = per_file_counts.get(name, 0) + ct
+        for name, found_ids, found_rows in file_prov:
+            prov.add(prov.table(name, fp), found_ids, found_rows)
 
     # Build output rows: one row per unique CL ID, labels joined by " | ", sources joined by " | "
     rows = []
@@ -172,7 +207,8 @@ def collect_cl_ids_dedupe_by_id(input_folder, output_file):
         rows.append({"LABELS": label_str, "CL_ID": cl_id, "SOURCE_TABLES": source_str})
 
     out_df = pd.DataFrame(rows, columns=["LABELS", "CL_ID", "SOURCE_TABLES"])
-    out_df.to_csv(output_file, index=False)
+    outputs.write_csv(out_df, output_file)
+    prov.save(output_file)
 
     # Summary
     total_rows = sum(per_file_counts.values())
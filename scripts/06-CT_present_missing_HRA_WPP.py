@@ -6,6 +6,8 @@ import sys
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")
 
+from wpp import instrument, outputs, provenance, shared
+
 cl_ids_file = "./analysis/all_CT_statistics/all_CL_ids_in_WPP_by_id.csv"  # your extracted CL file
 astcb_master_file = "./data/all_asctb_ids_and_types.csv"        # master file
 output_missing = "./analysis/all_CT_statistics/cl_ids_missing_in_astcb.csv"
@@ -49,6 +51,7 @@ def join_unique(iterable, sep=" | "):
     return sep.join(seen)
 
 # ---------- MAIN ----------
+@instrument.timed()
 def main():
     # check inputs
     if not os.path.exists(cl_ids_file):
@@ -107,7 +110,7 @@ def main():
     print(f"Total CL IDs loaded from WPP file: {len(all_cl_ids)}")
 
     # read ASTCB master and find ID column
-    astcb_df = pd.read_csv(astcb_master_file, dtype=str)
+    astcb_df = shared.read_csv(astcb_master_file, dtype=str)
     astcb_col = find_column(astcb_df, ASTCB_ID_COL_CANDIDATES)
     if astcb_col is None:
         # fallback: try any column with 'id' in name
@@ -148,15 +151,18 @@ def main():
             "WPP_SOURCES": join_unique(sorted(id_to_sources.get(mid, set())))
         })
 
-    # write outputs (dedup again by label+id just in case)
+    # write outputs (dedup again by label+id just in case); the input rows of
+    # each ID are carried over from 05's provenance index (wpp/provenance.py)
     if present_rows:
-        pd.DataFrame(present_rows).drop_duplicates(subset=["CL_LABELS", "CL_IDs"]).to_csv(output_present, index=False)
+        outputs.write_csv(pd.DataFrame(present_rows).drop_duplicates(subset=["CL_LABELS", "CL_IDs"]), output_present)
+        provenance.carry(cl_ids_file, output_present, present_cl_ids)
         print(f"Saved present CL IDs with labels & sources → {output_present}")
     else:
         print("No present CL IDs to save.")
 
     if missing_rows:
-        pd.DataFrame(missing_rows).drop_duplicates(subset=["CL_LABELS", "CL_IDs"]).to_csv(output_missing, index=False)
+        outputs.write_csv(pd.DataFrame(missing_rows).drop_duplicates(subset=["CL_LABELS", "CL_IDs"]), output_missing)
+        provenance.carry(cl_ids_file, output_missing, missing_cl_ids)
         print(f"Saved missing CL IDs with labels & sources → {output_missing}")
     else:
         print("No missing CL IDs to save.")
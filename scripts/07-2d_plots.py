@@ -7,6 +7,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 
+from wpp import instrument, outputs
+
 input_folder = "./temporal_spatial_output/"
 output_folder = "./2d_plots/"
 os.makedirs(output_folder, exist_ok=True)
@@ -160,7 +162,8 @@ for organ in organ_systems:
             plt.tight_layout()
             safe_name = organ.replace(" ", "_")
             out_bubble = os.path.join(output_folder, f"{safe_name}_plot.png")
-            plt.savefig(out_bubble, bbox_inches="tight")
+            with instrument.stage("savefig", plot=safe_name), outputs.staged(out_bubble) as tmp:
+                plt.savefig(tmp, bbox_inches="tight")
             plt.close(fig)
             print(f"Saved {out_bubble}")
 
@@ -203,7 +206,8 @@ for organ in organ_systems:
         plt.tight_layout()
         safe_name = organ.replace(" ", "_")
         out_heatmap = os.path.join(output_folder, f"{safe_name}_heatmap.png")
-        plt.savefig(out_heatmap, bbox_inches="tight")
+        with instrument.stage("savefig", plot=f"{safe_name}_heatmap"), outputs.staged(out_heatmap) as tmp:
+            plt.savefig(tmp, bbox_inches="tight")
         plt.close(fig)
         print(f"Saved {out_heatmap}")
 
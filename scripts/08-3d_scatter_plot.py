@@ -8,6 +8,8 @@ import os
 import re
 import matplotlib.colors as mcolors
 
+from wpp import instrument, outputs
+
 input_folder = "./temporal_spatial_output/"
 output_folder = "./3d_scatter_plots/"
 os.makedirs(output_folder, exist_ok=True)
@@ -155,7 +157,8 @@ plt.subplots_adjust(left=0.12, right=0.92, bottom=0.12, top=0.9)
 ax.view_init(elev=25, azim=130)
 
 combined_output_path = os.path.join(output_folder, "combined_all_systems_3D_scatter.png")
-plt.savefig(combined_output_path, dpi=300, bbox_inches="tight")
+with instrument.stage("savefig", plot="combined_all_systems_3D_scatter"), outputs.staged(combined_output_path) as tmp:
+    plt.savefig(tmp, dpi=300, bbox_inches="tight")
 plt.close(fig)
 
 print(f"Saved combined plot to: {combined_output_path}")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Function roll-up cube for every Function/N depth (see wpp/rollup.py) and the
+function hierarchy trie (see wpp/functree.py).
+
+Reads every input table once and writes, in ./function_rollup/:
+- function_rollup.npz: the (system, function level, function, time range,
+  spatial type, process) combinations, integer-coded,
+- function_trie.npz: the Function/1..N tree of every system with subtree
+  counts and coverage per node.
+
+Both are queried without rereading the tables:
+
+    PYTHONPATH=../../scripts python -m wpp.rollup pivot --level 2
+    PYTHONPATH=../../scripts python -m wpp.functree show "Urinary_System > urinary system"
+"""
+import os
+import sys
+
+import pandas as pd
+
+from wpp import functree, instrument, outputs, rollup, tables
+
+INPUT_FOLDER = "./data/WPP Input Tables/"
+OUTPUT_PATH = rollup.CUBE_PATH
+TRIE_PATH = functree.TRIE_PATH
+# column groups this stage reads (see wpp/tables.py)
+COLUMN_GROUPS = ("function", "process", "effector", "scales")
+os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
+
+
+@instrument.timed()
+def main_run():
+    input_files = tables.list_input_files(INPUT_FOLDER, recursive=True)
+    if not input_files:
+        print("No input tables found in", INPUT_FOLDER)
+        sys.exit(1)
+
+    parts = []
+    trie = functree.TrieBuilder()
+    for file_path in input_files:
+        try:
+            # whole tables, or WPP_CHUNK_ROWS-sized pieces in streaming mode
+            for file_name, piece in tables.iter_tables(file_path, groups=COLUMN_GROUPS):
+                system = os.path.splitext(file_name)[0]
+                with instrument.stage("rollup_cells", table=file_name):
+                    parts.append(rollup.cells(piece, system))
+                with instrument.stage("function_trie", table=file_name):
+                    trie.add(piece, system)
+        except Exception as e:
+            print(f"Failed processing {os.path.basename(file_path)}: {e}")
+            continue
+
+    if not parts:
+        print("No tables could be read.")
+        sys.exit(1)
+    cube = rollup.encode(pd.concat(parts, ignore_index=True))
+    instrument.count("cube_cells", len(cube.codes))
+    with outputs.staged(OUTPUT_PATH, rows=len(cube.codes)) as tmp:
+        with open(tmp, "wb") as fh:
+            rollup.save(cube, fh)
+    print(rollup.summary(cube).to_string(index=False))
+    print(f"Saved: {OUTPUT_PATH} ({len(cube.codes)} combinations)")
+
+    trie = trie.freeze()
+    with outputs.staged(TRIE_PATH, rows=len(trie)) as tmp:
+        with open(tmp, "wb") as fh:
+            trie.save(fh)
+    print(f"Saved: {TRIE_PATH} ({len(trie)} nodes)")
+
+
+if __name__ == "__main__":
+    main_run()
@@ -4,6 +4,8 @@ import glob
 import pandas as pd
 import re
 
+from wpp import instrument, outputs
+
 input_folder = "./temporal_spatial_output/"   # folder with CSVs
 output_summary = "./unique_processes/process_counts.csv"
 # output_details_dir = "./output/unique_processes/per_file_details/"  # per-file detail lists
@@ -41,7 +43,9 @@ if not csv_files:
     raise SystemExit(1)
 
 for path in csv_files:
-    df = pd.read_csv(path, dtype=object)
+    with instrument.stage("read_table", table=os.path.basename(path)) as st:
+        df = pd.read_csv(path, dtype=object)
+        st.count("rows_read", len(df))
     df.columns = [c.strip() for c in df.columns]  # normalize headers
     fname = os.path.splitext(os.path.basename(path))[0]
 
@@ -95,7 +99,7 @@ for path in csv_files:
 summary_df = pd.DataFrame(summary_rows).sort_values("file")
 cols = ["file"] + [f"{c}_unique_count" for c in SPATIAL_COLUMNS] + ["Total_per_spatial_sum", "Global_unique_across_spatials"]
 summary_df = summary_df[cols]
-summary_df.to_csv(output_summary, index=False, encoding="utf-8-sig")
+outputs.write_csv(summary_df, output_summary, encoding="utf-8-sig")
 
 print("Saved summary to:", output_summary)
 # print("Saved per-file details to:", output_details_dir)
@@ -1,64 +1,20 @@
 #!/usr/bin/env python3
 import pandas as pd
-import glob
 import os
 import re
 
+from wpp import entities, instrument, outputs, tables
+
 INPUT_FOLDER = "./data/WPP Input Tables/"
 OUT_FOLDER = "./unique_effectors/"
 os.makedirs(OUT_FOLDER, exist_ok=True)
 
+# column groups this stage reads (see wpp/tables.py)
+COLUMN_GROUPS = ("function", "process", "effector")
+
 # Spatial types we report (keeps column order)
 DESIRED_SPATIAL = ["Organ", "AS", "FTU", "CT", "B"]
 
-# TIME_MAPPING kept for compatibility with "TimeScale" normalization (not used in aggregation)
-TIME_MAPPING = {
-    "milliseconds": ["<1 second"], "seconds": ["1s - < 1min"],
-    "secondsminutes": ["1s - < 1min", "1min - < 1hr"],
-    "minuteshours": ["1min - < 1hr", "1hr - < 1day"], "hoursdays": ["1hr - < 1day", "1day - < 1week"],
-    "daysweeks": ["1day - < 1week", "1 week - < 1 year"], "hours": ["1hr - < 1day"],
-    "minutes": ["1min - < 1hr"], "days": ["1day - < 1week"], "nan": ["Unknown"],
-    "weeks": ["1 week - < 1 year"], "months": ["1 week - < 1 year"], "years": ["1 year or longer"],
-    "weeksmonths": ["1 week - < 1 year"], "minuteshoursdays": ["1min - < 1hr", "1hr - < 1day", "1day - < 1week"],
-    "hoursdaysweeksmonths": ["1hr - < 1day", "1day - < 1week", "1 week - < 1 year"],
-    "secondsminuteshours": ["1s - < 1min", "1min - < 1hr", "1hr - < 1day"],
-    "milisecondsseconds": ["<1 second", "1s - < 1min"], "secondshours": ["1s - < 1min", "1min - < 1hr", "1hr - < 1day"],
-    "continuous": ["continuous"], "variable": ["variable"],
-}
-
-SPATIAL_MAPPING = {
-    "tissue": "AS", "tissueftu": "FTU", "cell": "CT",
-    "organ": "Organ", "organsystem": "Organ",
-    "biomolecule": "B", "molecule": "B",
-    "subcellular": "Unknown", "organism": "Unknown",
-    "nan": "Unknown", "": "Unknown"
-}
-
-# If you have your ftu_ids set from before, place them here for FTU detection:
-ftu_ids = {
-    "UBERON:0004203","UBERON:0001289","UBERON:0004205","UBERON:0004193",
-    "UBERON:0001285","UBERON:0004204","UBERON:0001229","UBERON:0001291",
-    "UBERON:0004647","UBERON:0002299","UBERON:8410043","UBERON:0000006",
-    "UBERON:0001263","UBERON:0014725","UBERON:0004179","UBERON:0001983",
-    "UBERON:0000412","UBERON:0002073","UBERON:0013487","UBERON:0001213",
-    "UBERON:0001250","UBERON:0001959","UBERON:0002125","UBERON:0001831",
-    "UBERON:0001832","UBERON:0001736"
-}
-
-def normalize_spatial(val, effector_id=None):
-    if pd.isna(val) or str(val).strip() == "":
-        return SPATIAL_MAPPING.get("nan", "Unknown")
-    v = re.sub(r"[^a-z0-9]", "", str(val).strip().lower())
-    if v == "tissueftu":
-        return "FTU"
-    if v.startswith("tissue"):
-        if effector_id is not None and pd.notna(effector_id):
-            eff_id_str = str(effector_id).strip()
-            if eff_id_str in ftu_ids:
-                return "FTU"
-        return "AS"
-    return SPATIAL_MAPPING.get(v, "Unknown")
-
 def get_lowest_function(row):
     function_cols = [col for col in row.index if re.match(r"Function/\d+$", col.strip())]
     function_cols.sort(key=lambda c: int(re.search(r"\d+", c).group()))
@@ -96,14 +52,11 @@ def safe_label_set(series):
             out.add(s)
     return out
 
-def process_file_aggregate(path, header_row):
-    df = pd.read_csv(path, header=header_row, encoding="utf-8-sig")
-    df.columns = df.columns.str.strip()
-
+def process_file_aggregate(df):
     # Build columns
     df["Lowest_Function"] = df.apply(get_lowest_function, axis=1)
     df["Combined_Process"] = df.apply(build_combined_process, axis=1)
-    df["Spatial_Type"] = df.apply(lambda r: normalize_spatial(r.get("EffectorScale", ""), r.get("Effector/ID", "")), axis=1)
+    df["Spatial_Type"] = entities.classify_frame(df, "EffectorScale", "Effector/ID")
 
     # Keep only rows with a Combined_Process
     df = df[df["Combined_Process"].notna()].copy()
@@ -128,51 +81,58 @@ def process_file_aggregate(path, header_row):
 
     return spatial_counts, total_union
 
-files = sorted(glob.glob(os.path.join(INPUT_FOLDER, "**", "*.csv"), recursive=True))
+files = tables.list_input_files(INPUT_FOLDER, recursive=True)
 summary_rows = []
 
 if not files:
-    print("No CSV files found in", INPUT_FOLDER)
+    print("No input tables found in", INPUT_FOLDER)
     raise SystemExit(1)
 
 for file_path in files:
-    fname = os.path.basename(file_path)
-    header_row = 12 if "endocrine" in fname.lower() else 11
-
-    # prefix for naming
-    base_noext = os.path.splitext(fname)[0]
-    words = re.findall(r"\w+", base_noext)
-    if len(words) >= 2:
-        prefix = f"{words[0]}_{words[1]}"
-    elif len(words) == 1:
-        prefix = words[0]
-    else:
-        prefix = base_noext
-
     try:
-        counts, total_union = process_file_aggregate(file_path, header_row)
-        # per-file dataframe (single-row)
-        perfile_df = pd.DataFrame([{
-            "file": fname,
-            **{k: counts[k] for k in DESIRED_SPATIAL},
-            "Total_unique_labels_across_spatial": total_union
-        }])
-        out_per_file = os.path.join(OUT_FOLDER, f"{prefix}_label_counts_agg.csv")
-        perfile_df.to_csv(out_per_file, index=False, encoding="utf-8-sig")
-
-        # add to combined summary
-        summary_rows.append({
-            "file": fname,
-            **{k: counts[k] for k in DESIRED_SPATIAL},
-            "Total_unique_labels_across_spatial": total_union
-        })
-
-        print(f"Saved aggregated label counts for {fname} -> {out_per_file}")
-
+        with instrument.stage("read_table", table=os.path.basename(file_path)):
+            loaded = tables.load_tables(file_path, groups=COLUMN_GROUPS)
     except Exception as e:
-        print(f"Failed processing {fname}: {e}")
+        print(f"Failed processing {os.path.basename(file_path)}: {e}")
         continue
 
+    # one table per CSV, one per WPP sheet of a workbook
+    for fname, df in loaded:
+        # prefix for naming
+        base_noext = os.path.splitext(fname)[0]
+        words = re.findall(r"\w+", base_noext)
+        if len(words) >= 2:
+            prefix = f"{words[0]}_{words[1]}"
+        elif len(words) == 1:
+            prefix = words[0]
+        else:
+            prefix = base_noext
+
+        try:
+            with instrument.stage("label_counts", table=fname):
+                counts, total_union = process_file_aggregate(df)
+            # per-file dataframe (single-row)
+            perfile_df = pd.DataFrame([{
+                "file": fname,
+                **{k: counts[k] for k in DESIRED_SPATIAL},
+                "Total_unique_labels_across_spatial": total_union
+            }])
+            out_per_file = os.path.join(OUT_FOLDER, f"{prefix}_label_counts_agg.csv")
+            outputs.write_csv(perfile_df, out_per_file, encoding="utf-8-sig")
+
+            # add to combined summary
+            summary_rows.append({
+                "file": fname,
+                **{k: counts[k] for k in DESIRED_SPATIAL},
+                "Total_unique_labels_across_spatial": total_union
+            })
+
+            print(f"Saved aggregated label counts for {fname} -> {out_per_file}")
+
+        except Exception as e:
+            print(f"Failed processing {fname}: {e}")
+            continue
+
 # write combined summary CSV
 if summary_rows:
     summary_df = pd.DataFrame(summary_rows)
@@ -180,7 +140,7 @@ if summary_rows:
     cols = ["file"] + DESIRED_SPATIAL + ["Total_unique_labels_across_spatial"]
     summary_df = summary_df[cols]
     summary_out = os.path.join(OUT_FOLDER, "all_organ_system_label_counts.csv")
-    summary_df.to_csv(summary_out, index=False, encoding="utf-8-sig")
+    outputs.write_csv(summary_df, summary_out, encoding="utf-8-sig")
     print("Saved combined summary:", summary_out)
 
 print("Done.")
\ No newline at end of file
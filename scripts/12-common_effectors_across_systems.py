@@ -1,16 +1,25 @@
 #!/usr/bin/env python3
+import argparse
 import pandas as pd
-import glob
 import os
 import re
 
+from wpp import fuzzy, instrument, outputs, provenance, tables
+
 INPUT_FOLDER = "./data/WPP Input Tables/"
 OUT_FOLDER = "./common_effectors_across_systems/"
 os.makedirs(OUT_FOLDER, exist_ok=True)
 
-# If you use the same header-row heuristic as before:
-def header_row_for_filename(fname):
-    return 12 if "endocrine" in fname.lower() else 11
+# column groups this stage reads (see wpp/tables.py)
+COLUMN_GROUPS = ("effector",)
+
+parser = argparse.ArgumentParser(description="List effector labels present in 2+ WPP tables.")
+parser.add_argument("--fuzzy", action="store_true",
+                    help="Also cluster near-duplicate labels (e.g. singular/plural) across tables.")
+parser.add_argument("--threshold", type=float, default=fuzzy.DEFAULT_THRESHOLD,
+                    help="Minimum n-gram Dice similarity for two labels to be clustered.")
+parser.add_argument("--ngram", type=int, default=fuzzy.DEFAULT_NGRAM, help="Character n-gram size.")
+args = parser.parse_args()
 
 # helper: produce short file prefix (first two words from filename without extension)
 def file_prefix_from_name(fname):
@@ -72,9 +81,9 @@ def split_multi_values(cell):
             out.append(p)
     return out
 
-files = sorted(glob.glob(os.path.join(INPUT_FOLDER, "**", "*.csv"), recursive=True))
+files = tables.list_input_files(INPUT_FOLDER, recursive=True)
 if not files:
-    raise SystemExit(f"No CSV files found in {INPUT_FOLDER}")
+    raise SystemExit(f"No input tables found in {INPUT_FOLDER}")
 
 # maps keyed by normalized label:
 # label_to_display[label_key] = first-seen original label (for nicer output)
@@ -83,58 +92,64 @@ label_to_display = {}
 label_to_files = {}
 # label_to_ids[label_key] = set of effector IDs seen for that label across files
 label_to_ids = {}
+# (table id, [label_key], [row offset]) per table, filed under the display label once known
+label_rows = []
+sources = provenance.Collector()
 
 for file_path in files:
     fname = os.path.basename(file_path)
-    header_row = header_row_for_filename(fname)
-
-    try:
-        df = pd.read_csv(file_path, header=header_row, encoding="utf-8-sig")
-    except Exception as e:
-        print(f"Skipping {fname}: failed to read CSV ({e})")
-        continue
 
-    # normalize column names
-    df.columns = [c.strip() for c in df.columns]
-
-    label_col = find_label_column(df)
-    id_col = find_id_column(df)
-
-    if label_col is None:
-        # nothing to match in this file
-        print(f"Skipping {fname}: no label column found (searched common names).")
-        continue
+    with instrument.stage("read_table", table=fname):
+        try:
+            loaded = tables.load_tables(file_path, groups=COLUMN_GROUPS)
+        except Exception as e:
+            print(f"Skipping {fname}: failed to read table ({e})")
+            continue
 
-    prefix = file_prefix_from_name(fname)
+    # one table per CSV, one per WPP sheet of a workbook
+    for fname, df in loaded:
+        label_col = find_label_column(df)
+        id_col = find_id_column(df)
 
-    # iterate rows
-    for _, row in df.iterrows():
-        label_cell = row.get(label_col, pd.NA)
-        label_values = split_multi_values(label_cell)
-        if not label_values:
+        if label_col is None:
+            # nothing to match in this file
+            print(f"Skipping {fname}: no label column found (searched common names).")
             continue
 
-        # extract ids for this row (could be multi)
-        ids_here = []
-        if id_col is not None:
-            ids_here = split_multi_values(row.get(id_col, pd.NA))
+        prefix = file_prefix_from_name(fname)
+        found_keys, found_rows = [], []
+        label_rows.append((sources.table(fname, file_path), found_keys, found_rows))
 
-        # For each label value in this row, add file prefix and ids
-        for raw_label in label_values:
-            k = label_key(raw_label)
-            if k is None:
+        # iterate rows
+        for row_offset, row in df.iterrows():
+            label_cell = row.get(label_col, pd.NA)
+            label_values = split_multi_values(label_cell)
+            if not label_values:
                 continue
 
-            # store display version (first seen)
-            if k not in label_to_display:
-                label_to_display[k] = raw_label  # keep first-seen original casing
-
-            label_to_files.setdefault(k, set()).add(prefix)
-            if ids_here:
-                label_to_ids.setdefault(k, set()).update(ids_here)
-            else:
-                # keep an explicit empty set if not present yet (so it's easier later)
-                label_to_ids.setdefault(k, set())
+            # extract ids for this row (could be multi)
+            ids_here = []
+            if id_col is not None:
+                ids_here = split_multi_values(row.get(id_col, pd.NA))
+
+            # For each label value in this row, add file prefix and ids
+            for raw_label in label_values:
+                k = label_key(raw_label)
+                if k is None:
+                    continue
+
+                # store display version (first seen)
+                if k not in label_to_display:
+                    label_to_display[k] = raw_label  # keep first-seen original casing
+
+                label_to_files.setdefault(k, set()).add(prefix)
+                found_keys.append(k)
+                found_rows.append(row_offset)
+                if ids_here:
+                    label_to_ids.setdefault(k, set()).update(ids_here)
+                else:
+                    # keep an explicit empty set if not present yet (so it's easier later)
+                    label_to_ids.setdefault(k, set())
 
 rows = []
 for k, fileset in label_to_files.items():
@@ -154,11 +169,57 @@ if rows:
     out_df = pd.DataFrame(rows)
     # optional: sort by number of files desc, then label
     out_df = out_df.sort_values(by=["Count_files", "Effector/LABEL"], ascending=[False, True])
-    out_df.to_csv(out_path, index=False, encoding="utf-8-sig")
+    outputs.write_csv(out_df, out_path, encoding="utf-8-sig")
     print(f"Wrote {len(out_df)} labels (present in 2+ files) -> {out_path}")
 else:
     # still write an empty template for convenience
-    pd.DataFrame(columns=["Effector/LABEL", "Effector/ID(s)", "Files", "Count_files"]).to_csv(out_path, index=False, encoding="utf-8-sig")
+    outputs.write_csv(pd.DataFrame(columns=["Effector/LABEL", "Effector/ID(s)", "Files", "Count_files"]), out_path, encoding="utf-8-sig")
     print("No labels found in 2 or more input files. Wrote empty template to", out_path)
 
+# Effector/LABEL -> the rows it was found in (wpp/provenance.py)
+for table_id, found_keys, found_rows in label_rows:
+    sources.add(table_id, [label_to_display[k] for k in found_keys], found_rows)
+label_index = sources.save(out_path)
+
+# fuzzy mode: clusters of near-duplicate labels spanning 2+ files
+if args.fuzzy:
+    fuzzy_path = os.path.join(OUT_FOLDER, "near_duplicate_label_clusters.csv")
+    fuzzy_cols = ["Cluster", "Effector/LABELs", "Effector/ID(s)", "Files", "Count_files", "Count_labels", "Min_similarity"]
+    with instrument.stage("fuzzy_clusters") as st:
+        keys = list(label_to_files)
+        clusters = fuzzy.cluster_labels(
+            [fuzzy.normalize_label(k) for k in keys], threshold=args.threshold, n=args.ngram,
+            # labels carrying different effector IDs are distinct terms, not spelling variants
+            ids=[label_to_ids.get(k, set()) for k in keys],
+        )
+        st.count("labels_indexed", len(keys))
+
+    cluster_rows = []
+    for cl in clusters:
+        member_keys = [keys[i] for i in cl["members"]]
+        files_union = set().union(*(label_to_files[k] for k in member_keys))
+        if len(files_union) < 2:
+            continue
+        ids_union = set().union(*(label_to_ids.get(k, set()) for k in member_keys))
+        cluster_rows.append({
+            "Effector/LABELs": " | ".join(sorted(label_to_display.get(k, k) for k in member_keys)),
+            "Effector/ID(s)": ";".join(sorted(ids_union)),
+            "Files": ";".join(sorted(files_union)),
+            "Count_files": len(files_union),
+            "Count_labels": len(member_keys),
+            "Min_similarity": round(cl["min_score"], 3),
+        })
+
+    fuzzy_df = pd.DataFrame(cluster_rows, columns=fuzzy_cols[1:])
+    fuzzy_df = fuzzy_df.sort_values(by=["Count_files", "Effector/LABELs"], ascending=[False, True]).reset_index(drop=True)
+    fuzzy_df.insert(0, "Cluster", range(1, len(fuzzy_df) + 1))
+    outputs.write_csv(fuzzy_df, fuzzy_path, encoding="utf-8-sig")
+    # Cluster -> the rows of its labels
+    cluster_sources = provenance.Collector()
+    for cluster, labels in zip(fuzzy_df["Cluster"], fuzzy_df["Effector/LABELs"]):
+        members = labels.split(" | ")
+        cluster_sources.merge(label_index, members, [str(cluster)] * len(members))
+    cluster_sources.save(fuzzy_path)
+    print(f"Wrote {len(fuzzy_df)} near-duplicate label clusters (threshold={args.threshold}) -> {fuzzy_path}")
+
 print("Done.")
@@ -9,12 +9,13 @@ unique processes per FTU ID.
 """
 import os
 import re
-import glob
 import argparse
 from pathlib import Path
 from typing import List, Optional
 import pandas as pd
 
+from wpp import entities, instrument, outputs, provenance, tables
+
 INPUT_FOLDER = "./data/WPP Input Tables"   # folder to search (recursive)
 OUT_CSV = "./unique_ftus/ftu_id_matches_summary_.csv"
 OUT_GLOBAL_SUMMARY_CSV = "./unique_ftus/ftu_global_process_summary_.csv"
@@ -23,38 +24,11 @@ RECURSIVE = True
 ID_COLUMN_CANDIDATES = ["EffectorLocation/ID", "Effector/ID"]
 LABEL_COLUMN_CANDIDATES = ["EffectorLocation/LABEL", "Effector/LABEL"]
 PROCESS_COLUMN_CANDIDATES = ["Process", "Process/ID"]
+# column groups this stage reads (see wpp/tables.py)
+COLUMN_GROUPS = ("process", "effector")
 # separators used when a cell contains multiple IDs in one cell
 ID_SEPARATORS_REGEX = r"[;|,]\s*"
 
-FTU_IDS = {
-    "UBERON:0004203",
-    "UBERON:0001289",
-    "UBERON:0004205",
-    "UBERON:0004193",
-    "UBERON:0001285",
-    "UBERON:0004204",
-    "UBERON:0001229",
-    "UBERON:0001291",
-    "UBERON:0004647",
-    "UBERON:0002299",
-    "UBERON:8410043",
-    "UBERON:0000006",
-    "UBERON:0001263",
-    "UBERON:0014725",
-    "UBERON:0004179",
-    "UBERON:0001983",
-    "UBERON:0000412",
-    "UBERON:0002073",
-    "UBERON:0013487",
-    "UBERON:0001213",
-    "UBERON:0001250",
-    "UBERON:0001959",
-    "UBERON:0002125",
-    "UBERON:0001831",
-    "UBERON:0001832",
-    "UBERON:0001736",
-}
-
 def derive_table_name(filepath: str) -> str:
     stem = Path(filepath).stem
     parts = re.split(r'[\W_]+', stem)
@@ -63,113 +37,74 @@ def derive_table_name(filepath: str) -> str:
         return stem
     return " ".join(parts[:2])
 
-def find_best_column(columns: List[str], candidates: List[str]) -> Optional[str]:
-
-    lowered = {c.lower(): c for c in columns}
-    # exact / case-insensitive
-    for cand in candidates:
-        if cand in columns:
-            return cand
-        lc = cand.lower()
-        if lc in lowered:
-            return lowered[lc]
-    # suffix / contains matches
+def find_column(columns: List[str], candidates: List[str]) -> Optional[str]:
+    """
+    First column whose name matches a candidate exactly, ignoring case, spaces,
+    slashes and underscores. No substring fallback: "Effector/ID" must never
+    resolve to "EffectorLocation/ID" or a notes column.
+    """
+    by_key = {}
+    for c in columns:
+        by_key.setdefault(tables.column_key(c), c)
     for cand in candidates:
-        lc = cand.lower()
-        for c in columns:
-            cl = c.lower()
-            if cl.endswith(lc) or lc in cl:
-                return c
+        hit = by_key.get(tables.column_key(cand))
+        if hit is not None:
+            return hit
     return None
 
-def split_ids_from_cell(cell_value) -> List[str]:
-    if pd.isna(cell_value):
-        return []
-    s = str(cell_value).strip()
-    if not s:
-        return []
-    parts = re.split(ID_SEPARATORS_REGEX, s)
-    return [p.strip() for p in parts if p.strip()]
+def error_record(input_file: str, sheet: Optional[str], table_name: str, message: str) -> pd.DataFrame:
+    return pd.DataFrame([{
+        "input_file": input_file,
+        "sheet": sheet,
+        "table_name": table_name,
+        "column": "ERROR",
+        "matched_id": "",
+        "label": message,
+        "row_index": "",
+        "process": ""
+    }])
 
-def scan_files(input_folder: str, ftu_ids: set, out_csv: str, recursive: bool = True):
-    patterns = ["**/*.csv", "**/*.tsv", "**/*.xlsx", "**/*.xls"] if recursive else ["*.csv","*.tsv","*.xlsx","*.xls"]
+@instrument.timed()
+def scan_files(input_folder: str, entity_index: pd.Series, out_csv: str, recursive: bool = True):
     base = Path(input_folder)
     if not base.exists():
         raise FileNotFoundError(f"Input folder not found: {input_folder}")
 
-    found_files = []
-    for pat in patterns:
-        found_files.extend([str(p) for p in base.glob(pat)])
-    found_files = sorted(set(found_files))
+    found_files = tables.list_input_files(input_folder, recursive=recursive)
 
     if not found_files:
-        print(f"No files found under {input_folder}. Patterns: {patterns}")
+        print(f"No files found under {input_folder}. Extensions: {tables.INPUT_EXTENSIONS}")
         return pd.DataFrame()  # empty
 
-    records = []  # collected match records
+    records = []  # collected match records, one DataFrame per matching id column
 
     for fp in found_files:
         fp_path = Path(fp)
         ext = fp_path.suffix.lower()
         table_name = derive_table_name(fp)
         try:
-            if ext in (".xls", ".xlsx"):
-                # handle each sheet
-                xls = pd.ExcelFile(fp)
-                for sheet in xls.sheet_names:
-                    try:
-                        df = xls.parse(sheet, dtype=str)
-                    except Exception as e:
-                        # skip unreadable sheet
-                        records.append({
-                            "input_file": fp,
-                            "sheet": sheet,
-                            "table_name": table_name,
-                            "column": "ERROR",
-                            "matched_id": "",
-                            "label": f"Excel parse error: {e}",
-                            "row_index": "",
-                            "process": ""
-                        })
-                        continue
-                    if df.empty:
-                        continue
-                    scan_dataframe(fp, sheet, table_name, df, ftu_ids, records)
-            else:
-                # CSV/TSV
-                sep = ','
-                if fp.lower().endswith(".tsv"):
-                    sep = '\t'
-                try:
-                    # header row set to 11 (0-indexed) to match your WPP files
-                    df = pd.read_csv(fp, dtype=str, sep=sep, engine='python', header=11)
-                except Exception:
-                    # fallback: try python engine without forcing sep
-                    df = pd.read_csv(fp, dtype=str, engine='python', sep=None)
+            # one table per CSV/TSV file or WPP sheet; header row is detected and
+            # only ID/label/Process columns are parsed (cached like every other stage)
+            with instrument.stage("read_table", table=table_name):
+                loaded = tables.load_tables(fp, groups=COLUMN_GROUPS)
+            for name, df in loaded:
                 if df.empty:
                     continue
-                scan_dataframe(fp, None, table_name, df, ftu_ids, records)
+                # workbooks with several WPP sheets name each table <sheet><ext>
+                sheet = os.path.splitext(name)[0] if ext in tables.EXCEL_EXTENSIONS and name != fp_path.name else None
+                scan_dataframe(fp, sheet, table_name, df, entity_index, records, source=name)
         except Exception as exc:
-            records.append({
-                "input_file": fp,
-                "sheet": None,
-                "table_name": table_name,
-                "column": "ERROR",
-                "matched_id": "",
-                "label": f"File-level error: {exc}",
-                "row_index": "",
-                "process": ""
-            })
+            records.append(error_record(fp, None, table_name, f"File-level error: {exc}"))
 
     if not records:
         print("No matches found.")
         # write empty CSV for consistency
         out_dir = Path(out_csv).parent
         out_dir.mkdir(parents=True, exist_ok=True)
-        pd.DataFrame(columns=["table_name","column","matched_id","label","all_processes","unique_process_count_in_table","total_unique_ids_in_table"]).to_csv(out_csv, index=False)
+        outputs.write_csv(pd.DataFrame(columns=["table_name","column","matched_id","label","all_processes","unique_process_count_in_table","total_unique_ids_in_table"]), out_csv)
         return pd.DataFrame()
 
-    df_records = pd.DataFrame(records)
+    df_records = pd.concat(records, ignore_index=True)
 
     summary_parts = []
     
@@ -207,8 +142,17 @@ def scan_files(input_folder: str, ftu_ids: set, out_csv: str, recursive: bool =
     # Save main summary
     out_dir = Path(out_csv).parent
     out_dir.mkdir(parents=True, exist_ok=True)
-    summary.to_csv(out_csv, index=False)
+    outputs.write_csv(summary, out_csv)
     print(f"Wrote summary CSV: {out_csv}")
+
+    # (table_name, column, matched_id) and matched_id -> the rows matched (wpp/provenance.py)
+    matches = df_records[df_records["column"] != "ERROR"]
+    by_match, by_id = provenance.Collector(), provenance.Collector()
+    for (source, input_file), group in matches.groupby(["source_table", "input_file"]):
+        by_match.add(by_match.table(source, input_file), group[["table_name", "column", "matched_id"]], group["row_index"])
+        effector = group[group["column"].str.contains("Effector/ID", case=False)]
+        by_id.add(by_id.table(source, input_file), effector["matched_id"], effector["row_index"])
+    by_match.save(out_csv)
     
     # Create GLOBAL summary: unique processes per FTU across ALL tables (only for Effector/ID)
     effector_records = df_records[df_records['column'].str.contains('Effector/ID', case=False, na=False)]
@@ -239,7 +183,8 @@ def scan_files(input_folder: str, ftu_ids: set, out_csv: str, recursive: bool =
         global_summary = global_summary.sort_values('unique_process_count', ascending=False)
         
         # Save global summary
-        global_summary.to_csv(OUT_GLOBAL_SUMMARY_CSV, index=False)
+        outputs.write_csv(global_summary, OUT_GLOBAL_SUMMARY_CSV)
+        by_id.save(OUT_GLOBAL_SUMMARY_CSV)
         print(f"Wrote global process summary CSV: {OUT_GLOBAL_SUMMARY_CSV}")
         
         print("\nUnique process count per FTU across all tables (Effector/ID):")
@@ -258,76 +203,65 @@ def scan_files(input_folder: str, ftu_ids: set, out_csv: str, recursive: bool =
     
     return summary
 
-def scan_dataframe(input_file: str, sheet: Optional[str], table_name: str, df: pd.DataFrame, ftu_ids: set, records: list):
+@instrument.timed()
+def scan_dataframe(input_file: str, sheet: Optional[str], table_name: str, df: pd.DataFrame, entity_index: pd.Series, records: list,
+                   source: Optional[str] = None):
     """
-    Scan a single dataframe for matches and append to `records`.
+    Scan a single dataframe for matches and append them to `records`.
+    `source` is the table's name in the provenance index (as tables.load_tables names it).
+
+    Each ID column is split and exploded once, FTU hits are selected with a
+    join against the entity index, and labels/processes are read from the same
+    rows by index.
     """
     columns = list(df.columns)
-    
-    # Find process column (if exists)
-    process_col = find_best_column(columns, PROCESS_COLUMN_CANDIDATES)
-    
-    # locate id columns (we will look for both possible ID columns)
+    process_col = find_column(columns, PROCESS_COLUMN_CANDIDATES)
+
     for id_candidate in ID_COLUMN_CANDIDATES:
-        id_col = find_best_column(columns, [id_candidate])
+        id_col = find_column(columns, [id_candidate])
         if not id_col:
             continue
-        
-        # Check if this is an Effector/ID column
+
+        # Effector/ID matches carry the row's Process; EffectorLocation/ID matches do not
         is_effector_id = 'effector/id' in id_col.lower()
-        
-        # determine corresponding label candidate for this ID column
-        corresponding_label_name = None
-        # find matching label candidate that has same prefix before '/'
+
+        # label column with the same prefix (EffectorLocation/ID -> EffectorLocation/LABEL),
+        # otherwise the first generic label candidate present
+        label_col = None
         if '/' in id_candidate:
-            prefix = id_candidate.split('/', 1)[0]
-            # try exact prefix + /LABEL
-            test_label = prefix + "/LABEL"
-            label_col = find_best_column(columns, [test_label])
-            if label_col:
-                corresponding_label_name = label_col
-        # if not found, try any of the generic label candidates
-        if not corresponding_label_name:
-            label_col = find_best_column(columns, LABEL_COLUMN_CANDIDATES)
-            if label_col:
-                corresponding_label_name = label_col
+            label_col = find_column(columns, [id_candidate.split('/', 1)[0] + "/LABEL"])
+        if not label_col:
+            label_col = find_column(columns, LABEL_COLUMN_CANDIDATES)
 
-        # iterate rows
-        # convert entire column to string, preserving empties
-        col_series = df[id_col].astype(str).fillna("").where(df[id_col].notna(), "")
-        for idx, cell in col_series.items():
-            ids_in_cell = split_ids_from_cell(cell)
-            if not ids_in_cell:
-                continue
-            for found_id in ids_in_cell:
-                if found_id in ftu_ids:
-                    label_val = ""
-                    if corresponding_label_name and corresponding_label_name in df.columns:
-                        try:
-                            raw = df.at[idx, corresponding_label_name]
-                            label_val = "" if pd.isna(raw) else str(raw)
-                        except Exception:
-                            label_val = ""
-                    
-                    # Get process value if this is Effector/ID and process column exists
-                    process_val = ""
-                    if is_effector_id and process_col and process_col in df.columns:
-                        try:
-                            raw = df.at[idx, process_col]
-                            process_val = "" if pd.isna(raw) else str(raw)
-                        except Exception:
-                            process_val = ""
-                    
-                    records.append({
-                        "input_file": input_file,
-                        "sheet": sheet,
-                        "table_name": table_name,
-                        "column": id_col,
-                        "matched_id": found_id,
-                        "label": label_val,
-                        "row_index": idx,
-                        "process": process_val
-                    })
+        ids = (df[id_col].dropna().astype(str).str.strip()
+               .str.split(ID_SEPARATORS_REGEX, regex=True)
+               .explode()
+               .str.strip())
+        ids = ids[ids.notna() & (ids != "")]
+        instrument.count("items_split", len(ids))
+
+        # FTUs are whatever the entity index (ftu_list.csv) says they are
+        hits = ids[entities.id_key(ids).map(entity_index).eq("FTU").to_numpy()]
+        if hits.empty:
+            continue
+        rows = hits.index
+
+        def aligned(col):
+            if not col:
+                return ""
+            return df.loc[rows, col].fillna("").astype(str).to_numpy()
+
+        records.append(pd.DataFrame({
+            "input_file": input_file,
+            "sheet": sheet,
+            "table_name": table_name,
+            "column": id_col,
+            "matched_id": hits.to_numpy(),
+            "label": aligned(label_col),
+            "row_index": rows.to_numpy(),
+            "process": aligned(process_col) if is_effector_id else "",
+            "source_table": source or os.path.basename(input_file),
+        }))
 
 def main():
     parser = argparse.ArgumentParser(description="Scan input tables for FTU UBERON IDs.")
@@ -337,7 +271,7 @@ def main():
     args = parser.parse_args()
 
     print(f"Scanning folder: {args.input} (recursive={not args.no_recursive})")
-    summary = scan_files(args.input, FTU_IDS, args.out, recursive=not args.no_recursive)
+    summary = scan_files(args.input, entities.load_index(), args.out, recursive=not args.no_recursive)
     if summary is None or summary.empty:
         print("No matches written.")
     else:
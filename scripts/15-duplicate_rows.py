@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Duplicate and conflicting rows within and across all systems (see wpp/duplicates.py).
+
+Copy-pasted rows inflate the counts of 10, 11 and 12. This stage hashes the
+semantic columns of every row that names a process (function path, process,
+effector ID, effector scale, time scale) and groups all tables' rows on the
+hashes in one pass. Rows with a blank Process (the later steps of a chain)
+are not checked.
+It writes, in ./duplicate_rows/:
+- duplicate_rows.csv: every row of a duplicate group (same semantic columns)
+  and of a conflict group (same function path, process and effector, but a
+  different effector scale or time scale), with the group hash and whether
+  the group stays within one system or spans several,
+- duplicate_summary.csv: per system, rows checked, extra copies and conflicting rows.
+"""
+import os
+import sys
+
+import pandas as pd
+
+from wpp import duplicates, instrument, outputs, tables
+
+INPUT_FOLDER = "./data/WPP Input Tables/"
+OUT_FOLDER = "./duplicate_rows/"
+REPORT_PATH = os.path.join(OUT_FOLDER, "duplicate_rows.csv")
+SUMMARY_PATH = os.path.join(OUT_FOLDER, "duplicate_summary.csv")
+# column groups this stage reads (see wpp/tables.py)
+COLUMN_GROUPS = ("function", "process", "effector", "scales")
+os.makedirs(OUT_FOLDER, exist_ok=True)
+
+
+@instrument.timed()
+def main_run():
+    input_files = tables.list_input_files(INPUT_FOLDER, recursive=True)
+    if not input_files:
+        print("No input tables found in", INPUT_FOLDER)
+        sys.exit(1)
+
+    parts = []
+    for file_path in input_files:
+        try:
+            # whole tables, or WPP_CHUNK_ROWS-sized pieces in streaming mode
+            for file_name, piece in tables.iter_tables(file_path, groups=COLUMN_GROUPS):
+                with instrument.stage("canonical_rows", table=file_name):
+                    canon = duplicates.canonical(piece)
+                    parts.append(canon.assign(system=os.path.splitext(file_name)[0], row=canon.index))
+        except Exception as e:
+            print(f"Failed processing {os.path.basename(file_path)}: {e}")
+            continue
+
+    rows = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=duplicates.SEMANTIC + ["system", "row"])
+    with instrument.stage("hash_groups"):
+        report = duplicates.find(rows)
+    summary = duplicates.summary(rows, report)
+    instrument.count("rows_hashed", len(rows))
+    instrument.count("duplicate_rows", int((report["kind"] == "duplicate").sum()))
+    instrument.count("conflicting_rows", int((report["kind"] == "conflict").sum()))
+
+    outputs.write_csv(report, REPORT_PATH, encoding="utf-8-sig")
+    outputs.write_csv(summary, SUMMARY_PATH, encoding="utf-8-sig")
+    groups = report.drop_duplicates(["kind", "group"])
+    for (kind, scope), n in groups.groupby(["kind", "scope"]).size().items():
+        print(f"{kind:>9} groups {scope:>6} systems: {n}")
+    print(f"Saved: {REPORT_PATH} ({len(report)} rows)")
+    print(f"Saved: {SUMMARY_PATH}")
+
+
+if __name__ == "__main__":
+    main_run()
@@ -0,0 +1,7 @@
+"""
+Shared helpers for the numbered WPP pipeline scripts.
+
+The scripts in ``scripts/`` are run one by one by ``run.sh`` with the week
+folder as the working directory; ``scripts/`` is therefore first on
+``sys.path`` and the helpers are imported as ``from wpp import ...``.
+"""
@@ -0,0 +1,210 @@
+"""
+Backfill: replay the pipeline over past weeks with their archived inputs.
+
+Each week folder in ``output_iterative/`` keeps the inputs it was run on in
+``data/``. ``backfill`` recomputes a date range of weeks in parallel worker
+processes. Every week runs in its own temporary folder holding a copy of its
+``data/``, so workers never share a CWD or see each other's files. When the
+week is done, the artifacts it wrote are copied back into the week folder
+one by one (atomic renames) and merged into its ``manifest.json``.
+
+A week is skipped when every stage has outputs in the manifest and those of
+its latest run carry the stage's current code version (see
+outputs.code_version), so
+rerunning a backfill only recomputes weeks touched by a code change. Stages
+flagged as network stages (01, which refetches the ASCT+B master) are not
+replayed; the archived master is used instead.
+
+    PYTHONPATH=scripts python -m wpp.backfill --from 2026-03-01 --to 2026-08-17 --jobs 4
+    PYTHONPATH=scripts python -m wpp.backfill --dry-run
+
+Per-stage logs go to output_logs/backfill/<run_id>/<week>/<stage>.log.
+Workers share parsed tables through one store for the whole backfill (see
+wpp/shared.py), so a table that is the same in several weeks is parsed once.
+"""
+import argparse
+import contextlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from wpp import instrument, outputs, shared, stages, tables
+
+REPO_DIR = os.path.dirname(stages.SCRIPTS_DIR)
+WEEK_BASE = os.path.join(REPO_DIR, "output_iterative")
+LOG_BASE = os.path.join(REPO_DIR, "output_logs", "backfill")
+WEEK_NAME = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def stage_name(stage):
+    return os.path.splitext(stage.script)[0]
+
+
+def replayed_stages(scripts_dir=stages.SCRIPTS_DIR):
+    return [s for s in stages.discover(scripts_dir) if not s.network]
+
+
+def current_versions(stage_list, scripts_dir=stages.SCRIPTS_DIR):
+    """{stage name: code version} for the scripts as they are now."""
+    return {stage_name(s): outputs.code_version(os.path.join(scripts_dir, s.script)) for s in stage_list}
+
+
+def list_weeks(base=WEEK_BASE, start=None, end=None):
+    """Week folders (YYYY-MM-DD) between ``start`` and ``end`` inclusive that have archived tables."""
+    found = []
+    for name in sorted(os.listdir(base)):
+        path = os.path.join(base, name)
+        if not WEEK_NAME.match(name) or (start and name < start) or (end and name > end):
+            continue
+        if os.path.isdir(os.path.join(path, stages.TABLES)):
+            found.append(path)
+    return found
+
+
+def stale_stages(week_dir, versions, stage_list=None):
+    """
+    Stages whose outputs are missing from the week's manifest or whose most
+    recent run was made by other code. Only the entries of a stage's latest
+    run count: files an earlier version wrote and the current one no longer
+    does stay in the manifest but do not keep the stage stale. A stage that
+    declares no outputs (an unregistered script) is not stale for having none.
+    """
+    entries = sorted(outputs.read_manifest(week_dir).values(), key=lambda e: e.get("written_at") or "")
+    last_run = {e.get("stage"): e.get("run_id") for e in entries}
+    written = {}
+    for entry in entries:
+        if entry.get("run_id") == last_run[entry.get("stage")]:
+            written.setdefault(entry.get("stage"), set()).add(entry.get("code_version"))
+    declares = {stage_name(s): bool(s.writes) for s in (stage_list or replayed_stages())}
+    stale = []
+    for name, version in versions.items():
+        if name in written:
+            if written[name] != {version}:
+                stale.append(name)
+        elif declares.get(name, True):
+            stale.append(name)
+    return stale
+
+
+def publish(work_dir, week_dir, only_stages=None, table=None):
+    """
+    Copy the artifacts in the work folder's manifest (optionally of some
+    stages) into the week folder. With ``table``, their entries are tagged
+    with the one input table they were made from.
+    """
+    entries = outputs.read_manifest(work_dir)
+    if only_stages is not None:
+        entries = {rel: e for rel, e in entries.items() if e.get("stage") in only_stages}
+    if table is not None:
+        entries = {rel: dict(e, table=table) for rel, e in entries.items()}
+    for rel in entries:
+        target = os.path.join(week_dir, rel)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        shutil.copy2(os.path.join(work_dir, rel), tmp)
+        os.replace(tmp, target)
+    if entries:
+        outputs.merge_manifest(entries, week_dir)
+    return len(entries)
+
+
+def backfill_week(week_dir, run_id, log_dir, scripts_dir=stages.SCRIPTS_DIR, keep=False):
+    """
+    Worker: rerun the replayed stages of one week in a fresh temporary folder
+    and publish what they wrote. Returns a summary dict.
+    """
+    week = os.path.basename(week_dir)
+    os.environ[instrument.RUN_ID_ENV] = run_id
+    # per-script metrics files would all carry the worker's name; leave them to run.sh
+    os.environ.pop(instrument.METRICS_DIR_ENV, None)
+    os.makedirs(log_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    work_dir = tempfile.mkdtemp(prefix=f"wpp-backfill-{week}-")
+    results = []
+    try:
+        shutil.copytree(os.path.join(week_dir, "data"), os.path.join(work_dir, "data"))
+        for stage in replayed_stages(scripts_dir):
+            log_path = os.path.join(log_dir, f"{stage_name(stage)}.log")
+            with open(log_path, "w", encoding="utf-8") as log, \
+                    contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+                ok, seconds = stages.run_stage(stage, work_dir, scripts_dir)
+            results.append((stage.script, ok, seconds))
+        published = publish(work_dir, week_dir)
+    finally:
+        # the cache is keyed by realpath; entries for a deleted work dir are never hit again
+        tables.clear_cache()
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return {"week": week, "stages": results, "published": published,
+            "seconds": time.perf_counter() - start}
+
+
+def backfill(base=WEEK_BASE, start=None, end=None, jobs=None, force=False, dry_run=False, keep=False):
+    """Recompute the stale weeks in [start, end]; returns the number of weeks with failed stages."""
+    stage_list = replayed_stages()
+    versions = current_versions(stage_list)
+    run_id = "backfill_" + time.strftime("%Y%m%d_%H%M%S")
+
+    todo = []
+    for week_dir in list_weeks(base, start, end):
+        stale = list(versions) if force else stale_stages(week_dir, versions)
+        if stale:
+            todo.append(week_dir)
+        print(f"{os.path.basename(week_dir)}: "
+              + (f"{len(stale)} stale stage(s)" if stale else "up to date, skipped"))
+    if dry_run or not todo:
+        print(f"{len(todo)} week(s) to backfill")
+        return 0
+
+    jobs = jobs or min(len(todo), os.cpu_count() or 1)
+    print(f"Backfilling {len(todo)} week(s) with {jobs} worker(s), run id {run_id}")
+    failed = 0
+    start_time = time.perf_counter()
+    own_store = not shared.store_dir()
+    if own_store:
+        os.environ[shared.STORE_ENV] = tempfile.mkdtemp(prefix="wpp-shared-")  # inherited by the workers
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(backfill_week, week_dir, run_id,
+                        os.path.join(LOG_BASE, run_id, os.path.basename(week_dir)), keep=keep): week_dir
+            for week_dir in todo
+        }
+        for future in as_completed(futures):
+            week = os.path.basename(futures[future])
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"  FAIL {week}: {e!r}")
+                failed += 1
+                continue
+            bad = [script for script, ok, _ in result["stages"] if not ok]
+            failed += bool(bad)
+            print(f"  {'FAIL' if bad else 'ok  '} {week} ({result['seconds']:.1f}s, "
+                  f"{result['published']} artifacts)" + (f" failed: {', '.join(bad)}" if bad else ""))
+    if own_store:
+        shutil.rmtree(os.environ.pop(shared.STORE_ENV), ignore_errors=True)
+    print(f"Done in {time.perf_counter() - start_time:.1f}s; logs in {os.path.join(LOG_BASE, run_id)}")
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute past weeks from their archived inputs.")
+    parser.add_argument("--from", dest="start", help="First week (YYYY-MM-DD), inclusive.")
+    parser.add_argument("--to", dest="end", help="Last week (YYYY-MM-DD), inclusive.")
+    parser.add_argument("--base", default=WEEK_BASE, help="Folder holding the week folders.")
+    parser.add_argument("--jobs", "-j", type=int, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--force", action="store_true", help="Rerun weeks that are already up to date.")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the weeks that would be rerun.")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary work folders.")
+    args = parser.parse_args(argv)
+    failed = backfill(args.base, args.start, args.end, args.jobs, args.force, args.dry_run, args.keep)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
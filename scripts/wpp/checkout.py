@@ -0,0 +1,208 @@
+"""
+Ingest the input tables straight from a local wpp-kg checkout.
+
+update-sheets-to-fetch.sh builds sheets_to_fetch.csv from the raw CSVs in
+``../wpp-kg/digital-objects/wpp/*/draft/raw/``, and run.sh then downloads
+the same tables again over HTTP. With a fresh checkout that download is not
+needed: ``ingest`` copies the raw CSVs into the week folder directly.
+
+Only tables that changed since they were last ingested count as changed:
+the week folder's own manifest is checked first, and for a table the
+folder does not have yet, the manifest of the latest earlier week
+(``previous_week``), since run.sh starts a new folder every day. A table is
+unchanged if its size and mtime match the manifest entry of the last
+ingestion; if only the mtime moved (a checkout or rebase that rewrote the
+file), the content hash decides. The manifest entries use
+stage "fetch" like downloaded sheets, with the checkout path as ``source``.
+Ingested tables are also kept in the input cache (wpp/inputcache.py) when
+the checkout has their ``.url`` file, so a later HTTP run can fall back on
+them.
+
+    PYTHONPATH=scripts python -m wpp.checkout ingest ../wpp-kg output_iterative/<date>
+
+In run.sh, set WPP_KG_DIR to ingest instead of downloading; with
+WPP_PIPELINE=1 only the changed tables go through the per-sheet stages, and
+the unchanged ones take their per-table outputs from the earlier week
+(``table_outputs`` / ``reuse_outputs``).
+"""
+import argparse
+import glob
+import os
+import shutil
+import sys
+import time
+
+from wpp import backfill, inputcache, instrument, outputs, stages
+
+KG_DIR = os.path.join(os.path.dirname(os.path.dirname(stages.SCRIPTS_DIR)), "wpp-kg")
+RAW_GLOB = os.path.join("digital-objects", "wpp", "*", "draft", "raw", "*.csv")
+
+
+def find_tables(kg_dir=KG_DIR):
+    """{file name: path} of the raw tables in a wpp-kg checkout."""
+    return {os.path.basename(p): os.path.abspath(p) for p in sorted(glob.glob(os.path.join(kg_dir, RAW_GLOB)))}
+
+
+def source_url(path):
+    """The sheet URL kept next to a raw table (``<table>.csv.url``), or None."""
+    try:
+        with open(f"{path}.url", encoding="utf-8") as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _key(name):
+    return f"{stages.TABLES}{name}"
+
+
+def previous_week(week_dir):
+    """The latest week folder before ``week_dir`` (a sibling YYYY-MM-DD folder with a manifest), or None."""
+    week_dir = os.path.abspath(week_dir)
+    name = os.path.basename(week_dir)
+    earlier = [w for w in backfill.list_weeks(os.path.dirname(week_dir), end=name)
+               if os.path.basename(w) < name and os.path.exists(os.path.join(w, outputs.MANIFEST))]
+    return earlier[-1] if earlier else None
+
+
+def compare(found, week_dir, baseline=None):
+    """
+    Split the checkout's tables into changed ones [(name, path, sha256)] and
+    unchanged ones that need a new manifest entry [(name, path, sha256)]:
+    tables whose mtime moved, and tables the week folder does not have yet
+    that match what ``baseline`` (an earlier week folder) ingested. A table
+    is compared with the week folder's own entry, else with the baseline's.
+    """
+    manifests = [(week_dir, outputs.read_manifest(week_dir))]
+    if baseline:
+        manifests.append((baseline, outputs.read_manifest(baseline)))
+    changed, touched = [], []
+    for name, path in found.items():
+        st = os.stat(path)
+        for folder, manifest in manifests:
+            entry = manifest.get(_key(name))
+            if entry is not None and entry.get("source") == path \
+                    and os.path.exists(os.path.join(folder, stages.TABLES, name)):
+                break
+        else:
+            changed.append((name, path, outputs.file_sha256(path)))
+            continue
+        if entry.get("size") == st.st_size and entry.get("source_mtime_ns") == st.st_mtime_ns:
+            if folder != week_dir:
+                touched.append((name, path, entry.get("sha256")))
+            continue
+        sha = outputs.file_sha256(path)
+        if entry.get("sha256") == sha:
+            touched.append((name, path, sha))
+        else:
+            changed.append((name, path, sha))
+    return changed, touched
+
+
+def table_outputs(week_dir, stage_names, versions):
+    """{table: {path: entry}} of the per-table outputs in a week's manifest written by the current code."""
+    found = {}
+    for rel, entry in outputs.read_manifest(week_dir).items():
+        if entry.get("table") and entry.get("stage") in stage_names \
+                and entry.get("code_version") == versions.get(entry["stage"]) \
+                and os.path.exists(os.path.join(week_dir, rel)):
+            found.setdefault(entry["table"], {})[rel] = entry
+    return found
+
+
+def reuse_outputs(baseline, week_dir, entries):
+    """Copy artifacts ({path: manifest entry}) of an earlier week into ``week_dir`` and record them."""
+    for rel in entries:
+        target = os.path.join(week_dir, rel)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        shutil.copy2(os.path.join(baseline, rel), tmp)
+        os.replace(tmp, target)
+    if entries:
+        outputs.merge_manifest(entries, week_dir)
+    instrument.count("artifacts_reused", len(entries))
+    return len(entries)
+
+
+def _record(target, path, sha, week_dir):
+    st = os.stat(path)
+    entry = {
+        "size": st.st_size,
+        "rows": None,
+        "sha256": sha,
+        "encoding": None,
+        "stage": inputcache.STAGE,
+        "source": path,
+        "source_mtime_ns": st.st_mtime_ns,
+        "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "stale": False,
+        "run_id": os.environ.get(instrument.RUN_ID_ENV, ""),
+        "written_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return {os.path.relpath(target, week_dir).replace(os.sep, "/"): entry}
+
+
+def ingest(kg_dir=KG_DIR, week_dir=".", cache=True, baseline=None):
+    """
+    Copy the tables of a checkout into the week folder and return the names
+    of those that changed since the week folder, or else ``baseline`` (an
+    earlier week folder, e.g. ``previous_week``), last ingested them.
+    """
+    week_dir = os.path.abspath(week_dir)
+    found = find_tables(kg_dir)
+    if not found:
+        raise FileNotFoundError(f"No raw tables under {os.path.join(kg_dir, RAW_GLOB)}")
+    changed, touched = compare(found, week_dir, baseline)
+    input_dir = os.path.join(week_dir, stages.TABLES)
+    os.makedirs(input_dir, exist_ok=True)
+
+    entries = {}
+    for name, path, sha in changed:
+        target = os.path.join(input_dir, name)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        shutil.copy2(path, tmp)
+        os.replace(tmp, target)
+        entries.update(_record(target, path, sha, week_dir))
+        url = source_url(path)
+        if cache and url:
+            inputcache.store(target, url)
+    for name, path, sha in touched:
+        # same content as last time: copy it if this week does not have it yet, and
+        # refresh the entry so the next run takes the fast path
+        target = os.path.join(input_dir, name)
+        if not os.path.exists(target):
+            shutil.copy2(path, target)
+        entries.update(_record(target, path, sha, week_dir))
+    if entries:
+        outputs.merge_manifest(entries, week_dir)
+
+    ingested = {os.path.basename(k) for k, e in outputs.read_manifest(week_dir).items()
+                if e.get("stage") == inputcache.STAGE and e.get("source", "").startswith(os.path.abspath(kg_dir))}
+    for name in sorted(ingested - set(found)):
+        print(f"[WARN] {name} is no longer in the checkout; the week folder still has it")
+    instrument.count("tables_ingested", len(changed))
+    return [name for name, _, _ in changed]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest the input tables from a local wpp-kg checkout.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    ing = sub.add_parser("ingest", help="Copy new and changed tables into a week folder.")
+    ing.add_argument("kg", nargs="?", default=KG_DIR, help=f"wpp-kg checkout (default: {KG_DIR}).")
+    ing.add_argument("week", nargs="?", default=".", help="Week folder (default: current folder).")
+    ing.add_argument("--no-cache", action="store_true", help="Do not copy the tables into the input cache.")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        changed = ingest(args.kg, args.week, not args.no_cache, baseline=previous_week(args.week))
+    except FileNotFoundError as e:
+        print(f"ERROR: {e}")
+        return 1
+    print(f"{len(changed)} changed table(s) ingested from {args.kg} in {time.perf_counter() - start:.2f}s"
+          + (f": {', '.join(changed)}" if changed else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
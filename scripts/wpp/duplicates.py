@@ -0,0 +1,132 @@
+"""
+Duplicate and conflicting rows within and across the WPP tables.
+
+Every row is reduced to its semantic columns in canonical form:
+
+- ``function_path``: Function/1..N, normalized and joined with " > ",
+- ``process``: the ';' fragments of Process, normalized and sorted,
+- ``effector``: the first CURIE of Effector/ID, else "label:<normalized label>"
+  (Effector/LABEL, or the bare Effector name on rows without a label),
+- ``effector_scale``: EffectorScale as ``entities.scale_key`` keys it,
+- ``time_scale``: TimeScale, normalized.
+
+Two 64-bit hashes are taken per row: ``key_hash`` over (function path,
+process, effector) and ``row_hash`` over all five columns. One hash
+aggregation over each of them finds
+
+- duplicates: rows with the same ``row_hash`` (copies of one row),
+- conflicts: rows with the same ``key_hash`` but different ``row_hash``
+  (the same effector of the same process given another scale or time scale),
+
+within one system or across systems, in time linear in the number of rows.
+
+Rows with a blank Process are left out. They are the later steps of a chain
+whose process is named on an earlier row, and they tell apart only in the
+Signal/Effect/Behavior columns, so on the five columns above the steps of
+different chains would collide.
+
+    canon = duplicates.canonical(df)             # per table, or per piece in streaming mode
+    report = duplicates.find(pd.concat(frames))  # frames: canon.assign(system=..., row=canon.index)
+"""
+import pandas as pd
+
+from wpp import entities, rollup
+
+SEMANTIC = ["function_path", "process", "effector", "effector_scale", "time_scale"]
+KEY = ["function_path", "process", "effector"]
+PATH_SEPARATOR = " > "
+
+REPORT_COLUMNS = ["kind", "scope", "group", "systems", "system", "row"] + SEMANTIC + ["differs"]
+
+
+def _normalize(values):
+    text = values.astype("string").str.strip().str.lower().str.replace(r"\s+", " ", regex=True)
+    return text.where(~text.isin(["", "nan", "none", "null"]))
+
+
+def _column(df, candidates):
+    col = rollup.find_column(df.columns, candidates)
+    return df[col] if col else pd.Series(pd.NA, index=df.index, dtype="string")
+
+
+def canonical(df):
+    """The semantic columns of the rows of ``df`` that name a process, in canonical form (same index)."""
+    path = pd.Series("", index=df.index, dtype="string")
+    for _, col in rollup.function_columns(df.columns):
+        level = _normalize(df[col])
+        path = path.where(level.isna(), path.str.cat(level, sep=PATH_SEPARATOR).str.removeprefix(PATH_SEPARATOR))
+    process = rollup.process_lists(df).map(lambda parts: ";".join(sorted({p.lower() for p in parts})))
+    scale_col, id_col = rollup.effector_columns(df.columns)
+    effector = entities.id_key(df[id_col]) if id_col else pd.Series(pd.NA, index=df.index, dtype="string")
+    label = _normalize(_column(df, ["Effector/LABEL", "Effector/Label", "Effector Label", "EffectorLabel"]))
+    # rows that only fill the bare Effector name (as functree.py reads it)
+    label = label.fillna(_normalize(_column(df, ["Effector"])))
+    scale = entities.scale_key(df[scale_col]) if scale_col else pd.Series("", index=df.index)
+    canon = pd.DataFrame({
+        "function_path": path,
+        "process": process.astype("string"),
+        "effector": effector.fillna("label:" + label).fillna(""),
+        "effector_scale": scale.astype("string"),
+        "time_scale": _normalize(_column(df, ["TimeScale", "Time Scale", "Time_Scale"])).fillna(""),
+    }, index=df.index)
+    return canon[canon["process"] != ""]
+
+
+def hashes(canon):
+    """(key_hash, row_hash) of canonical rows as uint64 Series."""
+    key_hash = pd.util.hash_pandas_object(canon[KEY], index=False)
+    row_hash = pd.util.hash_pandas_object(canon[SEMANTIC], index=False)
+    return key_hash, row_hash
+
+
+def _scope(groups, systems):
+    """"across" for hash groups spanning several systems, else "within"."""
+    spread = systems.groupby(groups, sort=False).transform("nunique")
+    return spread.map({1: "within"}).fillna("across"), spread
+
+
+def find(rows):
+    """
+    Duplicate and conflicting rows of ``rows`` (canonical columns plus
+    ``system`` and ``row``) as one report frame, REPORT_COLUMNS. ``group`` is
+    the hex hash shared by the rows of one duplicate or conflict group.
+    """
+    rows = rows.reset_index(drop=True)
+    key_hash, row_hash = hashes(rows)
+    copies = row_hash.groupby(row_hash, sort=False).transform("size")
+    variants = row_hash.groupby(key_hash, sort=False).transform("nunique")
+
+    parts = []
+    dup = copies > 1
+    if dup.any():
+        scope, spread = _scope(row_hash[dup], rows.loc[dup, "system"])
+        parts.append(rows[dup].assign(kind="duplicate", scope=scope, systems=spread,
+                                      group=row_hash[dup].map("{:016x}".format), differs=""))
+    conflict = variants > 1
+    if conflict.any():
+        groups = key_hash[conflict]
+        scope, spread = _scope(groups, rows.loc[conflict, "system"])
+        varying = [c for c in SEMANTIC if c not in KEY]
+        differs = pd.concat([rows.loc[conflict, c].groupby(groups, sort=False).transform("nunique").gt(1).map({True: c, False: ""})
+                             for c in varying], axis=1).agg(lambda r: ";".join(v for v in r if v), axis=1)
+        parts.append(rows[conflict].assign(kind="conflict", scope=scope, systems=spread,
+                                           group=groups.map("{:016x}".format), differs=differs))
+    if not parts:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    report = pd.concat(parts, ignore_index=True)[REPORT_COLUMNS]
+    return report.sort_values(["kind", "group", "system", "row"], ignore_index=True)
+
+
+def summary(rows, report):
+    """Per system: rows checked, extra copies of duplicated rows (within/across systems) and conflicting rows."""
+    counted = rows.groupby("system").size().rename("rows")
+    dups = report[report["kind"] == "duplicate"]
+    # every copy after the first of a group inflates the counts
+    extra = dups[dups.duplicated(["group"])]
+    out = pd.concat([
+        counted,
+        extra[extra["scope"] == "within"].groupby("system").size().rename("duplicate_rows_within"),
+        extra[extra["scope"] == "across"].groupby("system").size().rename("duplicate_rows_across"),
+        report[report["kind"] == "conflict"].groupby("system").size().rename("conflicting_rows"),
+    ], axis=1).fillna(0).astype(int)
+    return out.rename_axis("system").reset_index()
@@ -0,0 +1,201 @@
+"""
+Spatial classification of effectors (Organ, AS, FTU, CT, B).
+
+The EffectorScale column gives the coarse class of a row; the effector ID
+refines it. Which IDs are FTUs, anatomical structures, cell types or
+biomarkers comes from an index built from two sources:
+
+- the ASCT+B master written by 01 (``data/all_asctb_ids_and_types.csv``)
+- the FTU list kept at the repo root (``ftu_list.csv``, columns id,label)
+
+The index is persisted next to the week's inputs (``data/entity_index.csv``)
+and rebuilt when it is missing or older than either source, so adding a row
+to ftu_list.csv is picked up by every stage on the next run:
+
+    df["Spatial_Type"] = entities.classify_frame(df, "EffectorScale", "Effector/ID")
+
+Rebuild or inspect it by hand with:
+
+    PYTHONPATH=scripts python -m wpp.entities build
+    PYTHONPATH=scripts python -m wpp.entities lookup UBERON:0001229
+"""
+import argparse
+import os
+
+import pandas as pd
+
+from wpp import shared
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FTU_LIST = os.path.join(REPO_ROOT, "ftu_list.csv")
+ASCTB_MASTER = "./data/all_asctb_ids_and_types.csv"
+INDEX_PATH = "./data/entity_index.csv"
+
+SPATIAL_TYPES = ["Organ", "AS", "FTU", "CT", "B"]
+
+# squashed EffectorScale value -> spatial type; tissue* rows are AS unless the ID is an FTU
+SCALE_TYPES = {
+    "tissue": "AS",
+    "tissueftu": "FTU",
+    "cell": "CT",
+    "organ": "Organ",
+    "organsystem": "Organ",
+    "biomolecule": "B",
+    "molecule": "B",
+    "subcellular": "Unknown",
+    "organism": "Unknown",
+    "nan": "Unknown",
+    "": "Unknown",
+}
+
+# when an ID has several types across sources, the first one here wins
+TYPE_PRIORITY = ["FTU", "AS", "CT", "B"]
+
+# first ontology CURIE in a cell (UBERON:0001229, CL:0000236, HGNC:130, ASCTB-TEMP:x)
+_CURIE = r"([A-Z][A-Z0-9]*(?:-[A-Z0-9]+)*:[^\s;,|]+)"
+
+# (path, mtime_ns) -> Series
+_LOADED = {}
+
+
+def id_key(ids):
+    """Normalize a Series of ID cells to the index key (first CURIE, uppercased)."""
+    return ids.astype("string").str.upper().str.extract(_CURIE, expand=False)
+
+
+def scale_key(scale):
+    """Normalize a Series of EffectorScale cells the way SCALE_TYPES is keyed."""
+    return scale.fillna("").astype(str).str.strip().str.lower().str.replace(r"[^a-z0-9]", "", regex=True)
+
+
+def asctb_type(value):
+    """ASCT+B cf_asctb_type -> spatial type ("B (gene)" -> "B")."""
+    value = str(value).strip()
+    if value.startswith("B"):
+        return "B"
+    return value if value in TYPE_PRIORITY else None
+
+
+def build_index(asctb_path=ASCTB_MASTER, ftu_path=FTU_LIST):
+    """
+    Build the index as a DataFrame with one row per ID: key, id, spatial_type,
+    source, label. Either source may be missing.
+    """
+    parts = []
+    if os.path.exists(asctb_path):
+        master = shared.read_csv(asctb_path, dtype=str, usecols=["id", "cf_asctb_type", "label"])
+        master["spatial_type"] = master["cf_asctb_type"].map(asctb_type)
+        master["source"] = "asctb"
+        parts.append(master.drop(columns=["cf_asctb_type"]))
+    else:
+        print(f"[WARN] ASCT+B master not found at {asctb_path}; entity index has FTUs only.")
+    if os.path.exists(ftu_path):
+        ftus = pd.read_csv(ftu_path, dtype=str)
+        ftus["spatial_type"] = "FTU"
+        ftus["source"] = "ftu_list"
+        parts.append(ftus[["id", "label", "spatial_type", "source"]])
+    if not parts:
+        return pd.DataFrame(columns=["key", "id", "spatial_type", "source", "label"])
+
+    index = pd.concat(parts, ignore_index=True)
+    index = index[index["spatial_type"].notna() & index["id"].notna()].copy()
+    index["key"] = id_key(index["id"])
+    index = index[index["key"].notna()]
+    index["rank"] = index["spatial_type"].map(TYPE_PRIORITY.index)
+    index = (index.sort_values(["key", "rank"], kind="stable")
+                  .drop_duplicates("key")
+                  .reset_index(drop=True))
+    return index[["key", "id", "spatial_type", "source", "label"]]
+
+
+def _is_stale(path, sources):
+    if not os.path.exists(path):
+        return True
+    built = os.path.getmtime(path)
+    return any(os.path.exists(s) and os.path.getmtime(s) > built for s in sources)
+
+
+def write_index(path=INDEX_PATH, asctb_path=ASCTB_MASTER, ftu_path=FTU_LIST):
+    index = build_index(asctb_path, ftu_path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    index.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return index
+
+
+def load_index(path=INDEX_PATH, asctb_path=ASCTB_MASTER, ftu_path=FTU_LIST, rebuild=False):
+    """
+    The persisted index as a Series key -> spatial type (hash lookups via
+    ``.map``/``.get``). Rebuilt first if it is missing or out of date.
+    """
+    if rebuild or _is_stale(path, [asctb_path, ftu_path]):
+        write_index(path, asctb_path, ftu_path)
+    memo_key = (os.path.realpath(path), os.stat(path).st_mtime_ns)
+    series = _LOADED.get(memo_key)
+    if series is None:
+        df = pd.read_csv(path, dtype=str, usecols=["key", "spatial_type"], keep_default_na=False)
+        series = pd.Series(df["spatial_type"].to_numpy(), index=pd.Index(df["key"]), name="spatial_type")
+        _LOADED.clear()
+        _LOADED[memo_key] = series
+    return series
+
+
+def ids_of_type(spatial_type, index=None):
+    index = load_index() if index is None else index
+    return set(index.index[index == spatial_type])
+
+
+def classify(scale, ids=None, index=None):
+    """
+    Spatial type per row from EffectorScale values and (optionally) effector
+    IDs, both Series on the same index:
+
+    - the scale decides the class (SCALE_TYPES; any other tissue* value is AS)
+    - tissue rows whose ID is an FTU become FTU
+    - rows with a blank scale take the class of their ID, if it is indexed
+    """
+    key = scale_key(scale)
+    out = key.map(SCALE_TYPES)
+    out = out.mask(out.isna() & key.str.startswith("tissue"), "AS").fillna("Unknown")
+    if ids is None:
+        return out
+    index = load_index() if index is None else index
+    typed = id_key(ids).map(index)
+    out = out.mask((out == "AS") & (typed == "FTU"), "FTU")
+    out = out.mask((key == "") & typed.notna(), typed)
+    return out.astype(object)
+
+
+def classify_frame(df, scale_col, id_col=None, index=None):
+    """classify() on two columns of ``df``; a missing column counts as empty."""
+    scale = df[scale_col] if scale_col is not None and scale_col in df.columns else pd.Series("", index=df.index)
+    ids = df[id_col] if id_col is not None and id_col in df.columns else None
+    return classify(scale, ids, index=index)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the effector entity index.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Rebuild the index from the ASCT+B master and the FTU list.")
+    b.add_argument("--out", default=INDEX_PATH)
+    b.add_argument("--asctb", default=ASCTB_MASTER)
+    b.add_argument("--ftu-list", default=FTU_LIST)
+    q = sub.add_parser("lookup", help="Print the spatial type of one or more IDs.")
+    q.add_argument("ids", nargs="+")
+    q.add_argument("--index", default=INDEX_PATH)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        index = write_index(args.out, args.asctb, args.ftu_list)
+        counts = index["spatial_type"].value_counts().reindex(TYPE_PRIORITY, fill_value=0)
+        print(f"Wrote {len(index)} IDs to {args.out}: " + ", ".join(f"{t}={n}" for t, n in counts.items()))
+    else:
+        index = load_index(args.index)
+        keys = id_key(pd.Series(args.ids))
+        for raw, key in zip(args.ids, keys):
+            print(f"{raw}\t{index.get(key, 'Unknown') if pd.notna(key) else 'Unknown'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Function hierarchy of every system as an array-backed trie.
+
+The Function/1..Function/N columns of a row are a path in a tree: system >
+Function/1 > Function/2 > ... (blank levels are skipped). ``build`` inserts
+the path of every row and then freezes the tree into flat arrays in preorder,
+so the subtree of node ``i`` is the index range ``[i, end[i])``. Every node
+carries precomputed subtree aggregates:
+
+- ``rows``: table rows at or below the node,
+- ``processes`` / ``effectors``: distinct processes and effector IDs (the
+  label when a row has no ID) at or below the node,
+- ``spatial`` / ``temporal``: bitmasks of the spatial types and time ranges
+  covered (see ``coverage``).
+
+A path lookup is one dict probe per level, and the aggregates of a branch
+are array reads, so coverage questions about any branch do not touch the
+tables again. 09 saves the trie next to the roll-up cube:
+
+    trie = functree.load()
+    node = trie.find(["Urinary_System", "urinary system", "urine production"])
+    trie.summary(node)       # {"rows": ..., "processes": ..., "spatial": [...], ...}
+
+    PYTHONPATH=../../scripts python -m wpp.functree show "Urinary_System > urinary system"
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from wpp import entities, rollup, timescale
+
+TRIE_PATH = "./function_rollup/function_trie.npz"
+SEPARATOR = " > "
+FORMAT = 1
+
+_COUNTS = ("rows", "processes", "effectors")
+
+
+def _row_paths(df, system):
+    """Tuple path (system, Function/1, ...) of every row, blank levels skipped."""
+    levels = [df[col].fillna("").astype(str).str.strip() for _, col in rollup.function_columns(df.columns)]
+    if not levels:
+        return pd.Series([(system,)] * len(df), index=df.index)
+    stacked = pd.concat(levels, axis=1).to_numpy()
+    return pd.Series([(system, *(v for v in row if v and v.lower() != "nan")) for row in stacked], index=df.index)
+
+
+def _function_ids(df):
+    """{Function/N value: Function/N/ID} over the table, first ID seen wins."""
+    ids = {}
+    for _, col in rollup.function_columns(df.columns):
+        id_col = rollup.find_column(df.columns, [f"{col}/ID"])
+        if id_col is None:
+            continue
+        pairs = pd.DataFrame({"v": df[col].astype("string").str.strip(), "id": entities.id_key(df[id_col])}).dropna()
+        for value, curie in pairs.drop_duplicates("v").itertuples(index=False):
+            ids.setdefault(value, curie)
+    return ids
+
+
+class TrieBuilder:
+    """Collects table pieces; ``freeze`` turns them into a FunctionTrie."""
+
+    def __init__(self, bins=None):
+        self.time_labels = timescale.labels(bins)
+        self.bins = bins
+        self.children = [{}]      # node -> {label: child}
+        self.labels = [""]        # node 0 is the root above the systems
+        self.ids = {}
+        self.rows = [0]
+        self.processes = [set()]
+        self.effectors = [set()]
+        self.spatial = [0]
+        self.temporal = [0]
+
+    def _node(self, path):
+        node = 0
+        for label in path:
+            child = self.children[node].get(label)
+            if child is None:
+                child = len(self.labels)
+                self.children[node][label] = child
+                self.children.append({})
+                self.labels.append(label)
+                self.rows.append(0)
+                self.processes.append(set())
+                self.effectors.append(set())
+                self.spatial.append(0)
+                self.temporal.append(0)
+            node = child
+        return node
+
+    def add(self, df, system):
+        """Add the rows of one table (or a piece of one) of ``system``."""
+        if df.empty:
+            return
+        scale_col, id_col = rollup.effector_columns(df.columns)
+        spatial_bit = {t: 1 << i for i, t in enumerate(entities.SPATIAL_TYPES)}
+        time_bit = {t: 1 << i for i, t in enumerate(self.time_labels)}
+        label_col = rollup.find_column(df.columns, ["Effector/LABEL", "Effector"])
+        effector = entities.id_key(df[id_col]) if id_col else pd.Series(pd.NA, index=df.index, dtype="string")
+        if label_col:
+            effector = effector.fillna(df[label_col].astype("string").str.strip().str.lower())
+        rows = pd.DataFrame({
+            "path": _row_paths(df, system),
+            "process": rollup.process_lists(df),
+            "effector": effector.replace("", pd.NA),
+            "spatial": entities.classify_frame(df, scale_col, id_col).map(spatial_bit).fillna(0).astype(int),
+            "temporal": timescale.time_ranges(
+                df["TimeScale"] if "TimeScale" in df.columns else pd.Series(None, index=df.index, dtype=object),
+                self.bins).map(lambda ranges: sum(time_bit.get(t, 0) for t in ranges)),
+        })
+        self.ids.update({k: v for k, v in _function_ids(df).items() if k not in self.ids})
+        # one trie walk per distinct path; the rows under it are merged in bulk
+        for path, group in rows.groupby("path", sort=False):
+            node = self._node(path)
+            self.rows[node] += len(group)
+            self.processes[node].update(p for ps in group["process"] for p in ps)
+            self.effectors[node].update(group["effector"].dropna())
+            self.spatial[node] |= int(np.bitwise_or.reduce(group["spatial"].to_numpy()))
+            self.temporal[node] |= int(np.bitwise_or.reduce(group["temporal"].to_numpy()))
+
+    def freeze(self):
+        """The trie in preorder arrays with subtree aggregates."""
+        order, stack = [], [0]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(child for _, child in sorted(self.children[node].items(), reverse=True))
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order))
+
+        n = len(order)
+        parent = np.full(n, -1, dtype=np.int32)
+        depth = np.zeros(n, dtype=np.int16)
+        end = np.arange(1, n + 1, dtype=np.int32)
+        for node in order:
+            for child in self.children[node].values():
+                parent[position[child]] = position[node]
+                depth[position[child]] = depth[position[node]] + 1
+        rows = np.zeros(n, dtype=np.int32)
+        processes = np.zeros(n, dtype=np.int32)
+        effectors = np.zeros(n, dtype=np.int32)
+        spatial = np.zeros(n, dtype=np.int32)
+        temporal = np.zeros(n, dtype=np.int64)
+        # children come after their parent in preorder, so one backward pass rolls everything up
+        for node in reversed(order):
+            i = position[node]
+            rows[i] += self.rows[node]
+            spatial[i] |= self.spatial[node]
+            temporal[i] |= self.temporal[node]
+            processes[i] = len(self.processes[node])
+            effectors[i] = len(self.effectors[node])
+            up = parent[i]
+            if up >= 0:
+                pnode = order[up]
+                end[up] = max(end[up], end[i])
+                rows[up] += rows[i]
+                spatial[up] |= spatial[i]
+                temporal[up] |= temporal[i]
+                self.processes[pnode] |= self.processes[node]
+                self.effectors[pnode] |= self.effectors[node]
+        labels = np.array([self.labels[node] for node in order], dtype=str)
+        ids = np.array([self.ids.get(label, "") for label in labels], dtype=str)
+        return FunctionTrie(labels, ids, parent, depth, end, rows, processes, effectors, spatial, temporal,
+                            np.array(entities.SPATIAL_TYPES, dtype=str), np.array(self.time_labels, dtype=str))
+
+
+class FunctionTrie:
+    """Preorder arrays of the function hierarchy; node 0 is the root, its children are the systems."""
+
+    def __init__(self, labels, ids, parent, depth, end, rows, processes, effectors, spatial, temporal,
+                 spatial_labels, time_labels):
+        self.labels, self.ids, self.parent, self.depth, self.end = labels, ids, parent, depth, end
+        self.rows, self.processes, self.effectors = rows, processes, effectors
+        self.spatial, self.temporal = spatial, temporal
+        self.spatial_labels, self.time_labels = spatial_labels, time_labels
+        self._child = {(int(p), str(label)): i for i, (p, label) in enumerate(zip(parent, labels)) if p >= 0}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def find(self, path):
+        """Node of a path (system, Function/1, ...), or -1; one lookup per level."""
+        node = 0
+        for label in path:
+            node = self._child.get((node, label), -1)
+            if node < 0:
+                return -1
+        return node
+
+    def path(self, node):
+        """Labels from the system down to ``node``."""
+        out = []
+        while node > 0:
+            out.append(str(self.labels[node]))
+            node = int(self.parent[node])
+        return out[::-1]
+
+    def children(self, node):
+        """Direct children of ``node``, in label order."""
+        out, child = [], node + 1
+        while child < self.end[node]:
+            out.append(child)
+            child = int(self.end[child])
+        return out
+
+    def subtree(self, node):
+        """All nodes at or below ``node`` (a contiguous range)."""
+        return range(node, int(self.end[node]))
+
+    def coverage(self, node):
+        """(spatial types, time ranges) covered at or below ``node``."""
+        spatial = [str(t) for i, t in enumerate(self.spatial_labels) if self.spatial[node] >> i & 1]
+        temporal = [str(t) for i, t in enumerate(self.time_labels) if int(self.temporal[node]) >> i & 1]
+        return spatial, temporal
+
+    def summary(self, node):
+        spatial, temporal = self.coverage(node)
+        out = {"path": SEPARATOR.join(self.path(node)), "id": str(self.ids[node]), "depth": int(self.depth[node])}
+        out.update({name: int(getattr(self, name)[node]) for name in _COUNTS})
+        out.update({"descendants": int(self.end[node]) - node - 1, "spatial": spatial, "temporal": temporal})
+        return out
+
+    def with_id(self, curie):
+        """Nodes whose function carries ``curie`` (Function/N/ID)."""
+        return [int(i) for i in np.flatnonzero(self.ids == curie.upper())]
+
+    def save(self, path):
+        np.savez_compressed(path, format=np.int32(FORMAT), **{name: getattr(self, name) for name in _ARRAYS})
+
+
+_ARRAYS = ("labels", "ids", "parent", "depth", "end", "rows", "processes", "effectors", "spatial", "temporal",
+           "spatial_labels", "time_labels")
+
+
+def build(pieces, bins=None):
+    """FunctionTrie from (system, DataFrame) pieces."""
+    builder = TrieBuilder(bins)
+    for system, df in pieces:
+        builder.add(df, system)
+    return builder.freeze()
+
+
+def load(path=TRIE_PATH):
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["format"]) != FORMAT:
+            raise ValueError(f"{path} has trie format {int(data['format'])}, expected {FORMAT}")
+        return FunctionTrie(*(data[name] for name in _ARRAYS))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the function hierarchy trie written by 09.")
+    parser.add_argument("--trie", default=TRIE_PATH, help=f"Trie file (default: {TRIE_PATH}).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sh = sub.add_parser("show", help="Roll-up of a branch and of its children.")
+    sh.add_argument("path", nargs="?", default="", help=f"Branch as 'System{SEPARATOR}Function/1{SEPARATOR}...' "
+                                                        "(default: all systems).")
+    fi = sub.add_parser("find", help="Branches whose function has an ontology ID.")
+    fi.add_argument("id", help="Function/N/ID, e.g. GO:0006936.")
+    args = parser.parse_args(argv)
+
+    trie = load(args.trie)
+    if args.cmd == "find":
+        nodes = trie.with_id(args.id)
+        for node in nodes:
+            print(SEPARATOR.join(trie.path(node)))
+        print(f"{len(nodes)} branch(es) with {args.id}")
+        return 0
+    node = trie.find([p.strip() for p in args.path.split(SEPARATOR.strip())] if args.path else [])
+    if node < 0:
+        print(f"No branch {args.path!r}")
+        return 1
+    rows = [trie.summary(node)] + [trie.summary(child) for child in trie.children(node)]
+    table = pd.DataFrame(rows)
+    table["spatial"] = table["spatial"].str.join(",")
+    table["temporal"] = table["temporal"].map(len)
+    print(table.drop(columns=["depth"]).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Near-duplicate label detection with a character n-gram blocking index.
+
+Labels are normalized and cut into padded character n-grams. Two labels can
+only reach a Dice similarity of ``t`` if they share enough n-grams, which means
+they must share at least one of their rarest few n-grams (the "prefix" of the
+n-gram list sorted by global frequency). Only those prefix n-grams go into the
+inverted index (n-gram -> label ids), so just the pairs that collide there are
+scored. Common n-grams ("cel", "ell", ...) rarely make it into a prefix, so the
+work grows close to linearly with the number of labels rather than with all
+pairs, and no pair above the threshold is missed. Matching pairs are joined
+into clusters with union-find.
+
+    clusters = fuzzy.cluster_labels(labels, threshold=0.85)
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+DEFAULT_NGRAM = 3
+DEFAULT_THRESHOLD = 0.85
+
+
+def normalize_label(s):
+    """Lowercase, turn punctuation into spaces and collapse whitespace."""
+    if s is None:
+        return ""
+    t = re.sub(r"[^\w\s]", " ", str(s).lower())
+    return re.sub(r"\s+", " ", t).strip()
+
+
+def char_ngrams(s, n=DEFAULT_NGRAM):
+    """Set of character n-grams of ``s`` padded with spaces on both ends."""
+    padded = f"{' ' * (n - 1)}{s}{' ' * (n - 1)}"
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def dice(a, b):
+    if not a and not b:
+        return 1.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+def _prefix_len(size, threshold):
+    # Dice(A, B) >= t implies |A & B| >= t*|A|/(2-t), so the first
+    # |A| - ceil(t*|A|/(2-t)) + 1 n-grams of A must contain a shared one
+    min_overlap = math.ceil(threshold * size / (2 - threshold) - 1e-9)
+    return max(1, size - min_overlap + 1)
+
+
+class NgramIndex:
+    """Prefix-filtered inverted n-gram index over a list of normalized labels."""
+
+    def __init__(self, labels, n=DEFAULT_NGRAM):
+        self.labels = list(labels)
+        self.n = n
+        self.grams = [char_ngrams(lbl, n) for lbl in self.labels]
+        freq = Counter(g for grams in self.grams for g in grams)
+        # rarest n-grams first; ties broken by the n-gram itself for a total order
+        self.ordered = [sorted(grams, key=lambda g: (freq[g], g)) for grams in self.grams]
+
+    def candidate_pairs(self, threshold):
+        """Yield (i, j) pairs that share a prefix n-gram and pass the length filter."""
+        postings = defaultdict(list)
+        # visit labels by size so every indexed label is no larger than the probe
+        for i in sorted(range(len(self.labels)), key=lambda k: len(self.grams[k])):
+            size_i = len(self.grams[i])
+            # same tolerance as _prefix_len, so pairs exactly at the threshold are kept
+            min_size = size_i * threshold / (2 - threshold) - 1e-9
+            prefix = self.ordered[i][:_prefix_len(size_i, threshold)]
+            seen = set()
+            for g in prefix:
+                for j in postings[g]:
+                    if j not in seen and len(self.grams[j]) >= min_size:
+                        seen.add(j)
+                        yield j, i
+            for g in prefix:
+                postings[g].append(i)
+
+    def similar_pairs(self, threshold=DEFAULT_THRESHOLD):
+        """Yield (i, j, score) for candidate pairs scoring at least ``threshold``."""
+        for i, j in self.candidate_pairs(threshold):
+            score = dice(self.grams[i], self.grams[j])
+            if score >= threshold - 1e-9:
+                yield i, j, score
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_labels(labels, threshold=DEFAULT_THRESHOLD, n=DEFAULT_NGRAM, ids=None):
+    """
+    Group near-duplicate labels.
+
+    ``labels`` are the strings to compare (normalize them first). ``ids`` is
+    an optional set of ontology IDs per label. Each cluster keeps the union of
+    its members' IDs, and two clusters whose ID sets are both non-empty and
+    disjoint are never joined, so labels carrying different IDs stay apart
+    even when a label without an ID is similar to both. Returns a list of
+    clusters with two or more members; each cluster is a dict with the member
+    indexes ("members") and the lowest pair score that joined it ("min_score").
+    """
+    index = NgramIndex(labels, n=n)
+    parent = list(range(len(index.labels)))
+    root_ids = {i: set(s) for i, s in enumerate(ids) if s} if ids is not None else {}
+    min_score = {}
+    for i, j, score in index.similar_pairs(threshold):
+        ri, rj = _find(parent, i), _find(parent, j)
+        ids_i, ids_j = root_ids.get(ri), root_ids.get(rj)
+        if ri != rj and ids_i and ids_j and not ids_i & ids_j:
+            continue
+        joined = min(score, min_score.pop(ri, 1.0), min_score.pop(rj, 1.0))
+        if ri != rj:
+            parent[rj] = ri
+            if ids_j:
+                root_ids[ri] = (ids_i or set()) | root_ids.pop(rj)
+        min_score[ri] = joined
+
+    groups = defaultdict(list)
+    for i in range(len(parent)):
+        groups[_find(parent, i)].append(i)
+    return [
+        {"members": sorted(members), "min_score": min_score.get(root, 1.0)}
+        for root, members in groups.items()
+        if len(members) >= 2
+    ]
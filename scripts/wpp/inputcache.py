@@ -0,0 +1,263 @@
+"""
+Last-good copies of the downloaded sheets, used when a download fails.
+
+Every sheet that downloads cleanly is also copied into the input cache
+(``input_cache/`` at the repo root, or WPP_INPUT_CACHE), next to a small
+JSON file holding its URL and fetch time. When a download fails or times
+out, or returns something that is not a table (an HTML error page), the
+cached copy is put in the week folder instead and the run goes on. The
+download is simply tried again on the next run, which refreshes the cache.
+The cache does not outlive a fresh checkout (the weekly CI job keeps it with
+actions/cache), so a sheet that is not cached falls back to the copy in the
+latest earlier week folder, which is committed with that week's outputs.
+
+Each input that lands in a week folder is recorded in its manifest.json
+under stage "fetch", with ``fetched_at`` and ``stale`` telling whether it
+came from this run's download or from the cache:
+
+    "data/Urinary_System.csv": {
+        "size": 20311, "sha256": "...", "stage": "fetch", "source": "https://...",
+        "fetched_at": "2026-08-10T08:00:02", "stale": true, ...
+    }
+
+run.sh checks each curl download with ``check``, then calls ``store`` on
+success and ``restore`` on failure; wpp/pipeline.py uses ``fetch``.
+
+    PYTHONPATH=scripts python -m wpp.inputcache status
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import requests
+
+from wpp import backfill, instrument, outputs, stages
+
+CACHE_ENV = "WPP_INPUT_CACHE"
+CACHE_BASE = os.path.join(os.path.dirname(stages.SCRIPTS_DIR), "input_cache")
+FETCH_TIMEOUT = 120
+STAGE = "fetch"
+
+
+def cache_dir():
+    return os.environ.get(CACHE_ENV) or CACHE_BASE
+
+
+def _meta_path(name, cache):
+    return os.path.join(cache, f"{name}.json")
+
+
+def read_meta(name, cache=None):
+    """The cache entry of a sheet ({url, fetched_at, sha256, ...}) or None."""
+    path = _meta_path(name, cache or cache_dir())
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _write_meta(name, meta, cache):
+    path = _meta_path(name, cache)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, indent=2)
+    os.replace(tmp, path)
+
+
+def _copy(src, dest):
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dest)
+
+
+def check_table(path):
+    """Raise ValueError if a download is empty or an HTML page (e.g. a sign-in redirect)."""
+    with open(path, "rb") as fh:
+        head = fh.read(512).lstrip().lower()
+    if not head:
+        raise ValueError(f"{os.path.basename(path)} is empty")
+    if head.startswith((b"<!doctype html", b"<html")):
+        raise ValueError(f"{os.path.basename(path)} is an HTML page, not a table")
+
+
+def download(url, dest, timeout=FETCH_TIMEOUT):
+    """Download ``url`` to ``dest`` through a temporary file; returns ``dest``."""
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    tmp = os.path.join(os.path.dirname(os.path.abspath(dest)), f".{os.path.basename(dest)}.{os.getpid()}.tmp")
+    try:
+        with requests.get(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            with open(tmp, "wb") as fh:
+                for block in response.iter_content(1 << 16):
+                    fh.write(block)
+        check_table(tmp)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return dest
+
+
+def store(path, url, cache=None):
+    """Keep ``path`` as the last good copy of its sheet; returns the cache entry."""
+    cache = cache or cache_dir()
+    name = os.path.basename(path)
+    _copy(path, os.path.join(cache, name))
+    meta = {
+        "url": url,
+        "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "size": os.path.getsize(path),
+        "sha256": outputs.file_sha256(path),
+    }
+    _write_meta(name, meta, cache)
+    return meta
+
+
+def previous_copy(dest, week_dir):
+    """
+    The same input in the latest earlier week folder that has it, as
+    (path, entry); the entry is built from that week's manifest, or from the
+    file when the week has none. None if no earlier week has the input.
+    """
+    week_dir = os.path.abspath(week_dir)
+    rel = os.path.relpath(os.path.abspath(dest), week_dir)
+    name = os.path.basename(week_dir)
+    for prev in reversed(backfill.list_weeks(os.path.dirname(week_dir), end=name)):
+        path = os.path.join(prev, rel)
+        if os.path.basename(prev) >= name or not os.path.exists(path):
+            continue
+        known = outputs.read_manifest(prev).get(rel.replace(os.sep, "/"), {})
+        return path, {
+            "url": known.get("source", ""),
+            "fetched_at": known.get("fetched_at") or os.path.basename(prev),
+            "size": os.path.getsize(path),
+            "sha256": outputs.file_sha256(path),
+            "week": os.path.basename(prev),
+        }
+    return None
+
+
+def restore(name, dest, error=None, cache=None, week_dir=None):
+    """
+    Put the cached copy of sheet ``name`` at ``dest``, or with ``week_dir``
+    and no cached copy, the one of the previous week; returns its entry, or
+    None if there is neither.
+    """
+    cache = cache or cache_dir()
+    meta = read_meta(name, cache)
+    if meta is None or not os.path.exists(os.path.join(cache, name)):
+        found = previous_copy(dest, week_dir) if week_dir else None
+        if found is None:
+            return None
+        path, meta = found
+        _copy(path, dest)
+        instrument.count("stale_inputs")
+        return meta
+    _copy(os.path.join(cache, name), dest)
+    meta["last_failure"] = {"at": time.strftime("%Y-%m-%dT%H:%M:%S"), "error": str(error or "")}
+    _write_meta(name, meta, cache)
+    instrument.count("stale_inputs")
+    return meta
+
+
+def record(path, meta, stale, week_dir):
+    """Add the manifest entry of an input in the week folder."""
+    entry = {
+        "size": os.path.getsize(path),
+        "rows": None,
+        "sha256": meta["sha256"],
+        "encoding": None,
+        "stage": STAGE,
+        "source": meta["url"],
+        "fetched_at": meta["fetched_at"],
+        "stale": stale,
+        **({"from_week": meta["week"]} if "week" in meta else {}),
+        "run_id": os.environ.get(instrument.RUN_ID_ENV, ""),
+        "written_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    key = os.path.relpath(os.path.abspath(path), os.path.abspath(week_dir)).replace(os.sep, "/")
+    outputs.merge_manifest({key: entry}, week_dir)
+    return entry
+
+
+def _origin(meta):
+    if "week" in meta:
+        return f"the copy of week {meta['week']}"
+    return f"the cached copy fetched at {meta['fetched_at']}"
+
+
+def fetch(url, dest, week_dir, timeout=FETCH_TIMEOUT, cache=None):
+    """
+    Download a sheet into the week folder, falling back to its cached copy.
+    Returns (dest, stale); raises the download error if there is no cached copy.
+    """
+    try:
+        download(url, dest, timeout)
+    except (requests.RequestException, OSError, ValueError) as e:
+        meta = restore(os.path.basename(dest), dest, e, cache, week_dir)
+        if meta is None:
+            raise
+        meta["url"] = meta["url"] or url
+        print(f"[WARN] {url} failed ({e}); using {_origin(meta)}")
+        record(dest, meta, True, week_dir)
+        return dest, True
+    record(dest, store(dest, url, cache), False, week_dir)
+    return dest, False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Last-good copies of the downloaded sheets.")
+    parser.add_argument("--cache", help=f"Cache folder (default: ${CACHE_ENV} or {CACHE_BASE}).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    st = sub.add_parser("store", help="Cache a freshly downloaded sheet and record it in the week manifest.")
+    st.add_argument("path")
+    st.add_argument("--url", required=True)
+    st.add_argument("--week", required=True, help="Week folder whose manifest records the input.")
+    rs = sub.add_parser("restore", help="Put the cached copy of a sheet (or the previous week's) in place "
+                                        "after a failed download.")
+    rs.add_argument("path", help="Where the sheet should be (its file name is the cache key).")
+    rs.add_argument("--week", required=True, help="Week folder whose manifest records the input.")
+    rs.add_argument("--error", help="Why the download failed, kept with the cache entry.")
+    rs.add_argument("--url", help="The sheet's URL, recorded when the copy comes from an earlier week.")
+    ck = sub.add_parser("check", help="Exit non-zero if a download is empty or an HTML page.")
+    ck.add_argument("path")
+    sub.add_parser("status", help="List the cached sheets and when they were fetched.")
+    args = parser.parse_args(argv)
+    cache = args.cache or cache_dir()
+
+    if args.cmd == "check":
+        try:
+            check_table(args.path)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            return 1
+        return 0
+    if args.cmd == "store":
+        record(args.path, store(args.path, args.url, cache), False, args.week)
+        return 0
+    if args.cmd == "restore":
+        meta = restore(os.path.basename(args.path), args.path, args.error, cache, args.week)
+        if meta is None:
+            print(f"No cached copy of {os.path.basename(args.path)} in {cache} and none in an earlier week")
+            return 1
+        print(f"{os.path.basename(args.path)}: using {_origin(meta)}")
+        meta["url"] = meta["url"] or args.url or ""
+        record(args.path, meta, True, args.week)
+        return 0
+
+    names = sorted(n[:-5] for n in os.listdir(cache) if n.endswith(".json")) if os.path.isdir(cache) else []
+    for name in names:
+        meta = read_meta(name, cache)
+        failure = meta.get("last_failure")
+        stale = failure and failure["at"] > meta["fetched_at"]
+        print(f"{name}  fetched {meta['fetched_at']}" + (f", STALE since {failure['at']}" if stale else ""))
+    print(f"{len(names)} sheet(s) in {cache}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Per-stage timing, memory and row-count instrumentation.
+
+Usage inside a script:
+
+    from wpp import instrument
+
+    with instrument.stage("read_table", table=fname) as st:
+        df = pd.read_csv(...)
+        st.count("rows_read", len(df))
+
+    @instrument.timed("scan_files")
+    def scan_files(...): ...
+
+Every stage records wall time, CPU time, peak memory and any counters added
+with ``count()``. Peak memory comes from tracemalloc when WPP_TRACEMALLOC=1
+(exact Python allocations, slower) and from the process RSS high-water mark
+otherwise.
+
+Records are only written when WPP_METRICS_DIR is set (run.sh sets it to
+output_logs/metrics/<timestamp>/). Each script process writes one
+``<script>.<pid>.json`` file at exit; merge them into the per-run JSON and an
+optional Chrome trace (chrome://tracing, ui.perfetto.dev) with:
+
+    python -m wpp.instrument merge output_logs/metrics/<timestamp> --chrome-trace
+"""
+import argparse
+import atexit
+import functools
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_DIR_ENV = "WPP_METRICS_DIR"
+RUN_ID_ENV = "WPP_RUN_ID"
+TRACEMALLOC_ENV = "WPP_TRACEMALLOC"
+
+USE_TRACEMALLOC = os.environ.get(TRACEMALLOC_ENV, "") == "1"
+if USE_TRACEMALLOC and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+_SCRIPT = os.path.splitext(os.path.basename(sys.argv[0] or "interactive"))[0]
+_PROCESS_START = time.time()
+_PROCESS_CPU_START = time.process_time()
+_records = []
+_local = threading.local()
+
+
+def _max_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+class StageRecord:
+    """Measurements for one stage; ``count()`` adds to a named counter."""
+
+    def __init__(self, name, attrs, parent):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.counts = {}
+        self.start = time.time()
+        self.wall_s = None
+        self.cpu_s = None
+        self.peak_mem_bytes = None
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._peak_so_far = 0
+
+    def count(self, key, n=1):
+        self.counts[key] = self.counts.get(key, 0) + int(n)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "attrs": self.attrs,
+            "start": self.start,
+            "wall_s": self.wall_s,
+            "cpu_s": self.cpu_s,
+            "peak_mem_bytes": self.peak_mem_bytes,
+            "counts": self.counts,
+        }
+
+
+@contextmanager
+def stage(name, **attrs):
+    """Measure the enclosed block as one stage. Nested stages record their parent."""
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    rec = StageRecord(name, {k: str(v) for k, v in attrs.items()}, parent.name if parent else None)
+    if USE_TRACEMALLOC:
+        # tracemalloc has one global peak: fold it into the parent before resetting
+        if parent is not None:
+            parent._peak_so_far = max(parent._peak_so_far, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    stack.append(rec)
+    try:
+        yield rec
+    finally:
+        stack.pop()
+        rec.wall_s = time.perf_counter() - rec._t0
+        rec.cpu_s = time.process_time() - rec._cpu0
+        if USE_TRACEMALLOC:
+            rec.peak_mem_bytes = max(rec._peak_so_far, tracemalloc.get_traced_memory()[1])
+            if parent is not None:
+                parent._peak_so_far = max(parent._peak_so_far, rec.peak_mem_bytes)
+        else:
+            rec.peak_mem_bytes = _max_rss_bytes()
+        _records.append(rec)
+
+
+def timed(name=None, **attrs):
+    """Decorator form of ``stage``; the stage name defaults to the function name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name or func.__name__, **attrs):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current():
+    """Innermost open stage, or None; lets helpers add counts to their caller's stage."""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def count(key, n=1):
+    """Add to a counter on the innermost open stage (no-op outside a stage)."""
+    rec = current()
+    if rec is not None:
+        rec.count(key, n)
+
+
+def _write_process_record():
+    out_dir = os.environ.get(METRICS_DIR_ENV)
+    if not out_dir or not _records:
+        return
+    os.makedirs(out_dir, exist_ok=True)
+    payload = {
+        "run_id": os.environ.get(RUN_ID_ENV, ""),
+        "script": _SCRIPT,
+        "pid": os.getpid(),
+        "start": _PROCESS_START,
+        "wall_s": time.time() - _PROCESS_START,
+        "cpu_s": time.process_time() - _PROCESS_CPU_START,
+        "max_rss_bytes": _max_rss_bytes(),
+        "memory_mode": "tracemalloc" if USE_TRACEMALLOC else "rss",
+        "stages": [r.to_dict() for r in sorted(_records, key=lambda r: r.start)],
+    }
+    path = os.path.join(out_dir, f"{_SCRIPT}.{os.getpid()}.json")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=2)
+
+
+atexit.register(_write_process_record)
+
+
+def merge_run(metrics_dir, chrome_trace=False):
+    """Merge per-process records in ``metrics_dir`` into run.json (and trace.json)."""
+    processes = []
+    for path in sorted(glob.glob(os.path.join(metrics_dir, "*.*.json"))):
+        with open(path, encoding="utf-8") as fh:
+            processes.append(json.load(fh))
+    processes.sort(key=lambda p: p["start"])
+
+    totals = {}
+    for proc in processes:
+        for st in proc["stages"]:
+            key = f"{proc['script']}:{st['name']}"
+            agg = totals.setdefault(key, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_mem_bytes": 0, "counts": {}})
+            agg["calls"] += 1
+            agg["wall_s"] += st["wall_s"] or 0.0
+            agg["cpu_s"] += st["cpu_s"] or 0.0
+            agg["peak_mem_bytes"] = max(agg["peak_mem_bytes"], st["peak_mem_bytes"] or 0)
+            for k, v in st["counts"].items():
+                agg["counts"][k] = agg["counts"].get(k, 0) + v
+
+    run = {
+        "run_id": processes[0]["run_id"] if processes else "",
+        "scripts": [
+            {k: p[k] for k in ("script", "pid", "start", "wall_s", "cpu_s", "max_rss_bytes", "memory_mode")}
+            for p in processes
+        ],
+        "stage_totals": totals,
+        "stages": [dict(st, script=p["script"]) for p in processes for st in p["stages"]],
+    }
+    run_path = os.path.join(metrics_dir, "run.json")
+    with open(run_path, "w", encoding="utf-8") as fh:
+        json.dump(run, fh, indent=2)
+    print(f"Wrote run metrics: {run_path}")
+
+    if chrome_trace:
+        events = []
+        for p in processes:
+            events.append({"ph": "M", "name": "process_name", "pid": p["pid"], "args": {"name": p["script"]}})
+            events.append({"ph": "X", "name": p["script"], "pid": p["pid"], "tid": 0,
+                           "ts": p["start"] * 1e6, "dur": p["wall_s"] * 1e6,
+                           "args": {"cpu_s": p["cpu_s"], "max_rss_bytes": p["max_rss_bytes"]}})
+            for st in p["stages"]:
+                events.append({"ph": "X", "name": st["name"], "pid": p["pid"], "tid": 0,
+                               "ts": st["start"] * 1e6, "dur": (st["wall_s"] or 0.0) * 1e6,
+                               "args": dict(st["attrs"], cpu_s=st["cpu_s"],
+                                            peak_mem_bytes=st["peak_mem_bytes"], **st["counts"])})
+        trace_path = os.path.join(metrics_dir, "trace.json")
+        with open(trace_path, "w", encoding="utf-8") as fh:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fh)
+        print(f"Wrote Chrome trace: {trace_path}")
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge per-script stage metrics of one run.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_merge = sub.add_parser("merge", help="Merge <script>.<pid>.json files into run.json.")
+    p_merge.add_argument("metrics_dir")
+    p_merge.add_argument("--chrome-trace", action="store_true", help="Also write trace.json.")
+    args = parser.parse_args()
+    if args.cmd == "merge":
+        merge_run(args.metrics_dir, chrome_trace=args.chrome_trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Interacting functions of all systems as one directed graph in CSR arrays.
+
+Every row of a WPP table links its lowest function (the one 02 uses) to each
+function or process named in its Interaction/N columns. Nodes are keyed by
+ontology ID when the cell has one (Function/N/ID, Interaction/N/ID) and by
+the normalized label otherwise, so the same function in two systems' tables
+is one node and the graph spans systems. ``build`` deduplicates the links
+into CSR arrays (``indptr``/``indices``, plus the reverse for incoming
+links). It also precomputes in/out degrees, weakly connected components, and
+which systems mention each node and each link.
+
+    graph = interactions.load()
+    node = graph.find("GO:0001696")            # or a label: "gastric acid secretion"
+    graph.neighbors(node)                      # nodes it links to
+    graph.reachable(node, k=2, direction="both")   # {node: hops}
+
+14 writes the graph to ``interaction_graph/``. Query it with:
+
+    PYTHONPATH=../../scripts python -m wpp.interactions stats
+    PYTHONPATH=../../scripts python -m wpp.interactions neighbors "gastric acid secretion" --hops 2
+"""
+import argparse
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+from wpp import entities, rollup
+
+GRAPH_PATH = "./interaction_graph/interaction_graph.npz"
+NODES_PATH = "./interaction_graph/interaction_nodes.csv"
+FORMAT = 1
+
+_INTERACTION_COLUMN = re.compile(r"Interaction/(\d+)$")
+_ARRAYS = ("keys", "labels", "systems", "node_systems", "indptr", "indices", "weights", "edge_systems",
+           "rindptr", "rindices", "component")
+
+
+def normalize_labels(values):
+    """Lowercase, punctuation as spaces, whitespace collapsed (fuzzy.normalize_label on a Series)."""
+    text = values.astype("string").str.lower().str.replace(r"[^\w\s]", " ", regex=True)
+    return text.str.replace(r"\s+", " ", regex=True).str.strip().replace("", pd.NA)
+
+
+def node_keys(names, ids):
+    """Node key of every cell: the first CURIE of the ID cell, else "label:<normalized name>"."""
+    key = entities.id_key(ids) if ids is not None else pd.Series(pd.NA, index=names.index, dtype="string")
+    return key.fillna("label:" + normalize_labels(names))
+
+
+def _with_id(df, col):
+    id_col = rollup.find_column(df.columns, [f"{col}/ID"])
+    return df[col], (df[id_col] if id_col else None)
+
+
+def edges(df, system):
+    """Links of one table (or a piece of one): DataFrame source, source_label, target, target_label, system."""
+    lowest_name = pd.Series(pd.NA, index=df.index, dtype="string")
+    lowest_key = pd.Series(pd.NA, index=df.index, dtype="string")
+    for _, col in rollup.function_columns(df.columns):
+        names, ids = _with_id(df, col)
+        names = names.astype("string").str.strip()
+        present = names.notna() & ~names.str.lower().isin(["", "nan"])
+        lowest_name = names.where(present, lowest_name)
+        lowest_key = node_keys(names, ids).where(present, lowest_key)
+
+    links = []
+    targets = sorted((int(m.group(1)), c) for c in df.columns if (m := _INTERACTION_COLUMN.match(str(c).strip())))
+    for _, col in targets:
+        names, ids = _with_id(df, col)
+        names = names.astype("string").str.strip()
+        links.append(pd.DataFrame({"source": lowest_key, "source_label": lowest_name,
+                                   "target": node_keys(names, ids), "target_label": names}))
+    if not links:
+        return pd.DataFrame(columns=["source", "source_label", "target", "target_label", "system"])
+    out = pd.concat(links, ignore_index=True).dropna(subset=["source", "target"])
+    out = out[(out["source"] != out["target"]) & ~out["target"].isin(["label:nan"])]
+    return out.assign(system=system)
+
+
+def _gather(indptr, indices, nodes):
+    """Concatenated neighbor lists of ``nodes`` in one vectorized slice."""
+    starts, stops = indptr[nodes], indptr[nodes + 1]
+    lengths = stops - starts
+    if not lengths.sum():
+        return np.zeros(0, dtype=indices.dtype)
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return indices[offsets + np.arange(lengths.sum())]
+
+
+def _components(n, src, dst):
+    """Weakly connected component of every node, numbered by size (0 = largest)."""
+    label = np.arange(n)
+    while True:
+        low = np.minimum(label[src], label[dst])
+        before = label.copy()
+        np.minimum.at(label, src, low)
+        np.minimum.at(label, dst, low)
+        label = label[label]  # pointer jumping
+        if np.array_equal(label, before):
+            break
+    roots, inverse, sizes = np.unique(label, return_inverse=True, return_counts=True)
+    rank = np.empty(len(roots), dtype=np.int32)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(len(roots))
+    return rank[inverse]
+
+
+class InteractionGraph:
+    """CSR adjacency (out and in) over node keys, with labels, systems and components."""
+
+    def __init__(self, keys, labels, systems, node_systems, indptr, indices, weights, edge_systems,
+                 rindptr, rindices, component):
+        self.keys, self.labels, self.systems, self.node_systems = keys, labels, systems, node_systems
+        self.indptr, self.indices, self.weights, self.edge_systems = indptr, indices, weights, edge_systems
+        self.rindptr, self.rindices, self.component = rindptr, rindices, component
+        self.out_degree = np.diff(indptr)
+        self.in_degree = np.diff(rindptr)
+        self._by_key = {str(k): i for i, k in enumerate(keys)}
+        # labels of nodes keyed by ID are found too; the first node with a label wins
+        for i, label in enumerate(normalize_labels(pd.Series(labels, dtype="string"))):
+            if not pd.isna(label):
+                self._by_key.setdefault("label:" + label, i)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, name):
+        """Node of an ontology ID or a label, or -1."""
+        for key in (str(name).strip().upper(), "label:" + str(normalize_labels(pd.Series([name])).iloc[0])):
+            if key in self._by_key:
+                return self._by_key[key]
+        return -1
+
+    def neighbors(self, node, direction="out"):
+        """Nodes linked from (``out``), to (``in``) or either way (``both``) of ``node``."""
+        nodes = np.array([node])
+        found = []
+        if direction in ("out", "both"):
+            found.append(_gather(self.indptr, self.indices, nodes))
+        if direction in ("in", "both"):
+            found.append(_gather(self.rindptr, self.rindices, nodes))
+        return np.unique(np.concatenate(found))
+
+    def reachable(self, node, k=1, direction="out"):
+        """{node: hops} of every node within ``k`` links of ``node`` (itself excluded)."""
+        seen = np.zeros(len(self), dtype=bool)
+        seen[node] = True
+        frontier, hops = np.array([node]), {}
+        for step in range(1, k + 1):
+            parts = []
+            if direction in ("out", "both"):
+                parts.append(_gather(self.indptr, self.indices, frontier))
+            if direction in ("in", "both"):
+                parts.append(_gather(self.rindptr, self.rindices, frontier))
+            frontier = np.unique(np.concatenate(parts))
+            frontier = frontier[~seen[frontier]]
+            if not frontier.size:
+                break
+            seen[frontier] = True
+            hops.update((int(i), step) for i in frontier)
+        return hops
+
+    def node_systems_of(self, node):
+        return [str(s) for s in self.systems[self.node_systems[node]]]
+
+    def cross_system_edges(self):
+        """(source, target) of links whose two ends are mentioned by different sets of systems."""
+        src = np.repeat(np.arange(len(self)), self.out_degree)
+        differ = (self.node_systems[src] != self.node_systems[self.indices]).any(axis=1)
+        return src[differ], self.indices[differ]
+
+    def degree_stats(self):
+        sizes = np.bincount(self.component) if len(self) else np.zeros(0, dtype=int)
+        return {
+            "nodes": len(self), "edges": int(len(self.indices)), "components": int(len(sizes)),
+            "largest_component": int(sizes.max()) if len(sizes) else 0,
+            "mean_out_degree": float(self.out_degree.mean()) if len(self) else 0.0,
+            "max_out_degree": int(self.out_degree.max()) if len(self) else 0,
+            "max_in_degree": int(self.in_degree.max()) if len(self) else 0,
+            "multi_system_nodes": int((self.node_systems.sum(axis=1) > 1).sum()),
+        }
+
+    def nodes_frame(self):
+        """One row per node: key, label, systems, degrees and component."""
+        return pd.DataFrame({
+            "node": self.keys, "label": self.labels,
+            "systems": ["; ".join(self.node_systems_of(i)) for i in range(len(self))],
+            "out_degree": self.out_degree, "in_degree": self.in_degree, "component": self.component,
+        })
+
+    def save(self, path):
+        np.savez_compressed(path, format=np.int32(FORMAT), **{name: getattr(self, name) for name in _ARRAYS})
+
+
+def build(edge_frames):
+    """InteractionGraph from the frames returned by ``edges``."""
+    frame = pd.concat(edge_frames, ignore_index=True) if edge_frames else pd.DataFrame(
+        columns=["source", "source_label", "target", "target_label", "system"])
+    ends = pd.concat([frame[["source", "source_label"]].set_axis(["key", "label"], axis=1),
+                      frame[["target", "target_label"]].set_axis(["key", "label"], axis=1)])
+    ends = ends.dropna(subset=["key"])
+    keys = np.unique(ends["key"].to_numpy(dtype=str))
+    # display label: the spelling used most often, ties alphabetically (independent of row order)
+    counts = ends.dropna(subset=["label"]).value_counts(["key", "label"]).reset_index(name="n")
+    labels = counts.sort_values(["n", "label"], ascending=[False, True]).drop_duplicates("key").set_index("key")["label"]
+    labels = labels.reindex(keys).fillna(pd.Series(keys, index=keys).str.removeprefix("label:"))
+    systems = np.unique(frame["system"].to_numpy(dtype=str))
+
+    n = len(keys)
+    src = np.searchsorted(keys, frame["source"].to_numpy(dtype=str))
+    dst = np.searchsorted(keys, frame["target"].to_numpy(dtype=str))
+    sys_code = np.searchsorted(systems, frame["system"].to_numpy(dtype=str))
+    node_systems = np.zeros((n, len(systems)), dtype=bool)
+    node_systems[src, sys_code] = True
+    node_systems[dst, sys_code] = True
+
+    # one entry per distinct (source, target): weight = table rows stating it
+    pair = src.astype(np.int64) * max(n, 1) + dst
+    uniq, inverse, weights = np.unique(pair, return_inverse=True, return_counts=True)
+    edge_systems = np.zeros((len(uniq), len(systems)), dtype=bool)
+    edge_systems[inverse, sys_code] = True
+    e_src, e_dst = (uniq // max(n, 1)).astype(np.int32), (uniq % max(n, 1)).astype(np.int32)
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(e_src, minlength=n)))).astype(np.int64)
+    order = np.argsort(e_dst, kind="stable")
+    rindptr = np.concatenate(([0], np.cumsum(np.bincount(e_dst, minlength=n)))).astype(np.int64)
+    return InteractionGraph(keys, labels.to_numpy(dtype=str), systems, node_systems, indptr, e_dst,
+                            weights.astype(np.int32), edge_systems, rindptr, e_src[order],
+                            _components(n, e_src, e_dst))
+
+
+def load(path=GRAPH_PATH):
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["format"]) != FORMAT:
+            raise ValueError(f"{path} has graph format {int(data['format'])}, expected {FORMAT}")
+        return InteractionGraph(*(data[name] for name in _ARRAYS))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the interacting-functions graph written by 14.")
+    parser.add_argument("--graph", default=GRAPH_PATH, help=f"Graph file (default: {GRAPH_PATH}).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="Node, edge, degree and component statistics.")
+    nb = sub.add_parser("neighbors", help="Nodes within some links of a function or process.")
+    nb.add_argument("node", help="Ontology ID or label.")
+    nb.add_argument("--hops", type=int, default=1)
+    nb.add_argument("--direction", choices=("out", "in", "both"), default="both")
+    args = parser.parse_args(argv)
+
+    graph = load(args.graph)
+    if args.cmd == "stats":
+        for name, value in graph.degree_stats().items():
+            print(f"{name:>20}: {value:.2f}" if isinstance(value, float) else f"{name:>20}: {value}")
+        return 0
+    node = graph.find(args.node)
+    if node < 0:
+        print(f"No node {args.node!r}")
+        return 1
+    print(f"{graph.labels[node]} ({graph.keys[node]}; {', '.join(graph.node_systems_of(node))})")
+    for other, hops in sorted(graph.reachable(node, args.hops, args.direction).items(), key=lambda x: (x[1], x[0])):
+        print(f"  {hops}  {graph.labels[other]}  ({'; '.join(graph.node_systems_of(other))})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
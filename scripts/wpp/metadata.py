@@ -0,0 +1,216 @@
+"""
+Registry of the metadata block of every input table, across all weeks.
+
+The rows above a table's ``Function/1`` header hold its title, authors and
+their ORCIDs, reviewers, publications, DOI, ``Date:`` and ``Version
+Number:``. ``scan`` reads only those rows (``tables.read_preambles`` stops
+at the header row) and keeps one record per (week, system) in a small SQLite
+store, ``wpp_metadata.sqlite`` at the repo root (or WPP_METADATA_DB). A
+table whose size and mtime are unchanged since it was recorded is not
+opened again, so rescanning every week is cheap.
+
+Version history and "which tables changed version this week" are queries
+on the store; no table is parsed for them:
+
+    PYTHONPATH=scripts python -m wpp.metadata scan               # every week in output_iterative/
+    PYTHONPATH=scripts python -m wpp.metadata changed            # version changes in the latest week
+    PYTHONPATH=scripts python -m wpp.metadata changed 2026-03-09
+    PYTHONPATH=scripts python -m wpp.metadata history Urinary_System
+
+run.sh scans the week it just fetched.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+
+import pandas as pd
+
+from wpp import backfill, instrument, tables
+
+DB_ENV = "WPP_METADATA_DB"
+DEFAULT_DB = os.path.join(backfill.REPO_DIR, "wpp_metadata.sqlite")
+INPUT_SUBDIR = os.path.join("data", "WPP Input Tables")
+
+# squashed "Key:" cell -> column
+FIELDS = {
+    "authornames": "authors",
+    "authororcids": "author_orcids",
+    "reviewernames": "reviewers",
+    "reviewerorcids": "reviewer_orcids",
+    "generalpublications": "publications",
+    "datadoi": "doi",
+    "date": "date",
+    "versionnumber": "version",
+}
+COLUMNS = ("title",) + tuple(FIELDS.values()) + ("date_iso", "extra")
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS table_metadata (
+    week TEXT NOT NULL,
+    system TEXT NOT NULL,
+    file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    {", ".join(f"{c} TEXT" for c in COLUMNS)},
+    PRIMARY KEY (week, system)
+);
+CREATE INDEX IF NOT EXISTS ix_metadata_system ON table_metadata (system, week);
+CREATE INDEX IF NOT EXISTS ix_metadata_file ON table_metadata (week, file);
+"""
+
+
+def db_path():
+    return os.environ.get(DB_ENV) or DEFAULT_DB
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or db_path())
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _squash(text):
+    return re.sub(r"[^a-z]", "", text.lower())
+
+
+def parse_preamble(rows):
+    """{column: value} from the metadata rows of one table (see tables.read_preambles)."""
+    record = dict.fromkeys(COLUMNS)
+    extra = {}
+    for cells in rows:
+        key, values = cells[0], [c for c in cells[1:] if c]
+        if key.endswith(":"):
+            field = FIELDS.get(_squash(key))
+            value = "; ".join(values) or None
+            if field:
+                record[field] = value
+            elif value:
+                extra[key[:-1].strip()] = value
+        elif record["title"] is None and not values:
+            record["title"] = key  # the first free-standing cell; instruction rows come later
+    if record["date"]:
+        parsed = pd.to_datetime(record["date"], errors="coerce", format="mixed")
+        record["date_iso"] = parsed.strftime("%Y-%m-%d") if not pd.isna(parsed) else None
+    record["extra"] = json.dumps(extra, sort_keys=True) if extra else None
+    return record
+
+
+def week_dirs(base=backfill.WEEK_BASE):
+    """Week folders under ``base`` that have an input folder, oldest first."""
+    return sorted(os.path.dirname(os.path.dirname(d)) for d in glob.glob(os.path.join(base, "*", INPUT_SUBDIR)))
+
+
+def scan_week(conn, week_dir):
+    """Record the metadata of the tables of one week; returns (tables read, tables unchanged)."""
+    week = os.path.basename(os.path.normpath(week_dir))
+    paths = tables.list_input_files(os.path.join(week_dir, INPUT_SUBDIR), recursive=True, skip_invalid=False)
+    known = {file: (size, mtime) for file, size, mtime in
+             conn.execute("SELECT DISTINCT file, size, mtime_ns FROM table_metadata WHERE week = ?", (week,))}
+    read = unchanged = 0
+    for path in paths:
+        file = os.path.relpath(path, os.path.join(week_dir, INPUT_SUBDIR))
+        st = os.stat(path)
+        if known.pop(file, None) == (st.st_size, st.st_mtime_ns):
+            unchanged += 1
+            continue
+        try:
+            with instrument.stage("read_preamble", table=file):
+                preambles = tables.read_preambles(path)
+        except Exception as e:
+            print(f"[WARN] Could not read the metadata of {file} ({week}): {e}")
+            continue
+        conn.execute("DELETE FROM table_metadata WHERE week = ? AND file = ?", (week, file))
+        for name, rows in preambles:
+            record = parse_preamble(rows)
+            conn.execute(
+                f"INSERT OR REPLACE INTO table_metadata (week, system, file, size, mtime_ns, {', '.join(COLUMNS)}) "
+                f"VALUES (?, ?, ?, ?, ?, {', '.join('?' * len(COLUMNS))})",
+                (week, os.path.splitext(name)[0], file, st.st_size, st.st_mtime_ns, *(record[c] for c in COLUMNS)),
+            )
+        read += 1
+    # tables that are gone from the week folder
+    for file in known:
+        conn.execute("DELETE FROM table_metadata WHERE week = ? AND file = ?", (week, file))
+    conn.commit()
+    instrument.count("preambles_read", read)
+    return read, unchanged
+
+
+def changes(conn, week=None):
+    """
+    DataFrame of the systems of ``week`` (default: the latest) whose version
+    differs from their previous recorded week, or that are new that week.
+    """
+    week = week or conn.execute("SELECT MAX(week) FROM table_metadata").fetchone()[0]
+    return pd.read_sql_query(
+        """
+        SELECT system, previous_week, previous_version, version, date FROM (
+            SELECT week, system, version, date,
+                   LAG(week) OVER w AS previous_week, LAG(version) OVER w AS previous_version
+            FROM table_metadata WINDOW w AS (PARTITION BY system ORDER BY week)
+        )
+        WHERE week = ? AND (previous_week IS NULL OR version IS NOT previous_version)
+        ORDER BY system
+        """, conn, params=(week,))
+
+
+def history(conn, system):
+    """Weeks at which ``system`` got a new version (its first week included)."""
+    return pd.read_sql_query(
+        """
+        SELECT week, version, date, authors, reviewers FROM (
+            SELECT *, LAG(version) OVER (ORDER BY week) AS previous_version, ROW_NUMBER() OVER (ORDER BY week) AS n
+            FROM table_metadata WHERE system = ?
+        )
+        WHERE n = 1 OR version IS NOT previous_version
+        ORDER BY week
+        """, conn, params=(system,))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Metadata (authors, date, version) of the input tables, per week.")
+    parser.add_argument("--db", help=f"SQLite file (default: ${DB_ENV} or {DEFAULT_DB}).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sc = sub.add_parser("scan", help="Record the metadata blocks of the week folders.")
+    sc.add_argument("weeks", nargs="*", help=f"Week folders (default: all under {backfill.WEEK_BASE}).")
+    ch = sub.add_parser("changed", help="Tables whose version changed in a week.")
+    ch.add_argument("week", nargs="?", help="Week folder name (default: the latest recorded).")
+    hi = sub.add_parser("history", help="Version history of one system.")
+    hi.add_argument("system", help="Input table name without extension, e.g. Urinary_System.")
+    sh = sub.add_parser("show", help="Metadata of every table of a week.")
+    sh.add_argument("week", nargs="?", help="Week folder name (default: the latest recorded).")
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    try:
+        if args.cmd == "scan":
+            total_read = total_unchanged = 0
+            for week_dir in args.weeks or week_dirs():
+                read, unchanged = scan_week(conn, week_dir)
+                total_read += read
+                total_unchanged += unchanged
+            print(f"Metadata read from {total_read} table(s), {total_unchanged} unchanged")
+            return 0
+        with pd.option_context("display.width", 200, "display.max_colwidth", 40):
+            if args.cmd == "changed":
+                df = changes(conn, args.week)
+                print(df.to_string(index=False) if len(df) else "No version changes")
+            elif args.cmd == "history":
+                df = history(conn, args.system)
+                print(df.to_string(index=False) if len(df) else f"No records for {args.system}")
+            else:
+                week = args.week or conn.execute("SELECT MAX(week) FROM table_metadata").fetchone()[0]
+                df = pd.read_sql_query("SELECT system, version, date, authors, reviewers, doi FROM table_metadata "
+                                       "WHERE week = ? ORDER BY system", conn, params=(week,))
+                print(df.to_string(index=False))
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Atomic output writer with a per-week manifest.
+
+Every artifact is written to a temporary file in ``.wpp_staging/`` inside the
+week folder and then renamed into place, so a crashed or interrupted stage
+never leaves a half-written CSV behind. Each write adds an entry to
+``manifest.json`` in the week folder:
+
+    "temporal_spatial_output/Urinary_System_spatial_temporal_table.csv": {
+        "size": 5123, "rows": 9, "sha256": "...", "encoding": "utf-8-sig",
+        "stage": "02-WPP_tables", "code_version": "3f2a9c1e0b7d",
+        "run_id": "20260817_080001", "written_at": "2026-08-17T08:00:04"
+    }
+
+CSV outputs go through ``write_csv``; anything else (plots, JSON) is written
+to the path yielded by ``staged``:
+
+    outputs.write_csv(df, OUTPUT_PATH, encoding="utf-8-sig")
+    with outputs.staged(out_png) as tmp:
+        plt.savefig(tmp, bbox_inches="tight")
+
+Paths are relative to the CWD, i.e. the week folder run.sh runs stages in.
+List what a run produced with:
+
+    PYTHONPATH=scripts python -m wpp.outputs list <week_dir> [--run RUN_ID]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from wpp import instrument
+
+MANIFEST = "manifest.json"
+STAGING_DIR = ".wpp_staging"
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_VERSIONS = {}
+
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def current_stage():
+    """Name of the running script (e.g. "02-WPP_tables"), as instrument uses it."""
+    return os.path.splitext(os.path.basename(sys.argv[0] or "interactive"))[0]
+
+
+def code_version(script=None):
+    """
+    Short hash of a script and the wpp package it imports. Outputs written by
+    the same code have the same version, whatever the git state.
+    """
+    script = os.path.abspath(script or sys.argv[0] or "")
+    version = _VERSIONS.get(script)
+    if version is None:
+        h = hashlib.sha1()
+        for path in [script, *sorted(glob.glob(os.path.join(PACKAGE_DIR, "*.py")))]:
+            if os.path.isfile(path):
+                with open(path, "rb") as fh:
+                    h.update(fh.read())
+        version = _VERSIONS[script] = h.hexdigest()[:12]
+    return version
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _manifest_key(path, root):
+    return os.path.relpath(os.path.abspath(path), os.path.abspath(root)).replace(os.sep, "/")
+
+
+def read_manifest(root="."):
+    path = os.path.join(root, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+@contextmanager
+def _manifest_lock(root):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(root, f".{MANIFEST}.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def record(path, root=".", stage=None, encoding=None, rows=None):
+    """Add or refresh the manifest entry of an artifact that is already in place."""
+    entry = {
+        "size": os.path.getsize(path),
+        "rows": rows,
+        "sha256": file_sha256(path),
+        "encoding": encoding,
+        "stage": stage or current_stage(),
+        "code_version": code_version(),
+        "run_id": os.environ.get(instrument.RUN_ID_ENV, ""),
+        "written_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    merge_manifest({_manifest_key(path, root): entry}, root)
+    instrument.count("artifacts_written")
+    return entry
+
+
+def merge_manifest(entries, root="."):
+    """Add or replace manifest entries ({relative path: entry}) in one atomic write."""
+    with _manifest_lock(root):
+        manifest = read_manifest(root)
+        manifest.update(entries)
+        tmp = os.path.join(root, f".{MANIFEST}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(dict(sorted(manifest.items())), fh, indent=2)
+        os.replace(tmp, os.path.join(root, MANIFEST))
+
+
+@contextmanager
+def staged(path, root=".", stage=None, encoding=None, rows=None):
+    """
+    Yield a temporary path to write ``path`` to; on success it is renamed into
+    place and recorded in the manifest, on error it is removed.
+    """
+    staging = os.path.join(root, STAGING_DIR)
+    os.makedirs(staging, exist_ok=True)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # keep the extension so writers that infer the format (savefig) still work
+    fd, tmp = tempfile.mkstemp(dir=staging, suffix=os.path.splitext(path)[1])
+    os.close(fd)
+    # mkstemp files are private (0600); give outputs the mode a plain open() would
+    os.chmod(tmp, 0o666 & ~_UMASK)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    record(path, root=root, stage=stage, encoding=encoding, rows=rows)
+
+
+def write_csv(df, path, root=".", stage=None, encoding="utf-8", index=False, **kwargs):
+    """``df.to_csv`` through the staging folder, recorded in the manifest."""
+    with staged(path, root=root, stage=stage, encoding=encoding, rows=len(df)) as tmp:
+        df.to_csv(tmp, index=index, encoding=encoding, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the output manifest of a week folder.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    ls = sub.add_parser("list", help="List the artifacts in the manifest.")
+    ls.add_argument("week", nargs="?", default=".")
+    ls.add_argument("--run", help="Only artifacts written by this run id.")
+    ls.add_argument("--stage", help="Only artifacts written by this stage.")
+    args = parser.parse_args(argv)
+
+    manifest = read_manifest(args.week)
+    shown = 0
+    for path, e in manifest.items():
+        if (args.run and e.get("run_id") != args.run) or (args.stage and e.get("stage") != args.stage):
+            continue
+        rows = "" if e.get("rows") is None else f"{e['rows']} rows, "
+        stale = f", STALE copy fetched {e['fetched_at']}" if e.get("stale") else ""
+        print(f"{path}  ({rows}{e['size']} bytes, {e['stage']}, {e['sha256'][:12]}{stale})")
+        shown += 1
+    print(f"{shown} artifact(s) in {os.path.join(args.week, MANIFEST)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Pipelined weekly run: overlap the sheet downloads with per-system work.
+
+run.sh normally downloads every sheet, then runs every script over all
+systems. In pipelined mode (WPP_PIPELINE=1 in run.sh) the sheets are
+downloaded in parallel threads, and each sheet is queued for its per-system
+stages as soon as it lands. A worker process handles one sheet in a
+private folder holding only that table, and runs:
+
+- 00 on that table, so an invalid table is skipped the way the full run
+  would skip it,
+- the per-table stages (02), whose outputs go straight into the week folder
+  and manifest,
+- the partial stages 11 and 13. Their parses land in the shared parse
+  store (wpp/shared.py), so the full runs of 11 and 13 attach to them
+  instead of parsing again. Without pyarrow there is no store to warm, and
+  these runs are skipped.
+
+Network stages (01, the ASCT+B master) start together with the downloads.
+The per-sheet stages read the master, so they start once it is in place.
+The global stages (00, 03-06, 07/08, 10-13) run in order after the last
+sheet is done, each as its own process like in run.sh. A sheet whose
+download fails is taken from the input cache (wpp/inputcache.py) and
+flagged stale in the manifest. With ``--kg`` the tables are ingested from
+a local wpp-kg checkout instead (wpp/checkout.py), and only the tables that
+changed since the last run (in this week folder or the latest earlier one)
+go through the per-sheet stages. The others take their per-table outputs
+from the earlier week; if no table changed and every output is current,
+nothing runs.
+
+    PYTHONPATH=scripts python -m wpp.pipeline output_iterative/<date> --sheets sheets_to_fetch.csv
+"""
+import argparse
+import contextlib
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+
+from wpp import backfill, checkout, inputcache, instrument, outputs, shared, stages, tables
+
+
+def read_sheet_list(path):
+    """[(file name, url)] from sheets_to_fetch.csv (name, file name, url; no header)."""
+    sheets = []
+    with open(path, newline="", encoding="utf-8") as fh:
+        for row in csv.reader(fh):
+            if len(row) >= 3 and row[1].strip() and row[2].strip():
+                sheets.append((row[1].strip(), row[2].strip()))
+    return sheets
+
+
+def run_script(stage, week_dir, log_path):
+    """Run a script in its own process with CWD set to the week folder, as run.sh does."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [stages.SCRIPTS_DIR, os.environ.get("PYTHONPATH")])))
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        code = subprocess.call([sys.executable, os.path.join(stages.SCRIPTS_DIR, stage.script)],
+                               cwd=week_dir, stdout=log, stderr=subprocess.STDOUT, env=env)
+    return code == 0, time.perf_counter() - start
+
+
+def sheet_chain(stage_list, warm_store=True):
+    """Stages run per sheet: per-table stages and the partial stages before or, with a store, after them."""
+    per_table = [s for s in stage_list if s.per_table]
+    chain = []
+    for stage in stage_list:
+        if stage.network or not (stage.per_table or stage.partial):
+            continue
+        # a partial stage that feeds a per-table stage (00 -> the validation report) always runs
+        if stage.per_table or warm_store or any(stages.feeds(stage, t) for t in per_table):
+            chain.append(stage)
+    return chain
+
+
+def run_sheet(week_dir, table, chain, log_dir, run_id):
+    """Worker: run the per-sheet chain on one table and publish its per-table outputs."""
+    os.environ[instrument.RUN_ID_ENV] = run_id
+    os.environ.pop(instrument.METRICS_DIR_ENV, None)
+    label = os.path.splitext(table)[0].replace(os.sep, "_")
+    results = []
+    work_dir = tempfile.mkdtemp(prefix=f"wpp-sheet-{label}-")
+    try:
+        for stage in chain:
+            stages.prepare_work_dir(stage, week_dir, work_dir, table)
+            log_path = os.path.join(log_dir, f"{backfill.stage_name(stage)}.{label}_{run_id}.log")
+            with open(log_path, "w", encoding="utf-8") as log, \
+                    contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+                ok, seconds = stages.run_stage(stage, work_dir)
+            results.append((stage.script, ok, seconds))
+        published = backfill.publish(work_dir, week_dir,
+                                     only_stages={backfill.stage_name(s) for s in chain if s.per_table}, table=table)
+    finally:
+        tables.clear_cache(work_dir)  # keyed by the work dir's realpath, which is never reused
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {"table": table, "stages": results, "published": published}
+
+
+def reuse_unchanged(kg_dir, week_dir, chain):
+    """
+    Ingest a checkout into the week folder (wpp/checkout.py) and return the
+    input paths that need the per-sheet chain: the changed tables, and the
+    unchanged ones that have no current per-table outputs in this week or the
+    earlier week they were compared with. Outputs of the earlier week are
+    copied over for the rest, and when no table changed, its global outputs too.
+    """
+    input_dir = os.path.join(week_dir, stages.TABLES)
+    baseline = checkout.previous_week(week_dir)
+    changed = checkout.ingest(kg_dir, week_dir, baseline=baseline)
+    todo = set(changed)
+    versions = backfill.current_versions(backfill.replayed_stages())
+    per_table = {backfill.stage_name(s) for s in chain if s.per_table}
+    done = checkout.table_outputs(week_dir, per_table, versions)
+    earlier = checkout.table_outputs(baseline, per_table, versions) if baseline else {}
+    reused = {}
+    for name in set(checkout.find_tables(kg_dir)) - todo - set(done):
+        if name in earlier:
+            reused.update(earlier[name])
+        else:
+            todo.add(name)
+    if baseline and not todo:
+        # nothing changed: the earlier week's global outputs are this week's too
+        own = outputs.read_manifest(week_dir)
+        reused.update({rel: e for rel, e in outputs.read_manifest(baseline).items()
+                       if rel not in own and e.get("stage") != inputcache.STAGE
+                       and e.get("code_version") == versions.get(e.get("stage"), e.get("code_version"))
+                       and os.path.exists(os.path.join(baseline, rel))})
+    if reused:
+        n = checkout.reuse_outputs(baseline, week_dir, reused)
+        print(f"Reused {n} artifact(s) of unchanged tables from {os.path.basename(baseline)}")
+    return [os.path.join(input_dir, name) for name in sorted(todo)]
+
+
+def run_pipeline(week_dir, sheets_path=None, log_dir=None, jobs=None, fetch_jobs=4,
+                 timeout=inputcache.FETCH_TIMEOUT, network=True, kg_dir=None):
+    """Download (or ingest) and process one week; returns the number of failed downloads and stages."""
+    week_dir = os.path.abspath(week_dir)
+    input_dir = os.path.join(week_dir, stages.TABLES)
+    log_dir = log_dir or os.path.join(backfill.REPO_DIR, "output_logs", "logs")
+    run_id = os.environ.setdefault(instrument.RUN_ID_ENV, time.strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(log_dir, exist_ok=True)
+    stage_list = stages.discover()
+    chain = sheet_chain(stage_list, warm_store=shared.available())
+
+    present = None
+    if kg_dir:
+        present = reuse_unchanged(kg_dir, week_dir, chain)
+        stale = backfill.stale_stages(week_dir, backfill.current_versions(backfill.replayed_stages()))
+        if not present and not stale:
+            print(f"No table changed in {kg_dir} and all outputs are current - nothing to do.")
+            return 0
+        if any(backfill.stage_name(s) in stale for s in chain if s.per_table):
+            # per-table outputs written by other code: every table goes through the chain again
+            present = None
+        print(f"Ingested from {kg_dir}; {'all' if present is None else len(present)} table(s) to process.")
+
+    own_store = not shared.store_dir()
+    if own_store:
+        os.environ[shared.STORE_ENV] = tempfile.mkdtemp(prefix="wpp-shared-")
+
+    network = [s for s in stage_list if s.network] if network else []
+    sheets = read_sheet_list(sheets_path) if sheets_path and os.path.exists(sheets_path) and not kg_dir else []
+    failures = failed_downloads = stale_inputs = 0
+    start = time.perf_counter()
+
+    def log_for(stage):
+        return os.path.join(log_dir, f"{backfill.stage_name(stage)}_{run_id}.log")
+
+    def settle(net):
+        """Wait for the network stages; returns how many failed."""
+        wait(net)
+        failed = 0
+        for future, stage in net.items():
+            ok, seconds = future.result()
+            failed += not ok
+            print(f"  {'ok  ' if ok else 'FAIL'} {stage.script} ({seconds:.1f}s)")
+        return failed
+
+    with ThreadPoolExecutor(max_workers=fetch_jobs + len(network)) as io_pool, \
+            ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as workers:
+        net = {io_pool.submit(run_script, s, week_dir, log_for(s)): s for s in network}
+        if sheets:
+            landed = [io_pool.submit(inputcache.fetch, url, os.path.join(input_dir, fname), week_dir, timeout)
+                      for fname, url in sheets]
+        else:
+            if present is None:
+                if not kg_dir:
+                    print("No sheets list - processing the tables already in the week folder.")
+                present = tables.list_input_files(input_dir, recursive=True, skip_invalid=False)
+            landed = [io_pool.submit(lambda p: (os.path.abspath(p), False), path) for path in present]
+
+        per_sheet = []
+        for item in as_completed(landed):
+            try:
+                path, stale = item.result()
+            except Exception as e:
+                print(f"ERROR: download failed: {e}")
+                failed_downloads += 1
+                continue
+            if net:
+                # the per-sheet stages read what the network stages write
+                failures += settle(net)
+                net = {}
+            table = os.path.relpath(path, input_dir)
+            stale_inputs += stale
+            print(f"  landed {table}{' (cached copy)' if stale else ''} ({time.perf_counter() - start:.1f}s)")
+            per_sheet.append(workers.submit(run_sheet, week_dir, table, chain, log_dir, run_id))
+
+        failures += settle(net)
+        for future in as_completed(per_sheet):
+            result = future.result()
+            bad = [script for script, ok, _ in result["stages"] if not ok]
+            failures += bool(bad)
+            print(f"  {'FAIL' if bad else 'ok  '} {result['table']} ({result['published']} artifacts)"
+                  + (f" failed: {', '.join(bad)}" if bad else ""))
+
+    if failed_downloads:
+        # like run.sh, a sheet with no download and no cached copy stops the run before the global stages
+        print(f"Not running the global stages: {failed_downloads} download(s) failed.")
+    else:
+        # global stages wait only for the last sheet
+        for stage in stage_list:
+            if stage.network or stage.per_table:
+                continue
+            ok, seconds = run_script(stage, week_dir, log_for(stage))
+            failures += not ok
+            print(f"  {'ok  ' if ok else 'FAIL'} {stage.script} ({seconds:.1f}s)")
+    if own_store:
+        shutil.rmtree(os.environ.pop(shared.STORE_ENV), ignore_errors=True)
+    if stale_inputs:
+        print(f"{stale_inputs} sheet(s) came from the input cache; they are flagged stale in manifest.json")
+    print(f"Pipeline done in {time.perf_counter() - start:.1f}s")
+    return failures + failed_downloads
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download and process a week with downloads and processing overlapped.")
+    parser.add_argument("week", help="Week folder.")
+    parser.add_argument("--sheets", help="sheets_to_fetch.csv (default: process the tables already present).")
+    parser.add_argument("--kg", help="Ingest the tables from this wpp-kg checkout instead of downloading them; "
+                                     "only the changed ones go through the per-sheet stages.")
+    parser.add_argument("--logs", help="Folder for the per-stage logs.")
+    parser.add_argument("--jobs", "-j", type=int, help="Worker processes for the per-sheet stages.")
+    parser.add_argument("--fetch-jobs", type=int, default=4, help="Parallel downloads.")
+    parser.add_argument("--timeout", type=float, default=inputcache.FETCH_TIMEOUT, help="Download timeout in seconds.")
+    parser.add_argument("--no-network", action="store_true",
+                        help="Skip the network stages (01) and use the ASCT+B master already in the week folder.")
+    args = parser.parse_args(argv)
+    failures = run_pipeline(args.week, args.sheets, args.logs, args.jobs, args.fetch_jobs, args.timeout,
+                            not args.no_network, args.kg)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Provenance side index: the input table rows behind every derived value.
+
+A stage tags what it aggregates with integer (table, row) pairs. ``table``
+is the position of the input table in the index's own table list, and
+``row`` is the row's offset under the header row. That offset is the index
+of the frames from ``tables.load_tables`` and ``tables.iter_tables``, in
+streaming mode too. A ``Collector`` gathers the pairs per key while the
+stage aggregates. ``freeze`` sorts them into CSR arrays:
+
+- ``keys``: the distinct keys, sorted. The parts of a composite key (time
+  range, spatial type, Function@Process) are joined by SEPARATOR,
+- ``indptr``: the pairs of ``keys[i]`` are ``table[indptr[i]:indptr[i+1]]``
+  and ``row[indptr[i]:indptr[i+1]]``,
+- ``table_names`` / ``table_paths``: the input tables the ids refer to.
+
+The index is saved next to the output it describes: ``x.csv`` gets
+``x.provenance.npz``. A lookup is a binary search over ``keys`` and
+needs no input table:
+
+    index = provenance.load("analysis/all_CT_statistics/cl_ids_missing_in_astcb.csv")
+    index.lookup("CL:0000019")            # [("Male_Reproductive_System.csv", 46)]
+    index = provenance.load("temporal_spatial_output/Urinary_System_spatial_temporal_table.csv")
+    index.lookup(time_range, spatial_type, function_at_process)
+    index.matching("1min - < 1hr", "CT")  # keys of one cell
+
+    PYTHONPATH=../../scripts python -m wpp.provenance lookup \\
+        analysis/all_CT_statistics/cl_ids_missing_in_astcb.csv CL:0000019 --show
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from wpp import outputs, tables
+
+SUFFIX = ".provenance.npz"
+SEPARATOR = "\x1f"
+FORMAT = 1
+
+_ARRAYS = ("keys", "indptr", "table", "row", "table_names", "table_paths")
+
+
+def side_path(output_path):
+    """The provenance index file of an output file."""
+    return os.path.splitext(output_path)[0] + SUFFIX
+
+
+def join_key(parts):
+    return SEPARATOR.join(str(p) for p in parts)
+
+
+def _key_strings(keys):
+    """Key strings of a Series/array of keys or a DataFrame of key parts (joined in column order)."""
+    if isinstance(keys, pd.DataFrame):
+        parts = [keys[c].astype(str).to_numpy(dtype=str) for c in keys.columns]
+        out = parts[0]
+        for part in parts[1:]:
+            out = np.char.add(np.char.add(out, SEPARATOR), part)
+        return out
+    return np.asarray(pd.Series(keys, dtype=object).astype(str).to_numpy(), dtype=str)
+
+
+class Collector:
+    """Gathers (key, table, row) triples; ``freeze`` turns them into a ProvenanceIndex."""
+
+    def __init__(self):
+        self.table_names, self.table_paths = [], []
+        self._table_ids = {}
+        self._keys, self._tables, self._rows = [], [], []
+
+    def table(self, name, path=""):
+        """Id of an input table, registered on first use."""
+        key = (name, path)
+        if key not in self._table_ids:
+            self._table_ids[key] = len(self.table_names)
+            self.table_names.append(name)
+            self.table_paths.append(path)
+        return self._table_ids[key]
+
+    def add(self, table, keys, rows):
+        """Record that ``rows`` of ``table`` produced ``keys`` (aligned; e.g. a frame and its index)."""
+        keys = _key_strings(keys)
+        if not len(keys):
+            return
+        self._keys.append(keys)
+        self._tables.append(np.full(len(keys), table, dtype=np.int32))
+        self._rows.append(np.asarray(rows, dtype=np.int64))
+
+    def merge(self, index, keys, new_keys=None):
+        """Record the rows ``index`` holds for ``keys`` under ``new_keys`` (default: the same keys)."""
+        remap = np.array([self.table(str(n), str(p)) for n, p in zip(index.table_names, index.table_paths)],
+                         dtype=np.int32)
+        for key, new_key in zip(keys, new_keys if new_keys is not None else keys):
+            pairs = index.rows(key)
+            if len(pairs):
+                self._keys.append(np.full(len(pairs), join_key(new_key) if isinstance(new_key, tuple) else str(new_key)))
+                self._tables.append(remap[pairs[:, 0]])
+                self._rows.append(pairs[:, 1])
+
+    def freeze(self):
+        if self._keys:
+            keys, tables, rows = (np.concatenate(a) for a in (self._keys, self._tables, self._rows))
+        else:
+            keys, tables, rows = np.zeros(0, dtype=str), np.zeros(0, np.int32), np.zeros(0, np.int64)
+        uniques, codes = np.unique(keys, return_inverse=True)
+        order = np.lexsort((rows, tables, codes))
+        codes, tables, rows = codes[order], tables[order], rows[order]
+        keep = np.ones(len(codes), dtype=bool)
+        keep[1:] = (np.diff(codes) != 0) | (np.diff(tables) != 0) | (np.diff(rows) != 0)
+        codes, tables, rows = codes[keep], tables[keep], rows[keep]
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(uniques))))).astype(np.int64)
+        return ProvenanceIndex(uniques, indptr, tables.astype(np.int16 if len(self.table_names) < 2 ** 15 else np.int32),
+                               rows.astype(np.int32), np.array(self.table_names, dtype=str),
+                               np.array(self.table_paths, dtype=str))
+
+    def save(self, output_path, root="."):
+        """Freeze and write the index next to ``output_path`` (recorded in the manifest)."""
+        index = self.freeze()
+        with outputs.staged(side_path(output_path), root=root, rows=len(index.row)) as tmp:
+            with open(tmp, "wb") as fh:
+                index.save(fh)
+        return index
+
+
+class ProvenanceIndex:
+    """Sorted keys with CSR (table, row) lists."""
+
+    def __init__(self, keys, indptr, table, row, table_names, table_paths):
+        self.keys, self.indptr, self.table, self.row = keys, indptr, table, row
+        self.table_names, self.table_paths = table_names, table_paths
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _position(self, key):
+        i = int(np.searchsorted(self.keys, key))
+        return i if i < len(self.keys) and self.keys[i] == key else -1
+
+    def rows(self, *parts):
+        """(n, 2) array of (table id, row) of a key (its parts, or one already joined string)."""
+        i = self._position(join_key(parts))
+        if i < 0:
+            return np.zeros((0, 2), dtype=np.int64)
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        return np.column_stack((self.table[lo:hi], self.row[lo:hi])).astype(np.int64)
+
+    def lookup(self, *parts):
+        """[(table name, row)] that produced a key."""
+        return [(str(self.table_names[t]), int(r)) for t, r in self.rows(*parts)]
+
+    def matching(self, *parts):
+        """Keys (as tuples of parts) that start with ``parts``; no parts lists every key."""
+        found = self.keys
+        if parts:
+            prefix = join_key(parts)
+            lo = int(np.searchsorted(self.keys, prefix))
+            hi = int(np.searchsorted(self.keys, prefix + SEPARATOR + "\U0010ffff"))
+            found = [k for k in self.keys[lo:hi] if k == prefix or k.startswith(prefix + SEPARATOR)]
+        return [tuple(str(k).split(SEPARATOR)) for k in found]
+
+    def save(self, path):
+        np.savez_compressed(path, format=np.int32(FORMAT), **{name: getattr(self, name) for name in _ARRAYS})
+
+
+def load(output_path):
+    """The provenance index of an output file (or the index file itself)."""
+    path = output_path if output_path.endswith(SUFFIX) else side_path(output_path)
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["format"]) != FORMAT:
+            raise ValueError(f"{path} has provenance format {int(data['format'])}, expected {FORMAT}")
+        return ProvenanceIndex(*(data[name] for name in _ARRAYS))
+
+
+def carry(upstream_output, output_path, keys, new_keys=None, root="."):
+    """
+    Index ``output_path`` with the rows that the index of ``upstream_output``
+    (an earlier stage's output it was derived from) holds for ``keys``, filed
+    under ``new_keys``. Nothing is written when the upstream output has no index.
+    """
+    if not os.path.exists(side_path(upstream_output)):
+        return None
+    collector = Collector()
+    collector.merge(load(upstream_output), keys, new_keys)
+    return collector.save(output_path, root=root)
+
+
+def source_rows(index, pairs):
+    """The input rows behind ``pairs`` (from ``rows``) as one frame; reads the input tables."""
+    frames = []
+    for t in np.unique(pairs[:, 0]):
+        name, path = str(index.table_names[t]), str(index.table_paths[t])
+        loaded = dict(tables.load_tables(path)) if path and os.path.exists(path) else {}
+        if name not in loaded:
+            print(f"[WARN] {name} is no longer at {path or '?'}")
+            continue
+        df = loaded[name]
+        picked = df.loc[df.index.intersection(pairs[pairs[:, 0] == t, 1])]
+        frames.append(picked.dropna(axis=1, how="all").assign(table=name).rename_axis("row").reset_index())
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trace a derived value back to the input table rows.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    lk = sub.add_parser("lookup", help="Rows behind one key of an output.")
+    lk.add_argument("output", help="Output file (or its .provenance.npz).")
+    lk.add_argument("key", nargs="+", help="Key parts, e.g. a CL ID, or time range, spatial type, Function@Process.")
+    lk.add_argument("--show", action="store_true", help="Also print the rows (reads the input tables).")
+    ks = sub.add_parser("keys", help="Keys of an output, optionally those starting with some parts.")
+    ks.add_argument("output")
+    ks.add_argument("prefix", nargs="*")
+    args = parser.parse_args(argv)
+
+    index = load(args.output)
+    if args.cmd == "keys":
+        for key in index.matching(*args.prefix):
+            print(" | ".join(key))
+        return 0
+    pairs = index.rows(*args.key)
+    if not len(pairs):
+        print(f"No provenance for {' | '.join(args.key)!r}")
+        return 1
+    for name, row in index.lookup(*args.key):
+        print(f"{name}\trow {row}")
+    if args.show:
+        with pd.option_context("display.max_columns", None, "display.width", 200):
+            print(source_rows(index, pairs).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,358 @@
+"""
+Local SQLite index over a week's inputs and outputs for ad-hoc questions.
+
+Loads, per week folder:
+
+- input_rows        one row per input row, Process fragment and time range
+                    (system, lowest function, process, effector label/ID/
+                    scale, spatial type from wpp.entities, raw TimeScale and
+                    the time range it falls in, binned by wpp.timescale as
+                    in 02)
+- spatial_temporal  the 02 tables unpivoted: system, time range, spatial
+                    type, function, process
+- coverage          AS (UBERON) and CT (CL) IDs found in WPP and whether
+                    ASCT+B has them (03-06)
+- ftu_matches       the 13 summary
+- text_fts          FTS5 index over effector labels and processes
+
+Every table carries a ``week`` column (the week folder name); reloading a
+week replaces its rows, so one database can hold several weeks. Run from a
+week folder (or pass the folders):
+
+    PYTHONPATH=scripts python -m wpp.query_db build
+    PYTHONPATH=scripts python -m wpp.query_db query \\
+        "SELECT DISTINCT system, process FROM spatial_temporal
+         WHERE spatial_type = 'CT' AND time_range = '1s - < 1min'"
+    PYTHONPATH=scripts python -m wpp.query_db query \\
+        "SELECT system, function, effector_label FROM input_rows WHERE time_range = '1hr - < 1day'"
+    PYTHONPATH=scripts python -m wpp.query_db search "baroreceptor*"
+"""
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import sys
+
+import pandas as pd
+
+from wpp import entities, instrument, tables, timescale
+
+DEFAULT_DB = os.environ.get("WPP_QUERY_DB", "./wpp_query.sqlite")
+INPUT_SUBDIR = os.path.join("data", "WPP Input Tables")
+INPUT_GROUPS = ("function", "process", "effector", "scales")
+NULL_TOKENS = {"", "nan", "none", "null"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS input_rows (
+    week TEXT NOT NULL,
+    system TEXT NOT NULL,
+    row_no INTEGER NOT NULL,
+    function TEXT,
+    process TEXT,
+    effector_label TEXT,
+    effector_id TEXT,
+    effector_ids_raw TEXT,
+    effector_scale TEXT,
+    spatial_type TEXT,
+    time_scale TEXT,
+    time_range TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_input_rows_system ON input_rows (week, system);
+CREATE INDEX IF NOT EXISTS ix_input_rows_id ON input_rows (effector_id);
+CREATE INDEX IF NOT EXISTS ix_input_rows_spatial ON input_rows (spatial_type, week);
+
+CREATE TABLE IF NOT EXISTS spatial_temporal (
+    week TEXT NOT NULL,
+    system TEXT NOT NULL,
+    time_range TEXT NOT NULL,
+    spatial_type TEXT NOT NULL,
+    function TEXT,
+    process TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_spatial_temporal_system ON spatial_temporal (week, system);
+CREATE INDEX IF NOT EXISTS ix_spatial_temporal_cell ON spatial_temporal (spatial_type, time_range);
+
+CREATE TABLE IF NOT EXISTS coverage (
+    week TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    id TEXT,
+    labels TEXT,
+    sources TEXT,
+    in_asctb INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_coverage_id ON coverage (id);
+CREATE INDEX IF NOT EXISTS ix_coverage_kind ON coverage (week, kind, in_asctb);
+
+CREATE TABLE IF NOT EXISTS ftu_matches (
+    week TEXT NOT NULL,
+    system TEXT,
+    column_name TEXT,
+    matched_id TEXT,
+    label TEXT,
+    processes TEXT,
+    process_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_ftu_matches_id ON ftu_matches (matched_id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS text_fts USING fts5(
+    text, kind UNINDEXED, week UNINDEXED, system UNINDEXED, ref UNINDEXED
+);
+"""
+
+DATA_TABLES = ("input_rows", "spatial_temporal", "coverage", "ftu_matches")
+
+# columns added after a table was first created: (table, column, type, index statement)
+MIGRATIONS = [
+    ("input_rows", "time_range", "TEXT",
+     "CREATE INDEX IF NOT EXISTS ix_input_rows_time ON input_rows (time_range, spatial_type)"),
+]
+
+
+def connect(db_path=DEFAULT_DB):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    for table, column, kind, index in MIGRATIONS:
+        if column not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        conn.execute(index)
+    try:
+        conn.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError as e:
+        print(f"[WARN] FTS5 not available in this sqlite build ({e}); text search disabled.")
+    return conn
+
+
+def has_fts(conn):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'text_fts'").fetchone()
+    return row is not None
+
+
+def _find(df, *names):
+    keys = {tables.column_key(n) for n in names}
+    for c in df.columns:
+        if tables.column_key(c) in keys:
+            return c
+    return None
+
+
+def _clean(s):
+    """Strip cells and turn blanks and "nan"/"none"/"null" into NA."""
+    s = s.astype("string").str.strip()
+    return s.mask(s.str.lower().isin(NULL_TOKENS))
+
+
+def lowest_function(df):
+    """Last non-empty Function/N cell per row (same rule as 02)."""
+    cols = [c for c in df.columns if re.fullmatch(r"Function/\d+", c.strip())]
+    if not cols:
+        return pd.Series(pd.NA, index=df.index, dtype="string")
+    cols.sort(key=lambda c: int(c.strip().split("/")[1]))
+    return df[cols].apply(_clean).ffill(axis=1).iloc[:, -1]
+
+
+def input_rows(df, system, entity_index):
+    """Normalized rows of one input table, one per Process fragment and time range."""
+    def column(*names):
+        col = _find(df, *names)
+        return df[col] if col else pd.Series(pd.NA, index=df.index, dtype="string")
+
+    scale_col = _find(df, "EffectorScale")
+    id_col = _find(df, "Effector/ID")
+    out = pd.DataFrame({
+        "system": system,
+        "row_no": range(len(df)),
+        "function": lowest_function(df),
+        "process": column("Process").astype("string").str.split(r"\s*;\s*", regex=True),
+        "effector_label": column("Effector/LABEL"),
+        "effector_id": entities.id_key(column("Effector/ID")),
+        "effector_ids_raw": column("Effector/ID"),
+        "effector_scale": column("EffectorScale"),
+        "spatial_type": entities.classify_frame(df, scale_col, id_col, index=entity_index),
+        "time_scale": column("TimeScale"),
+        # the ranges 02 files the row under ("Unknown" when the value does not parse)
+        "time_range": timescale.time_ranges(column("TimeScale")),
+    }, index=df.index)
+    out = out.explode("process").explode("time_range")
+    for col in ("process", "effector_label", "effector_ids_raw", "effector_scale", "time_scale"):
+        out[col] = _clean(out[col])
+    return out
+
+
+def spatial_temporal_rows(path, system):
+    """Unpivot one 02 table into (time range, spatial type, function, process) facts."""
+    df = pd.read_csv(path, dtype=str, encoding="utf-8-sig").fillna("")
+    long = df.melt(id_vars=["Time Range"], var_name="spatial_type", value_name="cell")
+    long["cell"] = long["cell"].str.split("? ", regex=False)
+    long = long.explode("cell")
+    long = long[long["cell"].str.strip() != ""]
+    parts = long["cell"].str.split("@", n=1, expand=True).reindex(columns=[0, 1])
+    return pd.DataFrame({
+        "system": system,
+        "time_range": long["Time Range"],
+        "spatial_type": long["spatial_type"],
+        "function": parts[0].where(parts[1].notna(), None),
+        "process": parts[1].fillna(parts[0]),
+    })
+
+
+# kind -> (IDs found in WPP, ID/label/source columns, IDs also in ASCT+B, its ID column)
+COVERAGE_FILES = {
+    "AS": ("all_Uberon_statistics/AS_UBERON_in_WPP.csv", ("AS_ID", "AS", "SOURCE_TABLES"),
+           "all_Uberon_statistics/uberon_ids_present_in_astcb.csv", "Present_AS_ID"),
+    "CT": ("all_CT_statistics/all_CL_ids_in_WPP_by_id.csv", ("CL_ID", "LABELS", "SOURCE_TABLES"),
+           "all_CT_statistics/cl_ids_present_in_astcb.csv", "CL_IDs"),
+}
+
+
+def coverage_rows(week_dir):
+    out = []
+    for kind, (listing, (id_col, label_col, src_col), present, present_col) in COVERAGE_FILES.items():
+        path = os.path.join(week_dir, "analysis", listing)
+        if not os.path.exists(path):
+            continue
+        df = pd.read_csv(path, dtype=str).fillna("")
+        present_path = os.path.join(week_dir, "analysis", present)
+        if os.path.exists(present_path):
+            present_ids = set(pd.read_csv(present_path, dtype=str)[present_col].dropna())
+            in_asctb = df[id_col].isin(present_ids).astype(int)
+        else:
+            in_asctb = None  # 04/06 did not run
+        out.append(pd.DataFrame({
+            "kind": kind,
+            "id": df[id_col].replace("", None),
+            "labels": df[label_col],
+            "sources": df[src_col],
+            "in_asctb": in_asctb,
+        }))
+    return pd.concat(out, ignore_index=True) if out else None
+
+
+def ftu_rows(week_dir):
+    path = os.path.join(week_dir, "unique_ftus", "ftu_id_matches_summary_.csv")
+    if not os.path.exists(path):
+        return None
+    df = pd.read_csv(path, dtype=str).fillna("")
+    return pd.DataFrame({
+        "system": df["table_name"],
+        "column_name": df["column"],
+        "matched_id": df["matched_id"],
+        "label": df["label"],
+        "processes": df["all_processes"],
+        "process_count": pd.to_numeric(df["unique_process_count_in_table"], errors="coerce"),
+    })
+
+
+def _insert(conn, table, week, df):
+    if df is None or df.empty:
+        return 0
+    df = df.copy()
+    df.insert(0, "week", week)
+    df = df.astype(object).where(df.notna(), None)
+    cols = ", ".join(df.columns)
+    marks = ", ".join("?" for _ in df.columns)
+    conn.executemany(f"INSERT INTO {table} ({cols}) VALUES ({marks})", df.itertuples(index=False, name=None))
+    instrument.count(f"{table}_rows", len(df))
+    return len(df)
+
+
+def load_week(conn, week_dir):
+    """Replace one week's rows in every table. Returns {table: rows}."""
+    week = os.path.basename(os.path.realpath(week_dir))
+    loaded = {}
+    with conn:
+        for table in DATA_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE week = ?", (week,))
+        fts = has_fts(conn)
+        if fts:
+            conn.execute("DELETE FROM text_fts WHERE week = ?", (week,))
+
+        with instrument.stage("query_db_inputs", week=week):
+            asctb = os.path.join(week_dir, "data", "all_asctb_ids_and_types.csv")
+            entity_index = entities.load_index(os.path.join(week_dir, entities.INDEX_PATH), asctb_path=asctb)
+            parts = []
+            for path in tables.list_input_files(os.path.join(week_dir, INPUT_SUBDIR), recursive=True):
+                try:
+                    loaded_tables = tables.load_tables(path, groups=INPUT_GROUPS)
+                except Exception as e:
+                    print(f"[WARN] Skipping {path}: {e}")
+                    continue
+                for name, df in loaded_tables:
+                    parts.append(input_rows(df, os.path.splitext(name)[0], entity_index))
+            rows = pd.concat(parts, ignore_index=True) if parts else None
+            loaded["input_rows"] = _insert(conn, "input_rows", week, rows)
+
+        with instrument.stage("query_db_outputs", week=week):
+            parts = []
+            for path in sorted(glob.glob(os.path.join(week_dir, "temporal_spatial_output", "*_spatial_temporal_table.csv"))):
+                system = os.path.basename(path)[:-len("_spatial_temporal_table.csv")]
+                parts.append(spatial_temporal_rows(path, system))
+            facts = pd.concat(parts, ignore_index=True) if parts else None
+            loaded["spatial_temporal"] = _insert(conn, "spatial_temporal", week, facts)
+            loaded["coverage"] = _insert(conn, "coverage", week, coverage_rows(week_dir))
+            loaded["ftu_matches"] = _insert(conn, "ftu_matches", week, ftu_rows(week_dir))
+
+        if fts and rows is not None:
+            text = pd.concat([
+                rows[["effector_label", "system", "effector_id"]].set_axis(["text", "system", "ref"], axis=1).assign(kind="label"),
+                rows[["process", "system"]].set_axis(["text", "system"], axis=1).assign(kind="process", ref=None),
+            ], ignore_index=True)
+            text = text[text["text"].notna()].drop_duplicates(["kind", "system", "text"])
+            loaded["text_fts"] = _insert(conn, "text_fts", week, text[["text", "kind", "system", "ref"]])
+    return loaded
+
+
+def run_query(conn, sql, params=()):
+    cur = conn.execute(sql, params)
+    cols = [d[0] for d in cur.description] if cur.description else []
+    return pd.DataFrame(cur.fetchall(), columns=cols)
+
+
+def search(conn, text, week=None, limit=50):
+    sql = "SELECT kind, week, system, text, ref FROM text_fts WHERE text_fts MATCH ?"
+    params = [text]
+    if week:
+        sql += " AND week = ?"
+        params.append(week)
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(limit)
+    return run_query(conn, sql, params)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query the local WPP SQLite index.")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"Database path (default {DEFAULT_DB}, or $WPP_QUERY_DB).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Load one or more week folders (default: the current folder).")
+    b.add_argument("weeks", nargs="*", default=["."])
+    q = sub.add_parser("query", help="Run a SQL statement and print the result.")
+    q.add_argument("sql")
+    s = sub.add_parser("search", help="Full-text search over effector labels and processes (FTS5 syntax).")
+    s.add_argument("text")
+    s.add_argument("--week")
+    s.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    try:
+        if args.cmd == "build":
+            for week_dir in args.weeks:
+                counts = load_week(conn, week_dir)
+                print(f"{os.path.basename(os.path.realpath(week_dir))}: " +
+                      ", ".join(f"{t}={n}" for t, n in counts.items()) + f" -> {args.db}")
+            conn.execute("ANALYZE")
+        else:
+            if args.cmd == "search" and not has_fts(conn):
+                sys.exit("Text search needs FTS5; rebuild with an sqlite that has it.")
+            result = run_query(conn, args.sql) if args.cmd == "query" else \
+                search(conn, args.text, week=args.week, limit=args.limit)
+            with pd.option_context("display.max_rows", None, "display.max_colwidth", 80, "display.width", 200):
+                print(result.to_string(index=False) if not result.empty else "(no rows)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Function roll-up cube: process sets per function at every Function/N depth.
+
+02 answers "which Function@Process happen at each (time range, spatial
+type)" for the lowest function of every row only. The cube answers the same
+question at every depth of the function hierarchy at once. One pass over
+the tables records each (system, level, function, time range, spatial type,
+process) combination a row contributes:
+
+- level N for every non-empty ``Function/N`` of the row,
+- level 0 (LOWEST) for its lowest non-empty function, which is what 02 uses.
+
+Every distinct value of a dimension gets an integer code, so the cube is an
+(n, 6) int32 array plus one string vocabulary per dimension, saved as a
+single .npz (no pickles). 09 writes it to ``function_rollup/``. Any depth is
+then a filter and a group-by on the codes, without reading the tables:
+
+    cube = rollup.load()
+    rollup.pivot(cube, level=2)                        # 02's layout at Function/2
+    rollup.pivot(cube, level=0, system="Urinary_System")  # == 02's table
+
+    PYTHONPATH=../../scripts python -m wpp.rollup levels
+    PYTHONPATH=../../scripts python -m wpp.rollup pivot --level 2 --out function2.csv
+"""
+import argparse
+import re
+import sys
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from wpp import entities, timescale
+
+CUBE_PATH = "./function_rollup/function_rollup.npz"
+DIMENSIONS = ("system", "level", "function", "time_range", "spatial_type", "process")
+LOWEST = 0
+FORMAT = 1
+
+_FUNCTION_COLUMN = re.compile(r"Function/(\d+)$")
+_EMPTY = {"", "nan", "none", "null"}
+
+Cube = namedtuple("Cube", ["codes", "vocab"])
+
+
+def find_column(columns, candidates):
+    """First of ``candidates`` in ``columns``, compared case-insensitively, or None."""
+    lowered = {str(c).lower(): c for c in columns}
+    return next((lowered[c.lower()] for c in candidates if c.lower() in lowered), None)
+
+
+def function_columns(columns):
+    """[(level, column)] of the Function/N columns, by level."""
+    found = [(int(m.group(1)), c) for c in columns if (m := _FUNCTION_COLUMN.match(str(c).strip()))]
+    return sorted(found)
+
+
+def process_lists(df):
+    """The Process cell of every row split on ';' into fragments, as in 02."""
+    process = df["Process"] if "Process" in df.columns else pd.Series("", index=df.index)
+    fragments = process.fillna("").astype(str).str.strip().str.split(r"\s*;\s*", regex=True)
+    return fragments.map(lambda parts: [p.strip() for p in parts if p.strip() and p.strip().lower() not in _EMPTY])
+
+
+def effector_columns(columns):
+    """(EffectorScale column, Effector/ID column) as 02 finds them; either may be None."""
+    scale_col = find_column(columns, ["EffectorScale", "Effector Scale", "Effector_Scale", "Scale"])
+    id_col = find_column(columns, ["Effector/ID", "Effector ID", "Effector_ID", "Effector/Id",
+                               "Effector/identifier", "EffectorID"])
+    return scale_col, id_col
+
+
+def cells(df, system):
+    """
+    The cube combinations of one table (or a piece of one, see
+    tables.iter_tables) as a DataFrame with one column per dimension.
+    Processes are split, time scales mapped and spatial types assigned as
+    in 02.
+    """
+    frame = pd.DataFrame(index=df.index)
+    frame["process"] = process_lists(df)
+    frame["spatial_type"] = entities.classify_frame(df, *effector_columns(df.columns))
+    timescales = df["TimeScale"] if "TimeScale" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    frame["time_range"] = timescale.time_ranges(timescales)
+
+    # one frame per level: (level, function) of every row that has one
+    levels = function_columns(df.columns)
+    lowest = pd.Series("", index=df.index)
+    parts = []
+    for level, col in levels:
+        value = df[col].fillna("").astype(str).str.strip()
+        key = value.str.lower()
+        # 02 keeps the last value that is not empty or "nan", "Unknown" included
+        lowest = value.where(~key.isin({"", "nan"}), lowest)
+        parts.append(frame.assign(level=level, function=value)[~key.isin(_EMPTY | {"unknown"})])
+    # ... and files a process without a known function under the bare process
+    parts.append(frame.assign(level=LOWEST, function=lowest.mask(lowest.str.lower() == "unknown", "")))
+
+    long = pd.concat(parts).explode("process").explode("time_range")
+    long = long[long["process"].notna() & (long["process"] != "")]
+    long["system"] = system
+    return long[list(DIMENSIONS)].drop_duplicates()
+
+
+def encode(combos):
+    """Cube from a DataFrame of combinations (the concatenated ``cells``)."""
+    combos = combos.drop_duplicates()
+    codes, vocab = [], {}
+    for dim in DIMENSIONS:
+        values = combos[dim]
+        uniques = np.unique(values.to_numpy(dtype=np.int64 if dim == "level" else str))
+        vocab[dim] = uniques
+        codes.append(np.searchsorted(uniques, values.to_numpy(dtype=uniques.dtype)).astype(np.int32))
+    codes = np.column_stack(codes) if codes[0].size else np.zeros((0, len(DIMENSIONS)), np.int32)
+    codes = codes[np.lexsort(codes.T[::-1])]
+    return Cube(codes, vocab)
+
+
+def save(cube, path):
+    """Write the cube to ``path`` (a file name or an open binary file)."""
+    np.savez_compressed(path, format=np.int32(FORMAT), codes=cube.codes,
+                        **{f"vocab_{dim}": cube.vocab[dim] for dim in DIMENSIONS})
+
+
+def load(path=CUBE_PATH):
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["format"]) != FORMAT:
+            raise ValueError(f"{path} has cube format {int(data['format'])}, expected {FORMAT}")
+        return Cube(data["codes"], {dim: data[f"vocab_{dim}"] for dim in DIMENSIONS})
+
+
+def _code(cube, dim, value):
+    matches = np.flatnonzero(cube.vocab[dim] == value)
+    return int(matches[0]) if matches.size else -1
+
+
+def select(cube, level, system=None, function=None):
+    """Rows of the cube at ``level``, optionally for one system or one function, as a decoded DataFrame."""
+    mask = cube.codes[:, 1] == _code(cube, "level", level)
+    for dim, value in (("system", system), ("function", function)):
+        if value is not None:
+            mask &= cube.codes[:, DIMENSIONS.index(dim)] == _code(cube, dim, value)
+    rows = cube.codes[mask]
+    return pd.DataFrame({dim: cube.vocab[dim][rows[:, i]] for i, dim in enumerate(DIMENSIONS)})
+
+
+def pivot(cube, level, system=None, function=None):
+    """
+    Time range x spatial type table of Function@Process entries at one
+    depth, in 02's layout ("? "-joined, sorted). Entries of rows without a
+    function at the LOWEST level are the bare process, as in 02.
+    """
+    rows = select(cube, level, system, function)
+    entries = rows["process"].where(rows["function"] == "", rows["function"] + "@" + rows["process"])
+    grouped = (entries.groupby([rows["time_range"], rows["spatial_type"]])
+               .agg(lambda s: "? ".join(sorted(set(s)))) if len(rows) else pd.Series(dtype=object))
+    table = pd.DataFrame(index=pd.Index(timescale.labels(), name="Time Range"), columns=entities.SPATIAL_TYPES, data="")
+    for (time_range, spatial_type), value in grouped.items():
+        if time_range in table.index and spatial_type in table.columns:
+            table.loc[time_range, spatial_type] = value
+    return table.reset_index()
+
+
+def summary(cube):
+    """Combinations, functions and processes per level."""
+    out = []
+    for code, level in enumerate(cube.vocab["level"]):
+        rows = cube.codes[cube.codes[:, 1] == code]
+        out.append({"level": int(level), "combinations": len(rows),
+                    "functions": len(np.unique(rows[:, 2])), "processes": len(np.unique(rows[:, 5]))})
+    return pd.DataFrame(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the function roll-up cube written by 09.")
+    parser.add_argument("--cube", default=CUBE_PATH, help=f"Cube file (default: {CUBE_PATH}).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("levels", help="Combinations, functions and processes per Function/N level.")
+    pv = sub.add_parser("pivot", help="Time range x spatial type table at one level.")
+    pv.add_argument("--level", type=int, default=LOWEST, help="Function/N level; 0 = lowest function (as in 02).")
+    pv.add_argument("--system", help="Only this system (input table name without extension).")
+    pv.add_argument("--function", help="Only this function value at the level.")
+    pv.add_argument("--out", help="Write the table to this CSV instead of printing it.")
+    args = parser.parse_args(argv)
+
+    cube = load(args.cube)
+    if args.cmd == "levels":
+        print(summary(cube).to_string(index=False))
+        return 0
+    table = pivot(cube, args.level, args.system, args.function)
+    if args.out:
+        table.to_csv(args.out, index=False, encoding="utf-8-sig")
+        print(f"Saved: {args.out}")
+    else:
+        print(table.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
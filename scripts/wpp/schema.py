@@ -0,0 +1,183 @@
+"""
+Expected layout and value vocabularies of the WPP input tables.
+
+``validate`` checks every table in one pass: the required columns of each
+table are stacked into one frame (after header detection) and the value
+checks run on that frame column by column, not row by row. The result is a
+report with one entry per table:
+
+- ``error``: the header row was not found, or a required column is missing
+  or empty. Stages would skip the table or produce misleading statistics,
+  so the loader leaves it out (see tables.list_input_files).
+- ``warning``: values outside the vocabularies below (unknown EffectorScale
+  or TimeScale, malformed IDs). The table is still used.
+
+00-validate_tables.py writes the report to data/validation_report.json
+before any other stage runs.
+"""
+import json
+import os
+import time
+
+import pandas as pd
+
+from wpp import entities, instrument, outputs, tables, timescale
+
+REPORT_PATH = os.path.join("./data", tables.VALIDATION_REPORT)
+
+# canonical name -> squashed key (tables.column_key); all are required
+REQUIRED_COLUMNS = {
+    "Function/1": "function1",
+    "Process": "process",
+    "EffectorScale": "effectorscale",
+    "Effector/LABEL": "effectorlabel",
+    "Effector/ID": "effectorid",
+    "TimeScale": "timescale",
+}
+GROUPS = ("function", "process", "effector", "scales")
+EMPTY_IS_ERROR = {REQUIRED_COLUMNS[c] for c in ("Process", "EffectorScale", "Effector/ID")}
+
+# one ontology CURIE per ';'-separated part of an ID cell
+ID_PATTERN = r"[A-Za-z][\w.-]*:\S+"
+
+MAX_EXAMPLES = 5
+
+
+def _stack(loaded):
+    """One frame with the required columns of every table plus _table/_row."""
+    parts = []
+    for name, df in loaded:
+        by_key = {}
+        for c in df.columns:
+            by_key.setdefault(tables.column_key(c), c)
+        part = pd.DataFrame({
+            canon: df[by_key[key]] if key in by_key else pd.Series(pd.NA, index=df.index, dtype="string")
+            for canon, key in REQUIRED_COLUMNS.items()
+        })
+        part["_table"] = name
+        part["_row"] = range(len(df))
+        parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=[*REQUIRED_COLUMNS, "_table", "_row"])
+    return pd.concat(parts, ignore_index=True)
+
+
+def _issues(stacked, mask, level, check, column, values=None):
+    """Per-table issue records for the rows selected by ``mask``."""
+    out = {}
+    hits = stacked.loc[mask, ["_table", "_row"]].assign(value=(values if values is not None else stacked[column])[mask])
+    for table, g in hits.groupby("_table", sort=False):
+        out[table] = {
+            "level": level,
+            "check": check,
+            "column": column,
+            "count": int(len(g)),
+            "examples": [{"row": int(r), "value": None if pd.isna(v) else str(v)}
+                         for r, v in g.head(MAX_EXAMPLES)[["_row", "value"]].itertuples(index=False)],
+        }
+    return out
+
+
+def check_columns(name, df):
+    """Structural checks on one table (errors)."""
+    keys = {tables.column_key(c) for c in df.columns}
+    issues = []
+    if REQUIRED_COLUMNS["Function/1"] not in keys:
+        issues.append({"level": "error", "check": "header_not_found", "column": "Function/1",
+                       "count": 0, "examples": []})
+    for canon, key in REQUIRED_COLUMNS.items():
+        if key not in keys and canon != "Function/1":
+            issues.append({"level": "error", "check": "missing_column", "column": canon, "count": 0, "examples": []})
+    if df.empty:
+        issues.append({"level": "error", "check": "no_rows", "column": None, "count": 0, "examples": []})
+        return issues
+    # a required column that is present but empty everywhere is as bad as a missing one
+    for c in df.columns:
+        if tables.column_key(c) in EMPTY_IS_ERROR and df[c].astype("string").str.strip().fillna("").eq("").all():
+            issues.append({"level": "error", "check": "empty_column", "column": c, "count": len(df), "examples": []})
+    return issues
+
+
+def check_values(stacked):
+    """Vocabulary checks on the stacked frame; returns {table: [issues]}."""
+    found = {}
+
+    def add(per_table):
+        for table, issue in per_table.items():
+            found.setdefault(table, []).append(issue)
+
+    scale = entities.scale_key(stacked["EffectorScale"])
+    known_scale = scale.isin(entities.SCALE_TYPES.keys()) | scale.str.startswith("tissue")
+    blank_scale = scale == ""
+    add(_issues(stacked, ~known_scale, "warning", "unknown_value", "EffectorScale"))
+    has_process = stacked["Process"].notna() & (stacked["Process"].astype("string").str.strip() != "")
+    add(_issues(stacked, blank_scale & has_process, "warning", "blank_value", "EffectorScale"))
+
+    times = stacked["TimeScale"].astype("string").str.strip()
+    blank_time = times.isna() | times.str.lower().isin(["", "nan"])
+    unknown_time = timescale.time_ranges(times).map(lambda ranges: ranges == [timescale.UNKNOWN]).astype(bool)
+    add(_issues(stacked, has_process & unknown_time & ~blank_time, "warning", "unknown_value", "TimeScale"))
+    add(_issues(stacked, has_process & blank_time, "warning", "blank_value", "TimeScale"))
+
+    parts = stacked["Effector/ID"].dropna().astype(str).str.split(r"\s*;\s*", regex=True).explode().str.strip()
+    parts = parts[parts != ""]
+    bad = parts[~parts.str.fullmatch(ID_PATTERN)]
+    bad_rows = pd.Series(False, index=stacked.index)
+    bad_rows[bad.index.unique()] = True
+    add(_issues(stacked, bad_rows, "warning", "malformed_id", "Effector/ID"))
+    return found
+
+
+def validate(paths, report_dir=os.path.dirname(REPORT_PATH)):
+    """
+    Validate tables; returns the report dict (see module docstring). Paths in
+    the report are relative to ``report_dir``, where the report is written.
+    """
+    entries, loaded_all = [], []
+    for path in paths:
+        st = os.stat(path)
+        base = {"file": os.path.basename(path), "path": os.path.relpath(path, report_dir),
+                "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        try:
+            loaded = tables.load_tables(path, groups=GROUPS)
+        except Exception as e:
+            entries.append({**base, "table": base["file"], "rows": 0, "status": "error",
+                            "issues": [{"level": "error", "check": "unreadable", "column": None,
+                                        "count": 0, "examples": [{"row": None, "value": str(e)}]}]})
+            continue
+        if not loaded:
+            entries.append({**base, "table": base["file"], "rows": 0, "status": "error",
+                            "issues": [{"level": "error", "check": "header_not_found", "column": "Function/1",
+                                        "count": 0, "examples": []}]})
+            continue
+        for name, df in loaded:
+            entries.append({**base, "table": name, "rows": len(df), "issues": check_columns(name, df)})
+            loaded_all.append((name, df))
+
+    with instrument.stage("validate_values"):
+        stacked = _stack(loaded_all)
+        instrument.count("rows_validated", len(stacked))
+        by_table = check_values(stacked)
+
+    for entry in entries:
+        if "status" in entry:
+            continue
+        # value checks on a missing column would only repeat the missing_column error
+        missing = {i["column"] for i in entry["issues"] if i["check"] == "missing_column"}
+        entry["issues"].extend(i for i in by_table.get(entry["table"], []) if i["column"] not in missing)
+        levels = {i["level"] for i in entry["issues"]}
+        entry["status"] = "error" if "error" in levels else "warning" if levels else "ok"
+
+    summary = {s: sum(e["status"] == s for e in entries) for s in ("ok", "warning", "error")}
+    return {
+        "generated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "required_columns": list(REQUIRED_COLUMNS),
+        "summary": summary,
+        "tables": entries,
+    }
+
+
+def write_report(report, path=REPORT_PATH):
+    with outputs.staged(path, encoding="utf-8", rows=len(report["tables"])) as tmp:
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
@@ -0,0 +1,126 @@
+"""
+Parsed tables shared between processes through memory-mapped Arrow files.
+
+When WPP_SHARED_TABLES points to a directory, the first process that parses
+a WPP table (or the ASCT+B master) writes the resulting frames there as
+Arrow IPC files. Every other process attaches to them with a read-only
+memory map instead of parsing again. With pandas' Arrow-backed string dtype
+the columns point straight into the mapped pages, so the OS page cache
+holds one copy however many workers use it. Entries are keyed by the file's
+name, content hash and the load options, so copies of the same table in
+different work folders or weeks share one entry, while a copy saved under
+another name gets its own (the frames carry the name they were loaded under).
+
+run.sh, backfill and the task queue set WPP_SHARED_TABLES for their runs.
+Without it, or without pyarrow installed, tables are parsed in each process
+as before.
+
+    frames = shared.load(path, lambda: parse(path), groups, extra)   # [(name, DataFrame)]
+    master = shared.read_csv("./data/all_asctb_ids_and_types.csv", dtype=str)
+"""
+import hashlib
+import importlib.util
+import json
+import os
+
+import pandas as pd
+
+from wpp import instrument
+
+STORE_ENV = "WPP_SHARED_TABLES"
+
+_warned = []
+
+
+def store_dir():
+    return os.environ.get(STORE_ENV) or None
+
+
+def available():
+    """True if pyarrow is installed, i.e. a store would actually be used."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        if not _warned:
+            print(f"[WARN] {STORE_ENV} is set but pyarrow is not installed; tables are parsed per process")
+            _warned.append(True)
+        return None
+    return pyarrow
+
+
+def content_key(path, *options):
+    """Hash of the file's name and bytes and the load options."""
+    h = hashlib.sha1(os.path.basename(path).encode())
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    h.update(repr(options).encode())
+    return h.hexdigest()[:24]
+
+
+def _publish(pa, folder, key, frames):
+    """Write the frames of one entry; the index file is written last and marks it complete."""
+    os.makedirs(folder, exist_ok=True)
+    names = []
+    for i, (name, df) in enumerate(frames):
+        table = pa.Table.from_pandas(df, preserve_index=None)
+        path = os.path.join(folder, f"{key}.{i}.arrow")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+        names.append(name)
+    index = os.path.join(folder, f"{key}.json")
+    tmp = f"{index}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(names, fh)
+    os.replace(tmp, index)
+
+
+def _attach(pa, folder, key):
+    """The frames of a published entry, mapped read-only, or None."""
+    index = os.path.join(folder, f"{key}.json")
+    if not os.path.exists(index):
+        return None
+    with open(index, encoding="utf-8") as fh:
+        names = json.load(fh)
+    frames = []
+    for i, name in enumerate(names):
+        source = pa.memory_map(os.path.join(folder, f"{key}.{i}.arrow"), "r")
+        frames.append((name, pa.ipc.open_file(source).read_all().to_pandas()))
+    return frames
+
+
+def load(path, loader, *options):
+    """
+    ``loader()`` (a list of (name, DataFrame)) served from the shared store:
+    attached if another process already published it, else computed and
+    published.
+    """
+    folder = store_dir()
+    pa = _pyarrow() if folder else None
+    if pa is None:
+        return loader()
+    key = content_key(path, *options)
+    frames = _attach(pa, folder, key)
+    if frames is not None:
+        instrument.count("tables_attached", len(frames))
+        return frames
+    frames = loader()
+    try:
+        _publish(pa, folder, key, frames)
+        instrument.count("tables_published", len(frames))
+    except (OSError, ValueError, pa.ArrowException) as e:
+        print(f"[WARN] Could not publish {os.path.basename(path)} to {folder}: {e}")
+    return frames
+
+
+def read_csv(path, **kwargs):
+    """``pd.read_csv(path, **kwargs)`` through the shared store."""
+    options = tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+    return load(path, lambda: [(os.path.basename(path), pd.read_csv(path, **kwargs))], *options)[0][1]
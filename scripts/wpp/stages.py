@@ -0,0 +1,161 @@
+"""
+Registry of the numbered pipeline scripts and the files they read and write.
+
+Paths are relative to the week folder (the CWD run.sh gives every script),
+except FTU_LIST which lives at the repo root. ``affected`` walks the
+read/write edges to find every stage downstream of a set of changed files,
+in run order, and ``run_stage`` executes a script inside the current process
+so module-level caches (parsed tables, the entity index) stay warm between
+runs:
+
+    for stage in stages.affected(["data/WPP Input Tables/Urinary_System.csv"]):
+        stages.run_stage(stage, week_dir)
+
+A script that is not listed here is treated as reading the input tables and
+writing nothing, so it still reruns when a table changes. ``per_table``
+stages write one output per input table and can be run on a single table at
+a time (see wpp/taskqueue.py). ``partial`` stages aggregate over all tables
+but can also be run on a single table ahead of the full run, to validate it
+or to warm the shared parse store (see wpp/pipeline.py); the outputs of such
+runs are not kept.
+"""
+import glob
+import os
+import runpy
+import shutil
+import sys
+import time
+from collections import namedtuple
+
+from wpp import entities
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TABLES = "data/WPP Input Tables/"
+ASCTB = "data/all_asctb_ids_and_types.csv"
+FTU_LIST = entities.FTU_LIST
+# written by 00; the table loader reads it to leave out invalid tables
+REPORT = "data/validation_report.json"
+
+Stage = namedtuple("Stage", ["script", "reads", "writes", "network", "per_table", "partial"],
+                   defaults=(False, False))
+
+STAGES = [
+    Stage("00-validate_tables.py", (TABLES,), (REPORT,), False, partial=True),
+    Stage("01-all_asctb_ids_with_types.py", (), (ASCTB,), True),
+    Stage("02-WPP_tables.py", (TABLES, REPORT, ASCTB, FTU_LIST), ("temporal_spatial_output/",), False, True),
+    Stage("03-AS_extraction_wpp.py", (TABLES, REPORT), ("analysis/all_Uberon_statistics/AS_UBERON_in_WPP.csv",), False),
+    Stage("04-AS_missing_present_HRA_WPP.py",
+          ("analysis/all_Uberon_statistics/AS_UBERON_in_WPP.csv", ASCTB),
+          ("analysis/all_Uberon_statistics/uberon_ids_present_in_astcb.csv",
+           "analysis/all_Uberon_statistics/uberon_ids_missing_in_asctb.csv"), False),
+    Stage("05-CT_extracts_WPP.py", (TABLES, REPORT), ("analysis/all_CT_statistics/all_CL_ids_in_WPP_by_id.csv",), False),
+    Stage("06-CT_present_missing_HRA_WPP.py",
+          ("analysis/all_CT_statistics/all_CL_ids_in_WPP_by_id.csv", ASCTB),
+          ("analysis/all_CT_statistics/cl_ids_missing_in_astcb.csv",
+           "analysis/all_CT_statistics/cl_ids_present_in_astcb.csv"), False),
+    Stage("07-2d_plots.py", ("temporal_spatial_output/",), ("2d_plots/",), False),
+    Stage("08-3d_scatter_plot.py", ("temporal_spatial_output/",), ("3d_scatter_plots/",), False),
+    Stage("09-function_rollup.py", (TABLES, REPORT, ASCTB, FTU_LIST), ("function_rollup/",), False),
+    Stage("10-process_counts.py", ("temporal_spatial_output/",), ("unique_processes/",), False),
+    Stage("11-unique_effectors.py", (TABLES, REPORT, ASCTB, FTU_LIST), ("unique_effectors/",), False, partial=True),
+    Stage("12-common_effectors_across_systems.py", (TABLES, REPORT), ("common_effectors_across_systems/",), False),
+    Stage("13-ftus_wpp.py", (TABLES, REPORT, ASCTB, FTU_LIST), ("unique_ftus/",), False, partial=True),
+    Stage("14-interaction_graph.py", (TABLES, REPORT), ("interaction_graph/",), False),
+    Stage("15-duplicate_rows.py", (TABLES, REPORT), ("duplicate_rows/",), False),
+]
+
+
+def discover(scripts_dir=SCRIPTS_DIR):
+    """Registered stages plus any unregistered numbered script, in run order."""
+    known = {s.script: s for s in STAGES}
+    found = []
+    for path in sorted(glob.glob(os.path.join(scripts_dir, "*.py"))):
+        name = os.path.basename(path)
+        found.append(known.get(name, Stage(name, (TABLES,), (), False)))
+    return found
+
+
+def _norm(path, week_dir):
+    return os.path.normpath(os.path.join(os.path.abspath(week_dir), path))
+
+
+def _touches(path, targets, week_dir):
+    """True if ``path`` is one of ``targets`` or lies under a target folder."""
+    path = _norm(path, week_dir)
+    for t in targets:
+        t = _norm(t, week_dir)
+        if path == t or path.startswith(t + os.sep):
+            return True
+    return False
+
+
+def feeds(earlier, later, week_dir="."):
+    """True if ``earlier`` writes a file or folder that ``later`` reads."""
+    return any(_touches(w, later.reads, week_dir) for w in earlier.writes) or \
+        any(_touches(r, earlier.writes, week_dir) for r in later.reads)
+
+
+def affected(changed, week_dir=".", include_network=False, stages=None):
+    """Stages that must rerun after ``changed`` files, in run order."""
+    stages = discover() if stages is None else stages
+    dirty = list(changed)
+    selected = []
+    for stage in stages:
+        if stage.network and not include_network:
+            continue
+        if any(_touches(p, stage.reads, week_dir) for p in dirty):
+            selected.append(stage)
+            # anything this stage writes is now dirty for the stages after it
+            dirty.extend(stage.writes)
+    return selected
+
+
+def prepare_work_dir(stage, week_dir, work_dir, table=None):
+    """
+    Copy what ``stage`` reads from the week folder into a private work folder,
+    without overwriting files already there (written by an earlier stage run
+    in the same folder). With ``table``, only that input table is copied.
+    """
+    for rel in stage.reads:
+        if os.path.isabs(rel):
+            continue  # repo files such as ftu_list.csv are read in place
+        src, dest = os.path.join(week_dir, rel), os.path.join(work_dir, rel)
+        if rel == TABLES and table:
+            src, dest = os.path.join(src, table), os.path.join(dest, table)
+        if os.path.isfile(src):
+            _copy_missing(src, dest)
+        for root, _, files in os.walk(src):
+            for name in files:
+                path = os.path.join(root, name)
+                _copy_missing(path, os.path.join(dest, os.path.relpath(path, src)))
+
+
+def _copy_missing(src, dest):
+    if not os.path.exists(dest):
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copy2(src, dest)
+
+
+def run_stage(stage, week_dir=".", scripts_dir=SCRIPTS_DIR):
+    """
+    Run one script in this process with CWD set to the week folder. Returns
+    (ok, seconds); errors and sys.exit() are reported, not raised.
+    """
+    path = os.path.join(scripts_dir, stage.script)
+    old_cwd, old_argv = os.getcwd(), sys.argv
+    start = time.perf_counter()
+    ok = True
+    try:
+        os.chdir(week_dir)
+        sys.argv = [path]
+        runpy.run_path(path, run_name="__main__")
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+    except Exception as e:
+        print(f"[ERROR] {stage.script} failed: {e!r}")
+        ok = False
+    finally:
+        os.chdir(old_cwd)
+        sys.argv = old_argv
+    return ok, time.perf_counter() - start
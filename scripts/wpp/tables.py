@@ -0,0 +1,472 @@
+"""
+Loader for the wide WPP input tables.
+
+Every table starts with a metadata block (title, authors, reviewers, DOI, date,
+version), optionally a row of section names and a row of instructions, and
+then the real header row that starts with ``Function/1``. Depending on the
+sheet layout that header sits on row 11 or 12 (0-indexed), so it is detected
+instead of guessed from the file name.
+
+Stages declare the column groups they need and ``read_table`` turns those into
+``usecols`` positions after header detection, so parse time and memory scale
+with the columns a stage actually uses:
+
+    df = tables.read_table(path, groups=("function", "process", "effector"))
+
+Excel workbooks (.xlsx/.xlsm) are streamed row by row with openpyxl's
+read-only reader; only sheets with the WPP header layout and only the
+projected columns are materialized. ``load_tables`` is the common entry point
+for both formats and keeps parsed tables in an in-process cache keyed by the
+file's size and mtime, so a long-running process (watch mode, pipelined runs)
+parses each table once. ``iter_tables`` streams tables in fixed-size pieces
+instead when WPP_CHUNK_ROWS is set, for tables too large to hold in memory.
+"""
+import csv
+import itertools
+import json
+import math
+import os
+import re
+
+import pandas as pd
+
+from wpp import instrument, shared
+
+# Column groups, keyed by a short name. Patterns are matched against the
+# squashed column name (see column_key), so "Effector/ID", "Effector ID" and
+# "effector_id" all land in the same group.
+COLUMN_GROUPS = {
+    # Physiological Function
+    "function": [r"function\d+(label|id)?", r"functionnotes", r"lowestfunction"],
+    # Physiological Process
+    "process": [r"process", r"processid"],
+    "effector": [r"effector(location)?(scale|label|id|identifier)?"],
+    "signal": [r"signal(label|id)?", r"effect", r"behavior[xyz]?(label|id)?", r"xtarget", r"quantitativenotes"],
+    # Scales of Effect
+    "scales": [r"timescale", r"signalscale", r"effectscale"],
+    # Clinical Metrics
+    "clinical": [r"clinicalmeasure\d+(label|id)?"],
+    # Interacting Functions
+    "interactions": [r"interaction\d+(label|id)?"],
+    "states": [r"(state|regulation)\d+"],
+    # Reference Material
+    "references": [r"ref\d+(id|chapter|notes)?"],
+    # Common Data Elements
+    "cde": [r"cde\d+(id)?"],
+}
+
+_GROUP_PATTERNS = {
+    group: re.compile("|".join(f"(?:{p})" for p in patterns))
+    for group, patterns in COLUMN_GROUPS.items()
+}
+
+HEADER_MARKER = "function/1"
+HEADER_SCAN_ROWS = 40
+
+
+def column_key(name):
+    """Lowercase a column name and drop spaces, slashes, underscores and hyphens."""
+    return re.sub(r"[\s/_\-]+", "", str(name).strip().lower())
+
+
+def column_group(name):
+    """Return the group a column belongs to, or None."""
+    key = column_key(name)
+    for group, pattern in _GROUP_PATTERNS.items():
+        if pattern.fullmatch(key):
+            return group
+    return None
+
+
+def default_header_row(path):
+    """The old file-name heuristic, used only if no ``Function/1`` row is found."""
+    return 12 if "endocrine" in os.path.basename(path).lower() else 11
+
+
+def read_header(path, sep=",", encoding="utf-8-sig"):
+    """
+    Find the header row of a table without parsing the data rows.
+
+    Returns (header_row, columns). header_row counts non-blank records the same
+    way pandas does for ``header=``; columns are the raw header cells.
+    """
+    with open(path, newline="", encoding=encoding) as fh:
+        row_no = 0
+        for record in csv.reader(fh, delimiter=sep):
+            if not record:
+                continue  # pandas skips blank lines when counting header rows
+            if any(cell.strip().lower() == HEADER_MARKER for cell in record[:3]):
+                return row_no, record
+            row_no += 1
+            if row_no >= HEADER_SCAN_ROWS:
+                break
+    header_row = default_header_row(path)
+    columns = list(pd.read_csv(path, sep=sep, header=header_row, nrows=0, encoding=encoding).columns)
+    return header_row, columns
+
+
+def detect_header_row(path, sep=","):
+    return read_header(path, sep=sep)[0]
+
+
+def resolve_usecols(columns, groups=None, extra=()):
+    """
+    Positions of the header cells that belong to any of ``groups`` or whose
+    squashed name matches one of ``extra``. groups=None keeps every column.
+    """
+    if groups is None:
+        return list(range(len(columns)))
+    groups = set(groups)
+    unknown = groups - set(COLUMN_GROUPS)
+    if unknown:
+        raise ValueError(f"Unknown column group(s): {sorted(unknown)}")
+    extra_keys = {column_key(c) for c in extra}
+    return [
+        i for i, name in enumerate(columns)
+        if column_group(name) in groups or column_key(name) in extra_keys
+    ]
+
+
+def read_table(path, groups=None, extra=(), sep=",", encoding="utf-8-sig", **kwargs):
+    """
+    Read a WPP table with header detection and column projection.
+
+    All values are read as strings; column names are stripped. ``kwargs`` are
+    passed to ``pd.read_csv`` (e.g. ``chunksize``).
+    """
+    header_row, columns = read_header(path, sep=sep, encoding=encoding)
+    usecols = resolve_usecols(columns, groups, extra)
+    df = pd.read_csv(
+        path,
+        sep=sep,
+        header=header_row,
+        usecols=usecols,
+        dtype=str,
+        encoding=encoding,
+        **kwargs,
+    )
+    if isinstance(df, pd.DataFrame):
+        df.columns = df.columns.str.strip()
+        instrument.count("rows_read", len(df))
+        instrument.count("columns_read", len(df.columns))
+    return df
+
+
+CSV_EXTENSIONS = (".csv", ".tsv")
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm", ".xls")
+INPUT_EXTENSIONS = CSV_EXTENSIONS + EXCEL_EXTENSIONS
+
+# streaming mode: read tables in pieces of this many rows (see iter_tables)
+CHUNK_ROWS_ENV = "WPP_CHUNK_ROWS"
+
+# written by 00-validate_tables.py into the week's data/ folder
+VALIDATION_REPORT = "validation_report.json"
+
+# (realpath, size, mtime_ns, groups, extra) -> [(name, DataFrame)]
+_TABLE_CACHE = {}
+
+
+def failed_inputs(folder):
+    """
+    {realpath: (size, mtime_ns)} of the tables under ``folder`` that the last
+    validation (00-validate_tables.py) marked as errors. The report sits next
+    to the input folder, in the week's data/ folder.
+    """
+    report = os.path.join(os.path.dirname(os.path.normpath(folder)), VALIDATION_REPORT)
+    if not os.path.exists(report):
+        return {}
+    with open(report, encoding="utf-8") as fh:
+        entries = json.load(fh).get("tables", [])
+    return {
+        os.path.realpath(os.path.join(os.path.dirname(report), e["path"])): (e["size"], e["mtime_ns"])
+        for e in entries if e.get("status") == "error"
+    }
+
+
+def list_input_files(folder, recursive=False, extensions=INPUT_EXTENSIONS, skip_invalid=True):
+    """
+    Sorted paths of the input tables (CSV, TSV and Excel) under ``folder``.
+
+    Tables that failed validation are left out as long as they are unchanged
+    since the report was written; set WPP_INCLUDE_INVALID=1 to keep them.
+    """
+    found = []
+    for root, dirs, files in os.walk(folder):
+        found.extend(os.path.join(root, f) for f in files if f.lower().endswith(extensions))
+        if not recursive:
+            break
+    found.sort()
+    if not skip_invalid or os.environ.get("WPP_INCLUDE_INVALID") == "1":
+        return found
+    failed = failed_inputs(folder)
+    kept = []
+    for path in found:
+        st = os.stat(path)
+        if failed.get(os.path.realpath(path)) == (st.st_size, st.st_mtime_ns):
+            print(f"[WARN] Skipping {os.path.basename(path)}: failed validation (see data/{VALIDATION_REPORT})")
+            instrument.count("tables_skipped_invalid")
+            continue
+        kept.append(path)
+    return kept
+
+
+def _cell_text(value):
+    """Excel cell -> the string a CSV export would contain (None for empty)."""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isfinite(value) and value.is_integer():
+        value = int(value)
+    text = str(value)
+    return text if text != "" else None
+
+
+def _dedupe_names(names):
+    # same scheme as pandas uses for duplicate CSV headers: X, X.1, X.2
+    seen = {}
+    out = []
+    for name in names:
+        if name in seen:
+            seen[name] += 1
+            out.append(f"{name}.{seen[name]}")
+        else:
+            seen[name] = 0
+            out.append(name)
+    return out
+
+
+def _sheet_header(rows):
+    """Consume ``rows`` up to the ``Function/1`` header row and return its cells, or None."""
+    for n, row in enumerate(rows):
+        if n >= HEADER_SCAN_ROWS:
+            break
+        cells = [_cell_text(v) or "" for v in row]
+        if any(c.strip().lower() == HEADER_MARKER for c in cells[:3]):
+            while cells and cells[-1] == "":
+                cells.pop()
+            return cells
+    return None
+
+
+def _preamble(rows):
+    """Non-blank rows (stripped cells) above the ``Function/1`` header row, or None if there is none."""
+    block = []
+    for n, row in enumerate(rows):
+        if n >= HEADER_SCAN_ROWS:
+            break
+        cells = [(_cell_text(v) or "").strip() for v in row]
+        if any(c.lower() == HEADER_MARKER for c in cells[:3]):
+            return block
+        while cells and cells[-1] == "":
+            cells.pop()
+        if cells:
+            block.append(cells)
+    return None
+
+
+def read_preambles(path):
+    """
+    The metadata block (title, authors, date, version, ...) of every WPP table
+    in ``path`` as [(name, rows)], named like ``load_tables`` names them.
+    Reading stops at each header row, so no data row is parsed.
+    """
+    fname = os.path.basename(path)
+    ext = os.path.splitext(fname)[1].lower()
+    if ext not in EXCEL_EXTENSIONS:
+        with open(path, newline="", encoding="utf-8-sig") as fh:
+            block = _preamble(csv.reader(fh, delimiter="\t" if ext == ".tsv" else ","))
+        return [(fname, block)] if block is not None else []
+    if ext == ".xls":
+        sheets = pd.read_excel(path, sheet_name=None, header=None, dtype=str, nrows=HEADER_SCAN_ROWS)
+        found = [(sheet, _preamble(tuple(None if pd.isna(v) else v for v in r)
+                                   for r in raw.itertuples(index=False, name=None)))
+                 for sheet, raw in sheets.items()]
+    else:
+        from openpyxl import load_workbook
+
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            found = [(ws.title, _preamble(ws.iter_rows(values_only=True))) for ws in wb.worksheets]
+        finally:
+            wb.close()
+    found = [(sheet, block) for sheet, block in found if block is not None]
+    if len(found) == 1:
+        return [(fname, found[0][1])]
+    return [(f"{sheet}{ext}", block) for sheet, block in found]
+
+
+def _sheet_records(rows, usecols):
+    """Projected data records; blank records are held back so the ones at the end are dropped."""
+    # formatting often stretches a sheet's used range past the data
+    blank = []
+    for row in rows:
+        record = [_cell_text(row[i]) if i < len(row) else None for i in usecols]
+        if all(v is None for v in record):
+            blank.append(record)
+            continue
+        yield from blank
+        blank.clear()
+        yield record
+
+
+def _sheet_frame(rows, groups, extra):
+    """Build the projected frame of one sheet from a row iterator, or None if it is not a WPP sheet."""
+    header = _sheet_header(rows)
+    if header is None:
+        return None
+    usecols = resolve_usecols(header, groups, extra)
+    names = _dedupe_names([header[i].strip() for i in usecols])
+    return pd.DataFrame(list(_sheet_records(rows, usecols)), columns=names, dtype=str)
+
+
+def read_excel_tables(path, groups=None, extra=()):
+    """
+    Stream the WPP sheets of a workbook. Returns [(sheet_name, DataFrame)] for
+    every sheet that has a ``Function/1`` header row; other sheets (glossary,
+    instructions) are skipped without being loaded.
+    """
+    if path.lower().endswith(".xls"):
+        # legacy format: no streaming reader, fall back to pandas (needs xlrd)
+        sheets = pd.read_excel(path, sheet_name=None, header=None, dtype=str)
+        out = []
+        for sheet, raw in sheets.items():
+            rows = iter(raw.itertuples(index=False, name=None))
+            df = _sheet_frame((tuple(None if pd.isna(v) else v for v in r) for r in rows), groups, extra)
+            if df is not None:
+                out.append((sheet, df))
+        return out
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        out = []
+        for ws in wb.worksheets:
+            df = _sheet_frame(ws.iter_rows(values_only=True), groups, extra)
+            if df is not None:
+                out.append((ws.title, df))
+        return out
+    finally:
+        wb.close()
+
+
+def _parse_tables(path, groups, extra):
+    fname = os.path.basename(path)
+    ext = os.path.splitext(fname)[1].lower()
+    if ext not in EXCEL_EXTENSIONS:
+        sep = "\t" if ext == ".tsv" else ","
+        return [(fname, read_table(path, groups=groups, extra=extra, sep=sep))]
+    sheets = read_excel_tables(path, groups=groups, extra=extra)
+    if len(sheets) == 1:
+        parsed = [(fname, sheets[0][1])]
+    else:
+        parsed = [(f"{sheet}{ext}", df) for sheet, df in sheets]
+    for _, df in parsed:
+        instrument.count("rows_read", len(df))
+        instrument.count("columns_read", len(df.columns))
+    return parsed
+
+
+def load_tables(path, groups=None, extra=()):
+    """
+    Load every WPP table in ``path`` as [(name, DataFrame)].
+
+    A CSV/TSV file is one table named after the file. A workbook gives one
+    table per WPP sheet; it is named after the file when it has a single WPP
+    sheet and ``<sheet><ext>`` otherwise. Frames are normalized the same way
+    for both formats (detected header, projected columns, string values,
+    stripped column names) and served from the in-process cache while the
+    file is unchanged, and from the cross-process store when one is set up
+    (see wpp/shared.py). Callers get copies and may modify them.
+    """
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns,
+           tuple(sorted(groups)) if groups is not None else None, tuple(extra))
+    cached = _TABLE_CACHE.get(key)
+    if cached is None:
+        cached = shared.load(path, lambda: _parse_tables(path, groups, extra), key[3], key[4])
+        # drop stale entries for the same file
+        for old in [k for k in _TABLE_CACHE if k[0] == key[0] and k[1:3] != key[1:3]]:
+            del _TABLE_CACHE[old]
+        _TABLE_CACHE[key] = cached
+    else:
+        instrument.count("tables_from_cache", len(cached))
+    return [(name, df.copy()) for name, df in cached]
+
+
+def clear_cache(folder=None):
+    """Drop the cached tables (only those under ``folder`` if given)."""
+    if folder is None:
+        _TABLE_CACHE.clear()
+        return
+    prefix = os.path.join(os.path.realpath(folder), "")
+    for key in [k for k in _TABLE_CACHE if k[0].startswith(prefix)]:
+        del _TABLE_CACHE[key]
+
+
+def chunk_rows():
+    """Chunk size from WPP_CHUNK_ROWS, or None to load tables whole."""
+    value = os.environ.get(CHUNK_ROWS_ENV, "").strip()
+    return int(value) if value.isdigit() and int(value) > 0 else None
+
+
+def _csv_chunks(name, reader):
+    with reader:
+        for chunk in reader:
+            chunk.columns = chunk.columns.str.strip()
+            instrument.count("rows_read", len(chunk))
+            yield name, chunk
+
+
+def _excel_chunks(path, groups, extra, chunksize):
+    from openpyxl import load_workbook
+
+    fname = os.path.basename(path)
+    ext = os.path.splitext(fname)[1].lower()
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        # first pass on the header rows only, to name the tables like load_tables does
+        sheets = [ws for ws in wb.worksheets if _sheet_header(ws.iter_rows(values_only=True)) is not None]
+        for ws in sheets:
+            rows = ws.iter_rows(values_only=True)
+            header = _sheet_header(rows)
+            usecols = resolve_usecols(header, groups, extra)
+            names = _dedupe_names([header[i].strip() for i in usecols])
+            name = fname if len(sheets) == 1 else f"{ws.title}{ext}"
+            records = _sheet_records(rows, usecols)
+            offset = 0
+            while True:
+                batch = list(itertools.islice(records, chunksize))
+                if not batch:
+                    break
+                instrument.count("rows_read", len(batch))
+                # index = row offset under the header, as in the whole-table frame (and CSV chunks)
+                yield name, pd.DataFrame(batch, columns=names, dtype=str,
+                                         index=pd.RangeIndex(offset, offset + len(batch)))
+                offset += len(batch)
+    finally:
+        wb.close()
+
+
+def iter_tables(path, groups=None, extra=(), chunksize=None):
+    """
+    The tables in ``path`` as (name, DataFrame) pieces.
+
+    Without a chunk size (argument or WPP_CHUNK_ROWS) every table is one
+    piece from ``load_tables``. With one, tables are streamed in pieces of at
+    most ``chunksize`` rows that bypass the caches, so memory stays bounded
+    by the chunk size; callers merge their per-piece aggregates. Legacy .xls
+    workbooks are loaded whole and then sliced.
+    """
+    chunksize = chunksize or chunk_rows()
+    if not chunksize:
+        return iter(load_tables(path, groups=groups, extra=extra))
+    fname = os.path.basename(path)
+    ext = os.path.splitext(fname)[1].lower()
+    if ext == ".xls":
+        return ((name, df.iloc[i:i + chunksize]) for name, df in load_tables(path, groups, extra)
+                for i in range(0, max(len(df), 1), chunksize))
+    if ext in EXCEL_EXTENSIONS:
+        return _excel_chunks(path, groups, extra, chunksize)
+    sep = "\t" if ext == ".tsv" else ","
+    # the header is detected here, so a bad table fails before the first piece
+    return _csv_chunks(fname, read_table(path, groups=groups, extra=extra, sep=sep, chunksize=chunksize))
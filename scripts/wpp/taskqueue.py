@@ -0,0 +1,330 @@
+"""
+File-lock work queue so several workers, local or on other hosts, can share a
+backfill through a shared directory. No service is needed, only a
+filesystem with atomic exclusive create (local disks, NFSv3+).
+
+``enqueue`` splits each stale week (see wpp/backfill.py) into tasks, one per
+(week, stage), and one per (week, organ system table, stage) for per-table
+stages such as 02. A task depends on the tasks of earlier stages that write
+what it reads (wpp/stages.py), so 10 waits for every 02 task of its week.
+
+Queue layout:
+
+    queue.json                      run id and creation time
+    tasks/<task>.json               task spec (week folder, stage, table, deps)
+    claims/<task>.<n>.lock          lease n; its mtime is the heartbeat
+    done/<task>.json                result, written after the outputs are committed
+    failed/<task>.json              given up after too many expired leases
+    logs/<task>.<n>.log             stage output of lease n
+    shared/                         parsed tables shared by all workers (wpp/shared.py)
+
+A worker claims a ready task by creating ``claims/<task>.0.lock`` with
+O_EXCL and keeps touching it while the stage runs. If the worker dies, the
+lock stops being touched; once it is older than the lease, another worker
+takes the task over by creating ``<task>.1.lock``, and so on. Only one
+worker can create a given lease number, and a worker only commits if no
+newer lease exists for its task. The stage runs in a private temporary
+folder holding the files it reads from the week folder (for per-table tasks,
+only its own table). Its artifacts are copied into the week folder and
+merged into the week's manifest.json before the task is marked done, so a
+task that is replayed after a crash only rewrites the same files.
+
+Week folders are stored as absolute paths and must be mounted at the same
+path on every host.
+
+    PYTHONPATH=scripts python -m wpp.taskqueue enqueue /shared/wpp-queue --from 2026-03-01
+    PYTHONPATH=scripts python -m wpp.taskqueue work /shared/wpp-queue --jobs 4   # on each host
+    PYTHONPATH=scripts python -m wpp.taskqueue status /shared/wpp-queue
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from wpp import backfill, instrument, shared, stages, tables
+
+QUEUE_FILE = "queue.json"
+TASKS, CLAIMS, DONE, FAILED, LOGS, SHARED = "tasks", "claims", "done", "failed", "logs", "shared"
+
+DEFAULT_LEASE = 600.0
+DEFAULT_POLL = 5.0
+MAX_LEASES = 3
+
+
+def _write_json(path, data):
+    tmp = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _ids(queue_dir, sub):
+    return {os.path.splitext(f)[0] for f in os.listdir(os.path.join(queue_dir, sub)) if f.endswith(".json")}
+
+
+def task_id(week, stage, table=None):
+    name = backfill.stage_name(stage)
+    if table is None:
+        return f"{week}__{name}"
+    return f"{week}__{name}__{os.path.splitext(table)[0].replace(os.sep, '_')}"
+
+
+def plan_week(week_dir, stage_list):
+    """Tasks of one week in run order, each with the ids of the tasks it waits for."""
+    week = os.path.basename(week_dir)
+    input_dir = os.path.join(week_dir, stages.TABLES)
+    table_files = [os.path.relpath(p, input_dir)
+                   for p in tables.list_input_files(input_dir, recursive=True, skip_invalid=False)]
+    planned = []  # (stage, task)
+    for stage in stage_list:
+        deps = [t["id"] for s, t in planned if stages.feeds(s, stage, week_dir)]
+        for table in (table_files if stage.per_table else [None]):
+            task = {"id": task_id(week, stage, table), "week_dir": os.path.abspath(week_dir),
+                    "script": stage.script, "table": table, "deps": deps}
+            planned.append((stage, task))
+    return [t for _, t in planned]
+
+
+def enqueue(queue_dir, week_dirs, stage_list=None):
+    """Add the tasks of ``week_dirs`` to the queue; returns how many were new."""
+    stage_list = backfill.replayed_stages() if stage_list is None else stage_list
+    for sub in (TASKS, CLAIMS, DONE, FAILED, LOGS):
+        os.makedirs(os.path.join(queue_dir, sub), exist_ok=True)
+    meta_path = os.path.join(queue_dir, QUEUE_FILE)
+    if not os.path.exists(meta_path):
+        _write_json(meta_path, {"run_id": "queue_" + time.strftime("%Y%m%d_%H%M%S"),
+                                "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "next_order": 0})
+    meta = _read_json(meta_path)
+    added = 0
+    for week_dir in week_dirs:
+        for task in plan_week(week_dir, stage_list):
+            path = os.path.join(queue_dir, TASKS, f"{task['id']}.json")
+            if os.path.exists(path):
+                continue
+            task["order"] = meta["next_order"]
+            meta["next_order"] += 1
+            _write_json(path, task)
+            added += 1
+    _write_json(meta_path, meta)
+    return added
+
+
+def load_tasks(queue_dir):
+    paths = glob.glob(os.path.join(queue_dir, TASKS, "*.json"))
+    return sorted((_read_json(p) for p in paths), key=lambda t: t["order"])
+
+
+def _leases(queue_dir, tid):
+    """Lease numbers taken so far for a task, ascending."""
+    found = []
+    for path in glob.glob(os.path.join(glob.escape(os.path.join(queue_dir, CLAIMS, tid)) + ".*.lock")):
+        n = path[:-len(".lock")].rsplit(".", 1)[1]
+        if n.isdigit():
+            found.append(int(n))
+    return sorted(found)
+
+
+def _lock_path(queue_dir, tid, n):
+    return os.path.join(queue_dir, CLAIMS, f"{tid}.{n}.lock")
+
+
+def _expired(path, lease):
+    try:
+        return time.time() - os.stat(path).st_mtime > lease
+    except FileNotFoundError:
+        return True
+
+
+def claim(queue_dir, tid, worker, lease=DEFAULT_LEASE):
+    """
+    Take the task if it is unclaimed or its last lease expired. Returns the
+    lease number, or None if another worker holds it.
+    """
+    taken = _leases(queue_dir, tid)
+    if taken and not _expired(_lock_path(queue_dir, tid, taken[-1]), lease):
+        return None
+    n = taken[-1] + 1 if taken else 0
+    try:
+        fd = os.open(_lock_path(queue_dir, tid, n), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    with os.fdopen(fd, "w") as fh:
+        json.dump({"worker": worker, "claimed_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, fh)
+    return n
+
+
+def owns(queue_dir, tid, n):
+    """True while lease ``n`` is the newest lease of the task."""
+    return _leases(queue_dir, tid)[-1:] == [n]
+
+
+@contextlib.contextmanager
+def _heartbeat(path, interval):
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            with contextlib.suppress(FileNotFoundError):
+                os.utime(path)
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def execute(queue_dir, task, n, worker, lease=DEFAULT_LEASE, run_id=""):
+    """Run a claimed task and commit its outputs; returns True if it was committed."""
+    stage = {s.script: s for s in stages.discover()}[task["script"]]
+    lock = _lock_path(queue_dir, task["id"], n)
+    os.environ[instrument.RUN_ID_ENV] = run_id
+    os.environ.pop(instrument.METRICS_DIR_ENV, None)
+
+    with _heartbeat(lock, lease / 3):
+        work_dir = tempfile.mkdtemp(prefix=f"wpp-task-{task['id']}-")
+        try:
+            stages.prepare_work_dir(stage, task["week_dir"], work_dir, task["table"])
+            log_path = os.path.join(queue_dir, LOGS, f"{task['id']}.{n}.log")
+            with open(log_path, "w", encoding="utf-8") as log, \
+                    contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+                ok, seconds = stages.run_stage(stage, work_dir)
+            if not owns(queue_dir, task["id"], n):
+                # the lease expired and another worker took over; its result wins
+                return False
+            published = backfill.publish(work_dir, task["week_dir"])
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    # like run.sh, a failing stage does not block the stages after it
+    _write_json(os.path.join(queue_dir, DONE, f"{task['id']}.json"), {
+        "ok": ok, "seconds": round(seconds, 3), "published": published, "lease": n,
+        "worker": worker, "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    return True
+
+
+def work(queue_dir, worker=None, lease=DEFAULT_LEASE, poll=DEFAULT_POLL, max_leases=MAX_LEASES):
+    """
+    Claim and run ready tasks until none are left that could still run.
+    Returns the number of tasks this worker committed.
+    """
+    queue_dir = os.path.abspath(queue_dir)
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    run_id = _read_json(os.path.join(queue_dir, QUEUE_FILE))["run_id"]
+    os.environ.setdefault(shared.STORE_ENV, os.path.join(queue_dir, SHARED))
+    committed = 0
+    while True:
+        done, failed = _ids(queue_dir, DONE), _ids(queue_dir, FAILED)
+        waiting = ran = False
+        for task in load_tasks(queue_dir):
+            tid = task["id"]
+            if tid in done or tid in failed or any(d in failed for d in task["deps"]):
+                continue
+            if not all(d in done for d in task["deps"]):
+                waiting = True
+                continue
+            taken = _leases(queue_dir, tid)
+            if len(taken) >= max_leases and _expired(_lock_path(queue_dir, tid, taken[-1]), lease):
+                _write_json(os.path.join(queue_dir, FAILED, f"{tid}.json"),
+                            {"reason": f"{len(taken)} leases expired", "worker": worker})
+                continue
+            n = claim(queue_dir, tid, worker, lease)
+            if n is None:
+                waiting = True
+                continue
+            print(f"[{time.strftime('%H:%M:%S')}] {worker} runs {tid} (lease {n})")
+            try:
+                committed += execute(queue_dir, task, n, worker, lease, run_id)
+            except Exception as e:
+                # the lease runs out and the task is retried, here or elsewhere
+                print(f"[ERROR] {tid} failed in {worker}: {e!r}")
+            ran = True
+            break
+        if ran:
+            continue
+        if not waiting:
+            return committed
+        time.sleep(poll)
+
+
+def status(queue_dir, lease=DEFAULT_LEASE):
+    """Counts of done / failed / running / ready / blocked tasks."""
+    done, failed = _ids(queue_dir, DONE), _ids(queue_dir, FAILED)
+    counts = dict.fromkeys(("done", "done_with_errors", "failed", "running", "ready", "waiting", "blocked"), 0)
+    for task in load_tasks(queue_dir):
+        tid = task["id"]
+        if tid in done:
+            ok = _read_json(os.path.join(queue_dir, DONE, f"{tid}.json"))["ok"]
+            counts["done" if ok else "done_with_errors"] += 1
+        elif tid in failed:
+            counts["failed"] += 1
+        elif any(d in failed for d in task["deps"]):
+            counts["blocked"] += 1
+        elif not all(d in done for d in task["deps"]):
+            counts["waiting"] += 1
+        else:
+            taken = _leases(queue_dir, tid)
+            live = taken and not _expired(_lock_path(queue_dir, tid, taken[-1]), lease)
+            counts["running" if live else "ready"] += 1
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared file-lock task queue for backfills.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    enq = sub.add_parser("enqueue", help="Add the stale weeks in a date range to the queue.")
+    enq.add_argument("queue")
+    enq.add_argument("--from", dest="start")
+    enq.add_argument("--to", dest="end")
+    enq.add_argument("--base", default=backfill.WEEK_BASE)
+    enq.add_argument("--force", action="store_true", help="Also enqueue weeks that are up to date.")
+    wrk = sub.add_parser("work", help="Claim and run tasks until the queue is drained.")
+    wrk.add_argument("queue")
+    wrk.add_argument("--jobs", "-j", type=int, default=1, help="Worker processes on this host.")
+    wrk.add_argument("--lease", type=float, default=DEFAULT_LEASE, help="Seconds without heartbeat before a claim expires.")
+    wrk.add_argument("--poll", type=float, default=DEFAULT_POLL)
+    wrk.add_argument("--max-leases", type=int, default=MAX_LEASES, help="Give a task up after this many expired leases.")
+    st = sub.add_parser("status", help="Show task counts.")
+    st.add_argument("queue")
+    st.add_argument("--lease", type=float, default=DEFAULT_LEASE)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "enqueue":
+        stage_list = backfill.replayed_stages()
+        versions = backfill.current_versions(stage_list)
+        weeks = [w for w in backfill.list_weeks(args.base, args.start, args.end)
+                 if args.force or backfill.stale_stages(w, versions)]
+        added = enqueue(args.queue, weeks, stage_list)
+        print(f"Enqueued {added} task(s) for {len(weeks)} week(s) in {args.queue}")
+    elif args.cmd == "work":
+        if args.jobs > 1:
+            with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+                futures = [pool.submit(work, args.queue, None, args.lease, args.poll, args.max_leases)
+                           for _ in range(args.jobs)]
+                committed = sum(f.result() for f in futures)
+        else:
+            committed = work(args.queue, None, args.lease, args.poll, args.max_leases)
+        print(f"Committed {committed} task(s)")
+    else:
+        for state, n in status(args.queue, args.lease).items():
+            print(f"{state:17} {n}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
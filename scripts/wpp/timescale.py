@@ -0,0 +1,180 @@
+"""
+TimeScale values as numeric intervals, binned into time ranges.
+
+A TimeScale cell ("minutes-hours", "hours, days, weeks, months", "< 1 s",
+"10-30 min") is parsed into a closed interval [min, max] in seconds:
+
+- a unit word covers the whole unit, "hours" = [1 h, 1 day),
+- a number with a unit is a point, "30 min" = 1800 s; numbers before a
+  unit take that unit, "1-10 minutes" = [60 s, 600 s],
+- "<" / "less than" and ">" / "more than" open the next point downwards
+  or upwards,
+- several parts ("minutes-hours") span from the smallest to the largest.
+
+Unit words may be glued together the way the old squashed lookup keys were
+("secondsminuteshours"). "continuous" and "variable" are not intervals and
+pass through as their own time ranges. Anything else does not parse and
+becomes "Unknown" (00 reports such values).
+
+Each distinct cell is parsed once; binning is an ``np.searchsorted`` of the
+interval ends against the bin edges, so a table costs one parse per distinct
+value and no per-row Python. The bins default to the seven ranges of the
+spatial-temporal tables. Point WPP_TIME_BINS at a CSV (``label,from``; from
+in seconds or as a phrase such as "1 minute") to bin differently:
+
+    ranges = timescale.time_ranges(df["TimeScale"])   # Series of [label, ...]
+"""
+import functools
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+BINS_ENV = "WPP_TIME_BINS"
+
+MINUTE, HOUR, DAY = 60.0, 3600.0, 86400.0
+# unit -> start in seconds; a unit runs up to the start of the next one
+UNIT_STARTS = {
+    "millisecond": 1e-3, "second": 1.0, "minute": MINUTE, "hour": HOUR, "day": DAY,
+    "week": 7 * DAY, "month": 30 * DAY, "year": 365 * DAY,
+}
+UNIT_ALIASES = {
+    "millisecond": ["milliseconds", "millisecond", "miliseconds", "milisecond", "msecs", "msec", "ms"],
+    "second": ["seconds", "second", "secs", "sec", "s"],
+    "minute": ["minutes", "minute", "mins", "min"],
+    "hour": ["hours", "hour", "hrs", "hr", "h"],
+    "day": ["days", "day", "d"],
+    "week": ["weeks", "week", "wks", "wk"],
+    "month": ["months", "month", "mos", "mo"],
+    "year": ["years", "year", "yrs", "yr", "lifetime", "decades"],
+}
+SPECIAL = {"continuous": "continuous", "variable": "variable"}
+FILLER = {"to", "and", "or", "from", "about", "approx", "approximately", "around", "several", "few", "a", "an", "than"}
+LESS = {"<", "<=", "less", "under", "within", "up"}
+MORE = {">", ">=", "more", "greater", "over", "longer"}
+
+Bins = namedtuple("Bins", ["edges", "labels"])
+DEFAULT_BINS = Bins(
+    np.array([0.0, 1.0, MINUTE, HOUR, DAY, 7 * DAY, 365 * DAY]),
+    ["<1 second", "1s - < 1min", "1min - < 1hr", "1hr - < 1day", "1day - < 1week",
+     "1 week - < 1 year", "1 year or longer"],
+)
+UNKNOWN = "Unknown"
+
+_UNIT = {alias: unit for unit, aliases in UNIT_ALIASES.items() for alias in aliases}
+_UNIT_ORDER = sorted(UNIT_STARTS, key=UNIT_STARTS.get)
+_GLUED = re.compile("|".join(sorted(map(re.escape, _UNIT), key=len, reverse=True)))
+_TOKEN = re.compile(r"\d+(?:\.\d+)?|[a-z]+|<=?|>=?")
+
+
+def unit_span(unit):
+    """[start, end] in seconds of a unit word; the end is just below the next unit's start."""
+    i = _UNIT_ORDER.index(unit)
+    end = UNIT_STARTS[_UNIT_ORDER[i + 1]] if i + 1 < len(_UNIT_ORDER) else np.inf
+    return UNIT_STARTS[unit], np.nextafter(end, 0)
+
+
+def _words(word):
+    """A word as unit names, splitting glued units ("secondsminutes"); None if it is not made of units."""
+    if word in _UNIT:
+        return [_UNIT[word]]
+    if _GLUED.sub("", word) == "" and len(word) > 3:
+        return [_UNIT[w] for w in _GLUED.findall(word)]
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def parse(text):
+    """
+    (min, max) in seconds for a TimeScale value, the name of a special value
+    ("continuous", "variable"), or None if it does not parse or is blank.
+    """
+    tokens = _TOKEN.findall(str(text).lower())
+    if not tokens or tokens == ["nan"]:
+        return None
+    spans, numbers, special, direction = [], [], None, None
+    for token in tokens:
+        if token[0].isdigit():
+            numbers.append(float(token))
+        elif token in LESS or token in MORE:
+            direction = "<" if token in LESS else ">"
+        elif token in SPECIAL:
+            special = SPECIAL[token]
+        elif token in FILLER:
+            continue
+        else:
+            units = _words(token)
+            if units is None:
+                return None
+            if numbers:
+                scale = UNIT_STARTS[units[0]]
+                points = [n * scale for n in numbers]
+                if direction == "<":
+                    spans.append((0.0, np.nextafter(max(points), 0)))
+                elif direction == ">":
+                    spans.append((np.nextafter(min(points), np.inf), np.inf))
+                else:
+                    spans.extend((p, p) for p in points)
+                numbers, direction = [], None
+                units = units[1:]
+            spans.extend(unit_span(u) for u in units)
+    if numbers:
+        return None  # a number without a unit
+    if not spans:
+        return special
+    return min(lo for lo, _ in spans), max(hi for _, hi in spans)
+
+
+def load_bins(path):
+    """Bins from a CSV with columns label,from (seconds, or a phrase like "1 minute"), in any order."""
+    df = pd.read_csv(path, dtype=str)
+    starts = []
+    for value in df["from"]:
+        try:
+            starts.append(float(value))
+        except ValueError:
+            parsed = parse(value)
+            if not isinstance(parsed, tuple):
+                raise ValueError(f"{path}: cannot read bin start {value!r}")
+            starts.append(parsed[0])
+    order = np.argsort(starts, kind="stable")
+    return Bins(np.asarray(starts)[order], [df["label"].iloc[i].strip() for i in order])
+
+
+def configured_bins():
+    """WPP_TIME_BINS if set, else DEFAULT_BINS."""
+    path = os.environ.get(BINS_ENV)
+    return _load_cached(path) if path else DEFAULT_BINS
+
+
+@functools.lru_cache(maxsize=None)
+def _load_cached(path):
+    return load_bins(path)
+
+
+def labels(bins=None):
+    """Time range labels in order: the bins, then the special values."""
+    return list((bins or configured_bins()).labels) + list(SPECIAL.values())
+
+
+def time_ranges(values, bins=None):
+    """Series of lists of time range labels (["Unknown"] if a value does not parse) for TimeScale cells."""
+    bins = bins or configured_bins()
+    codes, uniques = pd.factorize(values.astype("string").str.strip(), use_na_sentinel=True)
+    parsed = [parse(u) for u in uniques]
+    lo = np.array([p[0] if isinstance(p, tuple) else np.nan for p in parsed])
+    hi = np.array([p[1] if isinstance(p, tuple) else np.nan for p in parsed])
+    first = np.searchsorted(bins.edges, lo, side="right") - 1
+    last = np.searchsorted(bins.edges, hi, side="right") - 1
+    out = []
+    for p, a, b in zip(parsed, first, last):
+        if isinstance(p, tuple):
+            out.append(list(bins.labels[max(a, 0):b + 1]) or [UNKNOWN])
+        else:
+            out.append([p] if p else [UNKNOWN])
+    out.append([UNKNOWN])  # blank cells (code -1)
+    lists = np.empty(len(out), dtype=object)
+    lists[:] = out
+    return pd.Series(lists[codes], index=values.index)
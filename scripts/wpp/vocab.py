@@ -0,0 +1,77 @@
+"""
+In-process string vocabulary: every distinct string a stage sees gets an
+int32 code, so the stage can keep its sets on codes and decode only when it
+writes.
+
+Codes are assigned in first-seen order and live only as long as the process;
+they are never written out, so outputs hold strings only. 02 keeps the
+Function@Process entries of each spatial-temporal cell as code sets, which
+merge across table pieces without hashing the strings again:
+
+    codes = vocab.encode(df["Function@Process"])    # int32, -1 for blanks
+    vocab.sorted_strings(codes)                     # the distinct strings, sorted
+"""
+import numpy as np
+import pandas as pd
+
+from wpp import instrument
+
+_VOCAB = None
+
+
+class Vocabulary:
+    """Strings and their codes (the position at which each string was first added)."""
+
+    def __init__(self):
+        self.strings = []
+        self._codes = {}
+        self._decoder = np.empty(0, dtype=object)
+
+    def __len__(self):
+        return len(self.strings)
+
+    def _add(self, new):
+        new = [s for s in dict.fromkeys(new) if s not in self._codes]
+        for s in new:
+            self._codes[s] = len(self.strings)
+            self.strings.append(s)
+        instrument.count("vocab_added", len(new))
+
+    def encode(self, values):
+        """int32 codes of ``values`` (iterable or Series; blanks/NA are -1), adding new strings."""
+        values = pd.Series(values, dtype="string") if not isinstance(values, pd.Series) else values.astype("string")
+        codes, uniques = pd.factorize(values.replace("", pd.NA), use_na_sentinel=True)
+        uniques = [str(u) for u in uniques]
+        missing = [u for u in uniques if u not in self._codes]
+        if missing:
+            self._add(missing)
+        lookup = np.array([self._codes[u] for u in uniques] + [-1], dtype=np.int32)
+        return lookup[codes]  # code -1 (NA) picks the trailing -1
+
+    def decode(self, codes):
+        """Object array of the strings of ``codes`` (None for -1)."""
+        if len(self._decoder) != len(self.strings) + 1:
+            self._decoder = np.array(self.strings + [None], dtype=object)
+        return self._decoder[np.asarray(codes, dtype=np.int64)]
+
+
+def get():
+    """The process-wide Vocabulary."""
+    global _VOCAB
+    if _VOCAB is None:
+        _VOCAB = Vocabulary()
+    return _VOCAB
+
+
+def encode(values):
+    return get().encode(values)
+
+
+def decode(codes):
+    return get().decode(codes)
+
+
+def sorted_strings(codes):
+    """The distinct strings of ``codes`` in string order (as ``sorted`` on the strings)."""
+    codes = np.unique(np.asarray(codes, dtype=np.int64))
+    return sorted(decode(codes[codes >= 0]))
@@ -0,0 +1,160 @@
+"""
+Watch mode: rerun the affected stages as soon as an input table changes.
+
+Polls the week's ``data/WPP Input Tables/`` (or a synced local checkout given
+with ``--source``, whose tables are copied into the week folder), the ASCT+B
+master and ftu_list.csv. Changes are debounced, so a sheet that is saved
+several times in a row triggers one run, and only the stages downstream of
+the changed files rerun (see wpp/stages.py). A changed table goes through the
+per-table stages (02) on its own, the way the pipelined run handles one sheet
+(wpp/pipeline.py), so the outputs of the other tables are left alone; the
+stages that aggregate over all tables rerun in full. Stages run inside this
+process: unchanged tables are served from the parsed-table cache and the
+entity index stays loaded, so an edit is reflected in the outputs within
+seconds.
+
+    cd output_iterative/<date>
+    PYTHONPATH=../../scripts python -m wpp.watch
+    PYTHONPATH=../../scripts python -m wpp.watch --source ~/wpp-sheets --debounce 5
+"""
+import argparse
+import os
+import shutil
+import time
+
+from wpp import backfill, entities, instrument, pipeline, stages, tables
+
+
+def snapshot(paths, folders):
+    """{path: (size, mtime_ns)} for the given files and the tables under the given folders."""
+    snap = {}
+    candidates = list(paths)
+    for folder in folders:
+        if os.path.isdir(folder):
+            # invalid tables too: fixing one is a change to react to
+            candidates.extend(tables.list_input_files(folder, recursive=True, skip_invalid=False))
+    for path in candidates:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        snap[os.path.abspath(path)] = (st.st_size, st.st_mtime_ns)
+    return snap
+
+
+def diff(old, new):
+    """Paths added, removed or modified between two snapshots."""
+    return {p for p in old.keys() | new.keys() if old.get(p) != new.get(p)}
+
+
+def sync_from_source(changed, source, dest):
+    """Mirror changed source tables into the week folder; returns the week-side paths."""
+    out = set()
+    for path in changed:
+        rel = os.path.relpath(path, source)
+        target = os.path.join(dest, rel)
+        if os.path.exists(path):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.{os.getpid()}.tmp"
+            shutil.copy2(path, tmp)
+            os.replace(tmp, target)
+        elif os.path.exists(target):
+            os.remove(target)
+        out.add(os.path.abspath(target))
+    return out
+
+
+def run_affected(changed, week_dir):
+    """
+    Rerun the stages downstream of ``changed``. When only input tables
+    changed, the per-table stages run on those tables alone (in a private
+    folder, as pipeline.run_sheet does); every other affected stage reruns
+    over the whole week.
+    """
+    todo = stages.affected(changed, week_dir)
+    if not todo:
+        print("  no stage reads these files")
+        return
+    input_dir = os.path.normpath(os.path.join(week_dir, stages.TABLES))
+    changed_tables = {p for p in changed if os.path.normpath(p).startswith(input_dir + os.sep)}
+    # the master or ftu_list.csv also changed (or the whole folder): every table is affected
+    others = stages.affected(set(changed) - changed_tables, week_dir)
+    per_table = [s for s in todo if s.per_table and s not in others]
+    if per_table:
+        chain = pipeline.sheet_chain(stages.discover(), warm_store=False)
+        log_dir = os.path.join(backfill.REPO_DIR, "output_logs", "logs")
+        os.makedirs(log_dir, exist_ok=True)
+        run_id = os.environ.setdefault(instrument.RUN_ID_ENV, time.strftime("%Y%m%d_%H%M%S"))
+        for path in sorted(changed_tables):
+            table = os.path.relpath(path, input_dir)
+            if not os.path.exists(path):
+                print(f"  removed {table}: its per-table outputs are left in place")
+                continue
+            result = pipeline.run_sheet(week_dir, table, chain, log_dir, run_id)
+            for script, ok, seconds in result["stages"]:
+                print(f"  {'ok  ' if ok else 'FAIL'} {script} on {table} ({seconds:.1f}s)")
+    for stage in todo:
+        if stage in per_table:
+            continue
+        ok, seconds = stages.run_stage(stage, week_dir)
+        print(f"  {'ok  ' if ok else 'FAIL'} {stage.script} ({seconds:.1f}s)")
+
+
+def watch(week_dir=".", source=None, interval=1.0, debounce=2.0, initial_run=True):
+    week_dir = os.path.abspath(week_dir)
+    input_dir = os.path.normpath(os.path.join(week_dir, stages.TABLES))
+    watched_dir = os.path.abspath(source) if source else input_dir
+    files = [os.path.join(week_dir, stages.ASCTB), entities.FTU_LIST]
+
+    if source:
+        # start from the checkout's current state
+        sync_from_source(set(snapshot([], [watched_dir])), watched_dir, input_dir)
+    last = snapshot(files, [watched_dir])
+    print(f"Watching {watched_dir} ({len(last)} files), week folder {week_dir}")
+
+    if initial_run:
+        # one full pass parses every table and loads the index into memory
+        print("Initial run:")
+        run_affected([input_dir, *files], week_dir)
+
+    pending, last_change = set(), 0.0
+    while True:
+        time.sleep(interval)
+        current = snapshot(files, [watched_dir])
+        changed = diff(last, current)
+        last = current
+        if changed:
+            pending |= changed
+            last_change = time.monotonic()
+            continue
+        if not pending or time.monotonic() - last_change < debounce:
+            continue
+
+        stamp = time.strftime("%H:%M:%S")
+        names = ", ".join(sorted(os.path.basename(p) for p in pending))
+        print(f"[{stamp}] changed: {names}")
+        if source:
+            table_changes = {p for p in pending if p.startswith(watched_dir + os.sep)}
+            pending = (pending - table_changes) | sync_from_source(table_changes, watched_dir, input_dir)
+        start = time.perf_counter()
+        run_affected(pending, week_dir)
+        print(f"[{time.strftime('%H:%M:%S')}] done in {time.perf_counter() - start:.1f}s")
+        pending = set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rerun pipeline stages when WPP input tables change.")
+    parser.add_argument("week", nargs="?", default=".", help="Week folder (default: current folder).")
+    parser.add_argument("--source", help="Synced local checkout of the tables to mirror into the week folder.")
+    parser.add_argument("--interval", type=float, default=1.0, help="Polling interval in seconds.")
+    parser.add_argument("--debounce", type=float, default=2.0, help="Quiet period before a run, in seconds.")
+    parser.add_argument("--no-initial-run", action="store_true", help="Skip the full pass at startup.")
+    args = parser.parse_args(argv)
+    try:
+        watch(args.week, args.source, args.interval, args.debounce, not args.no_initial_run)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
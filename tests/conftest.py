@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the wpp package lives in scripts/, as run.sh puts it on PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
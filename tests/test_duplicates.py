@@ -0,0 +1,75 @@
+import pandas as pd
+
+from wpp import duplicates
+
+
+def table(*rows):
+    columns = ["Function/1", "Function/2", "Process", "EffectorScale", "Effector/LABEL", "Effector/ID",
+               "Signal", "Behavior", "Behavior X", "TimeScale"]
+    return pd.DataFrame([dict(zip(columns, r)) for r in rows], columns=columns, dtype="string")
+
+
+def report_for(**systems):
+    frames = []
+    for system, df in systems.items():
+        canon = duplicates.canonical(df)
+        frames.append(canon.assign(system=system, row=canon.index))
+    rows = pd.concat(frames, ignore_index=True)
+    return rows, duplicates.find(rows)
+
+
+FILTER = ("renal system", "filtration", "glomerular filtration", "cell", "podocyte", "CL:0000653", "", "", "", "seconds")
+
+
+def test_copies_are_duplicates_within_a_system():
+    rows, report = report_for(Urinary=table(FILTER, FILTER))
+    assert report["kind"].tolist() == ["duplicate", "duplicate"]
+    assert set(report["scope"]) == {"within"}
+    assert report["row"].tolist() == [0, 1]
+
+
+def test_copies_in_two_systems_are_duplicates_across():
+    rows, report = report_for(Urinary=table(FILTER), Renal=table(FILTER))
+    assert set(report["scope"]) == {"across"}
+    assert set(report["systems"]) == {2}
+    assert report["group"].nunique() == 1
+
+
+def test_other_time_scale_is_a_conflict():
+    other = FILTER[:-1] + ("minutes",)
+    rows, report = report_for(Urinary=table(FILTER, other))
+    assert report["kind"].tolist() == ["conflict", "conflict"]
+    assert set(report["differs"]) == {"time_scale"}
+
+
+def test_label_and_id_spellings_match():
+    # the same effector ID under another label, spacing and case are the same row
+    respelled = ("Renal  System", "Filtration", "Glomerular filtration", "cell", "Podocytes", "CL:0000653",
+                 "", "", "", "Seconds")
+    rows, report = report_for(Urinary=table(FILTER, respelled))
+    assert report["kind"].tolist() == ["duplicate", "duplicate"]
+
+
+def test_chain_steps_without_a_process_are_not_reported():
+    # later steps of a chain name no process and differ only in Signal/Behavior
+    # (as Nervous_System rows 386-389 of 2026-08-17), so they are left out
+    step = ("nervous system", "motor behavior", "", "cell", "direct pathway medium spiny neuron", "CL:4023026")
+    rows, report = report_for(Nervous=table(
+        step + ("", "depolarization", "", "milliseconds"),
+        step + ("", "X secretion", "GABA", "milliseconds"),
+        step + ("dopamine", "depolarization", "", "milliseconds"),
+        step + ("depolarization", "X secretion", "GABA", "milliseconds"),
+    ))
+    assert rows.empty
+    assert report.empty
+    assert list(report.columns) == duplicates.REPORT_COLUMNS
+
+
+def test_summary_counts_extra_copies_and_conflicts():
+    other = FILTER[:-1] + ("minutes",)
+    rows, report = report_for(Urinary=table(FILTER, FILTER, FILTER, other), Renal=table(FILTER))
+    summary = duplicates.summary(rows, report).set_index("system")
+    assert summary.loc["Urinary", "rows"] == 4
+    # 4 copies across both systems: 3 extra, the first one (Renal) is not counted
+    assert summary["duplicate_rows_across"].sum() == 3
+    assert summary.loc["Urinary", "conflicting_rows"] == 4
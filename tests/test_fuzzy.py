@@ -0,0 +1,42 @@
+import itertools
+
+import pytest
+
+from wpp import fuzzy
+
+LABELS = [
+    "epithelial cell", "epithelial cell distal", "epithelial cells", "smooth muscle cell",
+    "smooth muscle cells", "smooth muscle", "vascular smooth muscle cell", "cardiac muscle cell",
+    "cardiac muscle", "hepatocyte", "hepatocytes", "kidney", "kidney tubule", "renal tubule",
+    "proximal tubule", "distal tubule", "loop of henle", "thick ascending limb of loop of henle",
+    "t cell", "b cell", "mast cell", "macrophage", "macrophages", "alveolar macrophage",
+]
+
+
+def brute_force(labels, threshold, n):
+    grams = [fuzzy.char_ngrams(lbl, n) for lbl in labels]
+    return {(i, j) for i, j in itertools.combinations(range(len(labels)), 2)
+            if fuzzy.dice(grams[i], grams[j]) >= threshold - 1e-9}
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.7, 0.8, 0.85, 0.9, 0.95])
+@pytest.mark.parametrize("n", [2, 3])
+def test_similar_pairs_match_brute_force(threshold, n):
+    index = fuzzy.NgramIndex(LABELS, n=n)
+    found = {tuple(sorted((i, j))) for i, j, _ in index.similar_pairs(threshold)}
+    assert found == brute_force(LABELS, threshold, n)
+
+
+def test_pair_exactly_at_threshold_is_kept():
+    index = fuzzy.NgramIndex(["epithelial cell", "epithelial cell distal"])
+    assert fuzzy.dice(*index.grams) == pytest.approx(0.85)
+    assert [(i, j) for i, j, _ in index.similar_pairs(0.85)] == [(0, 1)]
+
+
+def test_labels_with_disjoint_ids_stay_apart_through_a_label_without_id():
+    labels = ["smooth muscle cells", "smooth muscle cell", "smooth muscle cellx"]
+    clusters = fuzzy.cluster_labels(labels, ids=[set(), {"CL:1"}, {"CL:2"}])
+    for cluster in clusters:
+        ids = set().union(*({"CL:1"} if i == 1 else {"CL:2"} if i == 2 else set() for i in cluster["members"]))
+        assert len(ids) <= 1
+    assert fuzzy.cluster_labels(labels, ids=[set(), {"CL:1"}, {"CL:1"}])[0]["members"] == [0, 1, 2]
@@ -0,0 +1,25 @@
+from wpp import shared
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_same_table_in_other_folders_shares_a_key(tmp_path):
+    a = _write(tmp_path / "week1" / "Urinary_System.csv", "Function/1\nfilter\n")
+    b = _write(tmp_path / "work" / "Urinary_System.csv", "Function/1\nfilter\n")
+    assert shared.content_key(a, "x") == shared.content_key(b, "x")
+
+
+def test_same_content_under_another_name_gets_its_own_key(tmp_path):
+    # the published frames are named after the file they were loaded from
+    a = _write(tmp_path / "Urinary_System.csv", "Function/1\nfilter\n")
+    b = _write(tmp_path / "Renal_System.csv", "Function/1\nfilter\n")
+    assert shared.content_key(a, "x") != shared.content_key(b, "x")
+
+
+def test_load_options_are_part_of_the_key(tmp_path):
+    a = _write(tmp_path / "Urinary_System.csv", "Function/1\nfilter\n")
+    assert shared.content_key(a, ("function",)) != shared.content_key(a, None)
@@ -0,0 +1,72 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wpp import timescale
+
+# the exact-match lookup 02 used before wpp/timescale.py
+TIME_MAPPING = {
+    "milliseconds": ["<1 second"], "seconds": ["1s - < 1min"], "secondsminutes": ["1s - < 1min", "1min - < 1hr"],
+    "minuteshours": ["1min - < 1hr", "1hr - < 1day"], "hoursdays": ["1hr - < 1day", "1day - < 1week"],
+    "daysweeks": ["1day - < 1week", "1 week - < 1 year"], "hours": ["1hr - < 1day"], "minutes": ["1min - < 1hr"],
+    "days": ["1day - < 1week"], "nan": ["Unknown"],
+    "weeks": ["1 week - < 1 year"], "months": ["1 week - < 1 year"], "years": ["1 year or longer"],
+    "weeksmonths": ["1 week - < 1 year"], "minuteshoursdays": ["1min - < 1hr", "1hr - < 1day", "1day - < 1week"],
+    "hoursdaysweeksmonths": ["1hr - < 1day", "1day - < 1week", "1 week - < 1 year"],
+    "secondsminuteshours": ["1s - < 1min", "1min - < 1hr", "1hr - < 1day"],
+    "milisecondsseconds": ["<1 second", "1s - < 1min"], "secondshours": ["1s - < 1min", "1min - < 1hr", "1hr - < 1day"],
+    "continuous": ["continuous"], "variable": ["variable"],
+}
+
+
+def old_normalize(val):
+    if pd.isna(val):
+        return "nan"
+    return re.sub(r"[–—\-\s,]+", "", str(val).lower())
+
+
+def old_time_ranges(val):
+    return TIME_MAPPING.get(old_normalize(val), ["Unknown"])
+
+
+def spelled(key):
+    """A squashed key as a table spells it: "minuteshours" -> "Minutes-Hours"."""
+    words = timescale._GLUED.findall(key)
+    return "-".join(w.capitalize() for w in words) if "".join(words) == key else key
+
+
+@pytest.fixture(autouse=True)
+def default_bins(monkeypatch):
+    monkeypatch.delenv(timescale.BINS_ENV, raising=False)
+
+
+@pytest.mark.parametrize("key", sorted(TIME_MAPPING))
+def test_old_keys_keep_their_ranges(key):
+    values = pd.Series([key, spelled(key), spelled(key).replace("-", ", ")])
+    for value, ranges in zip(values, timescale.time_ranges(values)):
+        assert list(ranges) == old_time_ranges(value), value
+
+
+def test_blank_and_unparsed_values_are_unknown():
+    values = pd.Series([np.nan, "", "sometimes", "nan"], dtype=object)
+    assert [list(r) for r in timescale.time_ranges(values)] == [["Unknown"]] * 4
+
+
+def test_values_the_old_lookup_missed():
+    values = pd.Series(["milliseconds-seconds", "hours-weeks", "< 1 s", "10-30 min"])
+    assert [list(r) for r in timescale.time_ranges(values)] == [
+        ["<1 second", "1s - < 1min"],
+        ["1hr - < 1day", "1day - < 1week", "1 week - < 1 year"],
+        ["<1 second"],
+        ["1min - < 1hr"],
+    ]
+
+
+def test_parse_gives_intervals_in_seconds():
+    assert timescale.parse("30 min") == (1800.0, 1800.0)
+    lo, hi = timescale.parse("hours")
+    assert lo == 3600.0 and hi < 86400.0
+    assert timescale.parse("continuous") == "continuous"
+    assert timescale.parse("sometimes") is None